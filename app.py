@@ -1,10 +1,14 @@
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
 import streamlit as st
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_core.rate_limiters import InMemoryRateLimiter
+from context_cache import ContextCache
+from llm_wrappers import GeminiWrapper, ResponseCache
+from baseline_classifier import BaselineTopicClassifier
+from prompt_routing import TopicRouter
+from topics import MAJOR_TOPICS
 
 
 class Topics(BaseModel):
@@ -13,28 +17,78 @@ class Topics(BaseModel):
 
 load_dotenv()
 GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "15"))
 
 # Load system prompt
 with open("system_prompt.md", mode="r") as f:
     system_prompt: str = f.read()
 
-# Cache the model so it persists across reruns
+# Cache the model so it persists across reruns. The wrapper shares the API key's
+# rate limiter with any evaluation run at the same time, and reports 429s back to it
 @st.cache_resource
 def get_model():
-    return ChatGoogleGenerativeAI(
-        model="gemini-3.1-flash-lite-preview",
-        api_key=GEMINI_API_KEY,
-        max_retries=5,
+    return GeminiWrapper(
+        GEMINI_API_KEY,
         thinking_level="minimal",
-        rate_limiter=InMemoryRateLimiter(
-            requests_per_second=15 / 60.0,
-            check_every_n_seconds=0.5,
-            max_bucket_size=15,
-        ),
+        requests_per_minute=GEMINI_RPM,
+        context_cache=get_context_cache(),
     )
 
+# Cache responses on disk so repeated questions don't hit the API again
+@st.cache_resource
+def get_cache():
+    return ResponseCache(os.getenv("LLM_CACHE", "llm_cache.sqlite"))
+
+# Static prompts are registered once as cached contexts (if large enough to be cached)
+@st.cache_resource
+def get_context_cache():
+    return ContextCache()
+
+# Local baseline gives an instant answer while the LLM call is in flight
+@st.cache_resource
+def get_baseline():
+    return BaselineTopicClassifier()
+
+# Routes each question to a prompt listing only its major topic's topics
+@st.cache_resource
+def get_router():
+    return TopicRouter(system_prompt, classifier=get_baseline())
+
 llm = get_model()
-structured_llm = llm.with_structured_output(Topics)
+cache = get_cache()
+baseline = get_baseline()
+router = get_router()
+
+# Parallel requests in bulk mode, requests are still paced by the model's rate limiter
+BULK_WORKERS = 4
+
+
+def extract_topics(question: str, major_topic: str | None = None) -> list[str]:
+    """
+    Extracts topics for one question, served from the response cache if possible.
+    Raises if the API call fails, an empty list means the model found no topics.
+    """
+    routed_prompt = router.route(question, major_topic)
+    key = llm.structured_cache_key(routed_prompt, question)
+
+    def call() -> str | None:
+        result = llm.invoke_structured(routed_prompt, question, Topics)
+        # refusals and empty candidates come back as None, and aren't cached
+        return result.model_dump_json() if result is not None else None
+
+    cached = cache.cached_call(key, call)
+    if cached is None:
+        return []
+    return Topics.model_validate_json(cached).topics
+
+
+def count_topics(topics: list[str]) -> None:
+    # Update running counts
+    for topic in topics:
+        st.session_state.topic_counts[topic] = (
+            st.session_state.topic_counts.get(topic, 0) + 1
+        )
+
 
 st.set_page_config(page_title="Topic Extractor Demo", layout="centered")
 st.title("Topic Extractor Demo")
@@ -43,29 +97,88 @@ st.title("Topic Extractor Demo")
 if "topic_counts" not in st.session_state:
     st.session_state.topic_counts = {}
 
-question = st.text_area("Your question", height=200, placeholder="Paste or type a question here…")
-
-if st.button("Extract Topics", type="primary"):
-    if not question.strip():
-        st.warning("Please enter a question first.")
-    else:
-        with st.spinner("Extracting topics…"):
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=question),
-            ]
-            result: Topics = structured_llm.invoke(messages)
-
-        if result and result.topics:
-            st.subheader("Extracted Topics")
-            for topic in result.topics:
-                st.markdown(f"- {topic}")
-                # Update running counts
-                st.session_state.topic_counts[topic] = (
-                    st.session_state.topic_counts.get(topic, 0) + 1
-                )
+single_tab, bulk_tab = st.tabs(["Single question", "Bulk CSV"])
+
+with single_tab:
+    question = st.text_area("Your question", height=200, placeholder="Paste or type a question here…")
+    major_topic = st.selectbox(
+        "Major topic", ["Auto-detect"] + list(MAJOR_TOPICS), format_func=lambda m: m.replace("_", " ").title()
+    )
+
+    if st.button("Extract Topics", type="primary"):
+        if not question.strip():
+            st.warning("Please enter a question first.")
+        else:
+            st.caption("Quick suggestion (local baseline): " + ", ".join(baseline.predict(question)))
+
+            try:
+                with st.spinner("Extracting topics…"):
+                    topics = extract_topics(question, major_topic)
+            except Exception as e:
+                topics = None
+                st.error(f"Topic extraction failed: {e}")
+
+            if topics:
+                st.subheader("Extracted Topics")
+                for topic in topics:
+                    st.markdown(f"- {topic}")
+                count_topics(topics)
+            elif topics is not None:
+                st.info("No topics were extracted from the question.")
+
+with bulk_tab:
+    st.write(
+        "Upload a CSV with a `question` column (and optionally `major_topic`) to tag a whole worksheet."
+    )
+    uploaded = st.file_uploader("Questions CSV", type="csv")
+
+    if uploaded is not None and st.button("Tag All Questions", type="primary"):
+        questions_df = pd.read_csv(uploaded)
+        if "question" not in questions_df.columns:
+            st.error("The CSV must have a `question` column.")
         else:
-            st.info("No topics were extracted from the question.")
+            questions_df["question"] = questions_df["question"].fillna("").astype(str)
+            if "major_topic" not in questions_df.columns:
+                questions_df["major_topic"] = None
+            questions_df["topics"] = ""
+            questions_df["status"] = "pending"
+            questions_df.loc[questions_df["question"].str.strip() == "", "status"] = "skipped"
+
+            progress = st.progress(0.0, text="Tagging questions…")
+            table = st.empty()
+            table.dataframe(questions_df)
+
+            # Jobs run on worker threads, the table is only updated from this thread
+            with ThreadPoolExecutor(max_workers=BULK_WORKERS) as executor:
+                futures = {
+                    executor.submit(extract_topics, row.question, row.major_topic): index
+                    for index, row in questions_df.iterrows()
+                    if row.question.strip()
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    index = futures[future]
+                    try:
+                        topics = future.result()
+                        questions_df.at[index, "topics"] = ",".join(topics)
+                        questions_df.at[index, "status"] = "done"
+                        count_topics(topics)
+                    except Exception as e:
+                        questions_df.at[index, "status"] = f"error: {e}"
+                    progress.progress(
+                        done / len(futures), text=f"Tagged {done}/{len(futures)} questions"
+                    )
+                    table.dataframe(questions_df)
+
+            st.session_state.bulk_results = questions_df
+
+    # Keep the last results downloadable across reruns
+    if "bulk_results" in st.session_state:
+        st.download_button(
+            "Download tagged CSV",
+            st.session_state.bulk_results.drop(columns="status").to_csv(index=False),
+            file_name="tagged_questions.csv",
+            mime="text/csv",
+        )
 
 # Display running topic frequency in the sidebar
 if st.session_state.topic_counts:
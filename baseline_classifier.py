@@ -0,0 +1,168 @@
+import json
+import re
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from topics import NUM_TOPICS, TOPIC_LIST, encode, decode
+from metrics import unpack
+from telemetry import Telemetry
+from question_store import QuestionStore
+
+# LaTeX commands (\frac, \nabla, ...) are kept whole, alongside words, numbers
+# and single math symbols such as ^ _ = |
+LATEX_TOKEN_PATTERN = r"\\[A-Za-z]+|[A-Za-z]+|\d+|[\^_=+\-*/|<>']"
+
+
+class BaselineTopicClassifier:
+    """
+    Local topic extractor: TF-IDF over LaTeX-aware tokens with a multi-output
+    ridge model, fitted on the labelled question bank.
+
+    Exposes the same `invoke(system_prompt, user_text)` interface as the LLM
+    wrappers, so it can be added to `llm_list` as a baseline. All topics are
+    fitted in one closed-form solve, and prediction is a lookup of the
+    question's n-grams in the weight matrix, well under a millisecond.
+
+    With `n_folds` > 1, questions that are in the training data are answered by
+    a model fitted without them (out-of-fold), so evaluating on the question
+    bank does not just measure memorisation.
+    """
+
+    # local and CPU-bound, no point running it on more threads
+    max_concurrency: int = 1
+
+    def __init__(
+        self,
+        store: QuestionStore | None = None,
+        threshold: float = 0.35,
+        alpha: float = 1.0,
+        n_folds: int = 5,
+    ) -> None:
+        self.model = "tfidf-ridge-baseline"
+        self.telemetry = Telemetry()
+        self.threshold = threshold
+        self.alpha = alpha
+
+        df = (store or QuestionStore()).questions(labelled=True)
+        self.questions: list[str] = df["question"].tolist()
+        labels = unpack(
+            [encode(t.strip() for t in topics.split(",")) for topics in df["topics"]]
+        ).reshape(len(df), NUM_TOPICS)
+
+        self.vectorizer = TfidfVectorizer(
+            token_pattern=LATEX_TOKEN_PATTERN,
+            ngram_range=(1, 2),
+            sublinear_tf=True,
+            min_df=1,
+        )
+        features = self.vectorizer.fit_transform(self.questions)
+        self._token_re = re.compile(LATEX_TOKEN_PATTERN)
+        self._vocabulary: dict[str, int] = self.vectorizer.vocabulary_
+        self._idf: np.ndarray = self.vectorizer.idf_
+
+        # full model for unseen questions
+        self.coef, self.intercept = self._fit(features, labels)
+
+        # out-of-fold models for questions that were in the training data
+        self.fold_of: dict[str, int] = {}
+        self.fold_models: list[tuple[np.ndarray, np.ndarray]] = []
+        if n_folds > 1 and len(self.questions) >= n_folds:
+            folds = np.arange(len(self.questions)) % n_folds
+            for fold in range(n_folds):
+                train = folds != fold
+                self.fold_models.append(self._fit(features[train], labels[train]))
+            self.fold_of = {q: int(f) for q, f in zip(self.questions, folds)}
+
+    def _fit(self, features, labels: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Fits all topics in one multi-output ridge solve and returns (coef, intercept).
+        Uses the dual form, since there are far fewer questions than n-grams, and
+        centres the sparse features algebraically so they never become dense.
+        """
+        n = features.shape[0]
+        x_mean = np.asarray(features.mean(axis=0)).ravel()
+        y_mean = labels.mean(axis=0)
+        yc = labels - y_mean
+
+        # gram matrix of the centred features: (X - 1m)(X - 1m)^T
+        xm = features @ x_mean
+        gram = (features @ features.T).toarray()
+        gram += x_mean @ x_mean - xm[:, None] - xm[None, :]
+        gram += self.alpha * np.eye(n)
+
+        dual = np.linalg.solve(gram, yc)
+        coef = features.T @ dual - np.outer(x_mean, dual.sum(axis=0))
+        return coef, y_mean - x_mean @ coef
+
+    def _featurize(self, user_text: str) -> tuple[np.ndarray, np.ndarray]:
+        """
+        TF-IDF of a single question as (feature indices, l2-normalised weights),
+        matching what the fitted vectorizer would produce.
+        """
+        tokens = self._token_re.findall(user_text.lower())
+        counts: dict[int, int] = {}
+        for n in (1, 2):
+            for i in range(len(tokens) - n + 1):
+                idx = self._vocabulary.get(" ".join(tokens[i : i + n]))
+                if idx is not None:
+                    counts[idx] = counts.get(idx, 0) + 1
+        if not counts:
+            return np.zeros(0, dtype=np.intp), np.zeros(0)
+
+        indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        weights = (1 + np.log(tf)) * self._idf[indices]
+        return indices, weights / np.linalg.norm(weights)
+
+    def knows_any_token(self, user_text: str) -> bool:
+        """
+        Whether the question shares any n-gram with the training data. Scores
+        for a question that doesn't are just the model's intercepts.
+        """
+        return len(self._featurize(user_text)[0]) > 0
+
+    def predict_scores(self, user_text: str) -> np.ndarray:
+        """
+        Returns one score per topic ID (roughly in [0, 1]).
+        """
+        coef, intercept = self.coef, self.intercept
+        fold = self.fold_of.get(user_text)
+        if fold is not None:
+            coef, intercept = self.fold_models[fold]
+        indices, weights = self._featurize(user_text)
+        return weights @ coef[indices] + intercept
+
+    def predict(self, user_text: str) -> list[str]:
+        """
+        Returns the topics scoring above the threshold (at least the best one).
+        """
+        scores = self.predict_scores(user_text)
+        topic_ids = np.flatnonzero(scores >= self.threshold)
+        if len(topic_ids) == 0:
+            topic_ids = [int(np.argmax(scores))]
+        return [TOPIC_LIST[i] for i in topic_ids]
+
+    def invoke(self, system_prompt: str, user_text: str) -> str:
+        """
+        Same interface as the LLM wrappers, the system prompt is ignored.
+        """
+        with self.telemetry.track(self.model, "local") as stats:
+            stats.status = "ok"
+            return json.dumps({"topics": self.predict(user_text)})
+
+    def invoke_mask(self, user_text: str) -> int:
+        return encode(self.predict(user_text))
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    classifier = BaselineTopicClassifier()
+    print(f"Fitted on {len(classifier.questions)} questions in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    for question in classifier.questions:
+        classifier.predict(question)
+    per_call = (time.perf_counter() - start) / len(classifier.questions)
+    print(f"Predict: {per_call * 1e6:.0f} us per question")
+    print(decode(classifier.invoke_mask(classifier.questions[0])))
@@ -0,0 +1,320 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from standin_server import StandInConfig, StandInServer
+
+STANDIN_API_KEY = "standin"
+
+
+def _percentiles(latencies: list[float]) -> str:
+    if not latencies:
+        return "p50=-  p95=-  p99=-"
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return f"p50={p50:.2f}s  p95={p95:.2f}s  p99={p99:.2f}s"
+
+
+def _server_summary(server: StandInServer, since: int = 0) -> str:
+    """
+    Status counts and service-time percentiles of the requests the server saw.
+    """
+    requests = server.requests[since:]
+    statuses: dict[int, int] = {}
+    for _, status, _ in requests:
+        statuses[status] = statuses.get(status, 0) + 1
+    counts = ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items()))
+    service = [seconds for _, status, seconds in requests if status == 200]
+    return f"{len(requests)} requests ({counts}), service time {_percentiles(service)}"
+
+
+def bench_eval(server: StandInServer, workdir: str, rpm: int) -> None:
+    """
+    Runs topic_extraction_test.py end to end against the stand-in server, with
+    its own cache, run log and rate-limit buckets, and reports questions per
+    second and job latency per model from the run log.
+    """
+    run_log = os.path.join(workdir, "eval.jsonl")
+    env = {
+        **os.environ,
+        "NALA_BASE_URL": server.nala_url,
+        "GEMINI_BASE_URL": server.base_url,
+        "NALA_API_KEY": STANDIN_API_KEY,
+        "GEMINI_API_KEY": STANDIN_API_KEY,
+        "GEMINI_RPM": str(rpm),
+        "LLM_CACHE": os.path.join(workdir, "eval_cache.sqlite"),
+        "RATE_LIMIT_DB": os.path.join(workdir, "eval_rate_limits.sqlite"),
+        "RUN_LOG": run_log,
+    }
+
+    since = len(server.requests)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "topic_extraction_test.py"], env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise RuntimeError("topic_extraction_test.py failed")
+
+    with open(run_log, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    jobs = pd.DataFrame(records)
+
+    print(f"\n[eval] topic_extraction_test.py: {len(jobs)} jobs in {wall:.1f}s (including startup)")
+    for model, group in jobs.groupby("model", sort=False):
+        latencies = group["latency_s"].fillna(0)
+        # from the first job's start to the last job's end
+        active = group["timestamp"].max() - (group["timestamp"] - latencies).min()
+        print(
+            f"  {model:<48} {len(group) / active:7.1f} q/s  {_percentiles(latencies.tolist())}"
+        )
+    print(f"  server: {_server_summary(server, since)}")
+
+
+def bench_retries(server: StandInServer, workdir: str, rpm: int) -> None:
+    """
+    Runs the question bank through one NALA and one Gemini wrapper while the
+    server injects faults, and prints the wrappers' latency report (retries,
+    backoff and rate-limit waits included).
+    """
+    # imported here so the server and the other scenarios don't pay for LangChain
+    from eval_engine import run_jobs
+    from llm_wrappers import GeminiWrapper, NalaGPTWrapper
+    from metrics import print_latency_report
+
+    os.environ["RATE_LIMIT_DB"] = os.path.join(workdir, "retries_rate_limits.sqlite")
+    llm_list = [
+        ("NALA (stand-in)", NalaGPTWrapper(STANDIN_API_KEY, base_url=server.nala_url)),
+        (
+            "Gemini (stand-in)",
+            GeminiWrapper(STANDIN_API_KEY, base_url=server.base_url, requests_per_minute=rpm),
+        ),
+    ]
+    questions = server.store.questions()["question"].tolist()
+
+    since = len(server.requests)
+    start = time.perf_counter()
+    responses = run_jobs(questions, llm_list, "Extract the topics.", stream=True)
+    wall = time.perf_counter() - start
+
+    answered = sum(response is not None for response in responses.values())
+    print(
+        f"\n[retries] {answered}/{len(responses)} jobs answered in {wall:.1f}s "
+        f"({answered / wall:.1f} q/s) with error rate {server.config.error_rate:.0%}, "
+        f"throttle rate {server.config.throttle_rate:.0%}"
+    )
+    print(f"  server: {_server_summary(server, since)}")
+    print_latency_report({name: llm.telemetry for name, llm in llm_list})
+
+
+def bench_app_bulk(server: StandInServer, workdir: str, rpm: int) -> None:
+    """
+    Drives the Streamlit app's Bulk CSV tab (via streamlit's AppTest) over the
+    question bank against the stand-in server, and reports questions per second.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    os.environ.update(
+        {
+            "GEMINI_BASE_URL": server.base_url,
+            "GEMINI_API_KEY": STANDIN_API_KEY,
+            "GEMINI_RPM": str(rpm),
+            "LLM_CACHE": os.path.join(workdir, "app_cache.sqlite"),
+            "RATE_LIMIT_DB": os.path.join(workdir, "app_rate_limits.sqlite"),
+        }
+    )
+    csv_bytes = server.store.questions()[["major_topic", "question"]].to_csv(index=False).encode("utf-8")
+
+    app = AppTest.from_file("app.py", default_timeout=600)
+    app.run()
+    app.file_uploader[0].set_value(("questions.csv", csv_bytes, "text/csv"))
+    app.run()
+
+    since = len(server.requests)
+    start = time.perf_counter()
+    next(button for button in app.button if button.label == "Tag All Questions").click().run()
+    wall = time.perf_counter() - start
+
+    results = app.session_state["bulk_results"]
+    done = int((results["status"] == "done").sum())
+    print(f"\n[app-bulk] {done}/{len(results)} questions tagged in {wall:.1f}s ({done / wall:.1f} q/s)")
+    print(f"  server: {_server_summary(server, since)}")
+
+
+def bench_context_cache(server: StandInServer, workdir: str, rpm: int) -> None:
+    """
+    Runs the question bank through a Gemini wrapper with the full system
+    prompt twice, sending the prompt with every request and then as a cached
+    context, and compares input tokens and time to first token. The size
+    minimum for cached contexts is lifted on both sides, since the topic
+    prompt is far below the API's.
+    """
+    from context_cache import ContextCache
+    from llm_wrappers import GeminiWrapper
+
+    os.environ["RATE_LIMIT_DB"] = os.path.join(workdir, "context_rate_limits.sqlite")
+    server.config.min_cache_tokens = 0
+    # streams then run to their last chunk, which carries the token usage
+    server.config.chatter = False
+    with open("system_prompt.md", mode="r") as f:
+        system_prompt = f.read()
+    questions = server.store.questions()["question"].tolist()
+
+    print(f"\n[context-cache] {len(questions)} questions, prefill {server.config.prefill_per_1k_tokens:g}s per 1k tokens")
+    for mode, context_cache in (("full prompt", None), ("cached context", ContextCache(min_tokens=0))):
+        llm = GeminiWrapper(
+            STANDIN_API_KEY,
+            base_url=server.base_url,
+            requests_per_minute=rpm,
+            context_cache=context_cache,
+        )
+        start = time.perf_counter()
+        for question in questions:
+            llm.invoke_stream(system_prompt, question)
+        wall = time.perf_counter() - start
+
+        calls = [c for c in llm.telemetry.snapshot() if c.status == "ok"]
+        input_tokens = statistics.mean(c.input_tokens or 0 for c in calls)
+        cached_tokens = statistics.mean(c.cached_input_tokens or 0 for c in calls)
+        ttft = statistics.median(c.ttft_s for c in calls if c.ttft_s is not None)
+        print(
+            f"  {mode:<15} input {input_tokens:6.0f} tok/q ({cached_tokens:4.0f} cached)"
+            f"  ttft p50={ttft:.3f}s  {len(calls) / wall:.1f} q/s"
+        )
+        if context_cache is not None:
+            context_cache.clear()
+
+
+def _import_profile(args: list[str], env: dict[str, str]) -> tuple[float, float, set[str]]:
+    """
+    Runs `python -X importtime <args>` and returns (total import seconds,
+    wall seconds, names of the modules imported).
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise RuntimeError(f"{' '.join(args)} failed")
+
+    total_us, modules = 0, set()
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        # top-level imports' cumulative times add up to the total
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1e6, wall, modules
+
+
+def bench_startup(server: StandInServer, workdir: str, rpm: int) -> None:
+    """
+    Checks the CLI's startup against the import budgets in fyp.py: `fyp
+    --help` and a single-question `fyp extract` per backend are run in fresh
+    interpreters, their import time over a bare interpreter is compared with
+    the budget, and no command may import another backend's modules.
+    """
+    from fyp import BACKEND_MODULES, IMPORT_BUDGETS_S
+
+    env = {
+        **os.environ,
+        "NALA_BASE_URL": server.nala_url,
+        "GEMINI_BASE_URL": server.base_url,
+        "NALA_API_KEY": STANDIN_API_KEY,
+        "GEMINI_API_KEY": STANDIN_API_KEY,
+        "GEMINI_RPM": str(rpm),
+        "LLM_CACHE": os.path.join(workdir, "startup_cache.sqlite"),
+        "RATE_LIMIT_DB": os.path.join(workdir, "startup_rate_limits.sqlite"),
+    }
+    question = "Find the eigenvalues of $A = \\begin{pmatrix} 2 & 1 \\\\ 1 & 2 \\end{pmatrix}$."
+    # budget -> (command, what it may import)
+    checks = {
+        "help": (["fyp.py", "--help"], []),
+        "nala": (["fyp.py", "extract", "-m", "gpt5-low", question], []),
+        "baseline": (["fyp.py", "extract", "-m", "baseline", question], ["baseline", "question bank"]),
+        "gemini": (["fyp.py", "extract", "-m", "gemini-low", question], ["gemini"]),
+    }
+
+    runs = 3
+    bare = statistics.median(_import_profile(["-c", "pass"], env)[0] for _ in range(runs))
+    print(f"\n[startup] import time over a bare interpreter ({bare:.3f}s), median of {runs} runs")
+    failures = []
+    for budget_name, (args, allowed) in checks.items():
+        profiles = [_import_profile(args, env) for _ in range(runs)]
+        import_s = statistics.median(profile[0] for profile in profiles) - bare
+        wall = statistics.median(profile[1] for profile in profiles)
+        forbidden = [
+            module
+            for backend, modules in BACKEND_MODULES.items()
+            if backend not in allowed
+            for module in modules
+            if module in profiles[0][2]
+        ]
+        budget = IMPORT_BUDGETS_S[budget_name]
+        ok = import_s <= budget and not forbidden
+        print(
+            f"  {' '.join(args[:4]):<32} imports {import_s:6.3f}s (budget {budget:.1f}s)"
+            f"  wall {wall:6.3f}s  {'OK' if ok else 'FAIL'}"
+            + (f"  imported {', '.join(forbidden)}" if forbidden else "")
+        )
+        if not ok:
+            failures.append(budget_name)
+    if failures:
+        raise RuntimeError(f"startup over budget: {', '.join(failures)}")
+
+
+SCENARIOS = {
+    "eval": bench_eval,
+    "retries": bench_retries,
+    "app-bulk": bench_app_bulk,
+    "context-cache": bench_context_cache,
+    "startup": bench_startup,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Throughput and tail-latency benchmarks against the offline stand-in server."
+    )
+    parser.add_argument(
+        "scenarios", nargs="*", choices=list(SCENARIOS), help="defaults to all scenarios"
+    )
+    parser.add_argument("--latency-median", type=float, default=0.3, help="seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.05, help="503s, retries scenario only")
+    parser.add_argument("--throttle-rate", type=float, default=0.05, help="429s, retries scenario only")
+    parser.add_argument("--rpm", type=int, default=600, help="Gemini requests per minute")
+    parser.add_argument(
+        "--prefill", type=float, default=0.2, help="seconds per 1k uncached input tokens"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="fyp_bench_") as workdir:
+        for name in args.scenarios or list(SCENARIOS):
+            faulty = name == "retries"
+            server = StandInServer(
+                StandInConfig(
+                    latency_median=args.latency_median,
+                    latency_sigma=args.latency_sigma,
+                    error_rate=args.error_rate if faulty else 0.0,
+                    throttle_rate=args.throttle_rate if faulty else 0.0,
+                    retry_after=1.0,
+                    chatter=True,
+                    prefill_per_1k_tokens=args.prefill,
+                )
+            ).start()
+            try:
+                SCENARIOS[name](server, workdir, args.rpm)
+            finally:
+                server.stop()
@@ -0,0 +1,313 @@
+import itertools
+from dataclasses import dataclass
+import numpy as np
+from metrics import unpack
+from topics import NUM_TOPICS, TOPIC_LIST
+
+# replicates drawn by the evaluation and topic_report.py unless set otherwise
+N_REPLICATES = 10000
+CONFIDENCE = 0.95
+
+
+@dataclass
+class Estimate:
+    value: float
+    low: float
+    high: float
+
+    def __str__(self) -> str:
+        return f"{self.value:.4f} [{self.low:.4f}, {self.high:.4f}]"
+
+
+@dataclass
+class PairedTest:
+    model_a: str
+    model_b: str
+    n_questions: int
+    # differences a - b, with their bootstrap p-values (two-sided)
+    kappa_diff: Estimate
+    kappa_p: float
+    micro_f1_diff: Estimate
+    micro_f1_p: float
+    # kappa_p after Holm's correction over every pair in the report
+    kappa_p_holm: float = 1.0
+
+
+def question_counts(true_masks, pred_masks) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-question, per-topic true positives, false positives and false
+    negatives, each an (n_questions, n_topics) 0/1 matrix.
+    """
+    true_masks = np.asarray(true_masks, dtype=np.uint64)
+    pred_masks = np.asarray(pred_masks, dtype=np.uint64)
+    return (
+        unpack(true_masks & pred_masks).reshape(-1, NUM_TOPICS),
+        unpack(pred_masks & ~true_masks).reshape(-1, NUM_TOPICS),
+        unpack(true_masks & ~pred_masks).reshape(-1, NUM_TOPICS),
+    )
+
+
+def kappa(tp: np.ndarray, fp: np.ndarray, fn: np.ndarray, n_questions: int) -> np.ndarray:
+    """
+    Cohen's kappa over all (question, topic) cells from per-topic counts
+    (last axis), for any number of leading replicate axes. Same as
+    MetricAccumulator.kappa for a single set of counts.
+    """
+    n = n_questions * NUM_TOPICS
+    tp, fp, fn = tp.sum(axis=-1), fp.sum(axis=-1), fn.sum(axis=-1)
+    tn = n - tp - fp - fn
+    p_observed = (tp + tn) / n
+    p_expected = ((tp + fp) * (tp + fn) + (fn + tn) * (fp + tn)) / n**2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(p_expected == 1, 0.0, (p_observed - p_expected) / (1 - p_expected))
+
+
+def precision_recall_f1(
+    tp: np.ndarray, fp: np.ndarray, fn: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-topic precision, recall and F1 (0 where undefined), elementwise.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.nan_to_num(tp / (tp + fp))
+        recall = np.nan_to_num(tp / (tp + fn))
+        f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+    return precision, recall, f1
+
+
+def _defined_prf(
+    tp: np.ndarray, fp: np.ndarray, fn: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # like precision_recall_f1 but NaN where undefined, so replicates in which a
+    # rare topic was never drawn (or never predicted) are left out of its interval
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return tp / (tp + fp), tp / (tp + fn), 2 * tp / (2 * tp + fp + fn)
+
+
+def micro_f1(tp: np.ndarray, fp: np.ndarray, fn: np.ndarray) -> np.ndarray:
+    tp, fp, fn = tp.sum(axis=-1), fp.sum(axis=-1), fn.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(tp > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+
+
+class Bootstrap:
+    """
+    Question-level bootstrap of kappa and per-topic P/R/F1. A replicate is a
+    row of resampling weights (how many times each question was drawn), so
+    the confusion counts of every replicate come from one matrix product of
+    the (replicates, questions) weights with the (questions, topics) counts,
+    instead of rescoring thousands of resamples one by one.
+
+    Models compared in a paired test are resampled with the same weights over
+    the questions both answered, so the difference between them is measured
+    on identical resamples. The seed is fixed, so reports are reproducible.
+    """
+
+    def __init__(
+        self, n_replicates: int = N_REPLICATES, confidence: float = CONFIDENCE, seed: int = 0
+    ) -> None:
+        self.n_replicates = n_replicates
+        self.confidence = confidence
+        self.rng = np.random.default_rng(seed)
+
+    def weights(self, n_questions: int) -> np.ndarray:
+        """
+        (n_replicates, n_questions) draw counts, each row summing to n_questions.
+        """
+        return self.rng.multinomial(
+            n_questions, np.full(n_questions, 1 / n_questions), size=self.n_replicates
+        ).astype(np.float64)
+
+    @staticmethod
+    def replicate_counts(
+        weights: np.ndarray, true_masks, pred_masks
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Per-topic TP/FP/FN of every replicate, each (n_replicates, n_topics).
+        """
+        return tuple(weights @ counts for counts in question_counts(true_masks, pred_masks))
+
+    def interval(self, point: float, replicates: np.ndarray) -> Estimate:
+        """
+        Percentile interval of the replicates around a point estimate.
+        Replicates where the metric is undefined (NaN) are left out.
+        """
+        replicates = replicates[~np.isnan(replicates)]
+        if len(replicates) == 0:
+            return Estimate(float(point), float(point), float(point))
+        alpha = (1 - self.confidence) / 2
+        low, high = np.percentile(replicates, [100 * alpha, 100 * (1 - alpha)])
+        return Estimate(float(point), float(low), float(high))
+
+    @staticmethod
+    def p_value(observed: float, replicates: np.ndarray) -> float:
+        """
+        Two-sided p-value of a paired difference being 0: twice the share of
+        replicates on the other side of 0 from the observed difference.
+        """
+        if observed == 0:
+            return 1.0
+        other_side = np.count_nonzero(replicates <= 0 if observed > 0 else replicates >= 0)
+        return min(1.0, 2 * (other_side + 1) / (len(replicates) + 1))
+
+    def model_estimates(self, outcomes: dict[str, tuple[int, int]]) -> dict:
+        """
+        Kappa, micro/macro F1 and per-topic P/R/F1 with intervals for one
+        model, from {question id: (true mask, pred mask)}.
+        """
+        true_masks, pred_masks = zip(*outcomes.values())
+        n = len(true_masks)
+        point = [counts.sum(axis=0) for counts in question_counts(true_masks, pred_masks)]
+        replicates = self.replicate_counts(self.weights(n), true_masks, pred_masks)
+
+        point_prf, replicate_prf = precision_recall_f1(*point), _defined_prf(*replicates)
+        per_topic = {
+            name: [
+                self.interval(point_value[t], replicate_value[:, t])
+                for t in range(NUM_TOPICS)
+            ]
+            for name, point_value, replicate_value in zip(
+                ["precision", "recall", "f1"], point_prf, replicate_prf
+            )
+        }
+        # macro F1 over the topics that occur in the questions (or in the replicate)
+        support = point[0] + point[2]
+        with np.errstate(invalid="ignore"):
+            replicate_f1 = np.where(replicates[0] + replicates[2] > 0, replicate_prf[2], np.nan)
+            replicate_macro_f1 = np.nanmean(replicate_f1, axis=1)
+        return {
+            "n_questions": n,
+            "support": support,
+            "kappa": self.interval(kappa(*point, n), kappa(*replicates, n)),
+            "micro_f1": self.interval(micro_f1(*point), micro_f1(*replicates)),
+            "macro_f1": self.interval(point_prf[2][support > 0].mean(), replicate_macro_f1),
+            **per_topic,
+        }
+
+    def kappa_interval(self, outcomes: dict[str, tuple[int, int]]) -> Estimate:
+        """
+        Only the kappa interval of model_estimates, without the per-topic
+        intervals, for tables with many models (e.g. the experiment grid).
+        """
+        true_masks, pred_masks = zip(*outcomes.values())
+        n = len(true_masks)
+        point = [counts.sum(axis=0) for counts in question_counts(true_masks, pred_masks)]
+        replicates = self.replicate_counts(self.weights(n), true_masks, pred_masks)
+        return self.interval(kappa(*point, n), kappa(*replicates, n))
+
+    def paired_test(
+        self,
+        model_a: str,
+        outcomes_a: dict[str, tuple[int, int]],
+        model_b: str,
+        outcomes_b: dict[str, tuple[int, int]],
+    ) -> PairedTest | None:
+        """
+        Paired bootstrap of the kappa and micro-F1 differences between two
+        models, over the questions both answered. None if they share none.
+        """
+        shared = [question_id for question_id in outcomes_a if question_id in outcomes_b]
+        if not shared:
+            return None
+        n = len(shared)
+        weights = self.weights(n)
+
+        kappas, micro_f1s = [], []
+        for outcomes in (outcomes_a, outcomes_b):
+            true_masks, pred_masks = zip(*(outcomes[question_id] for question_id in shared))
+            point = [counts.sum(axis=0) for counts in question_counts(true_masks, pred_masks)]
+            replicates = self.replicate_counts(weights, true_masks, pred_masks)
+            kappas.append((kappa(*point, n), kappa(*replicates, n)))
+            micro_f1s.append((micro_f1(*point), micro_f1(*replicates)))
+
+        kappa_diff = kappas[0][0] - kappas[1][0], kappas[0][1] - kappas[1][1]
+        micro_f1_diff = micro_f1s[0][0] - micro_f1s[1][0], micro_f1s[0][1] - micro_f1s[1][1]
+        return PairedTest(
+            model_a,
+            model_b,
+            n,
+            self.interval(*kappa_diff),
+            self.p_value(*kappa_diff),
+            self.interval(*micro_f1_diff),
+            self.p_value(*micro_f1_diff),
+        )
+
+    def paired_tests(self, outcomes: dict[str, dict[str, tuple[int, int]]]) -> list[PairedTest]:
+        """
+        Paired tests between every pair of models, with the kappa p-values
+        Holm-corrected for the number of pairs.
+        """
+        tests = [
+            test
+            for (model_a, outcomes_a), (model_b, outcomes_b) in itertools.combinations(
+                outcomes.items(), 2
+            )
+            if (test := self.paired_test(model_a, outcomes_a, model_b, outcomes_b)) is not None
+        ]
+        # Holm: the i-th smallest p-value is scaled by (m - i), kept monotonic
+        running_max = 0.0
+        for i, test in enumerate(sorted(tests, key=lambda test: test.kappa_p)):
+            running_max = max(running_max, min(1.0, (len(tests) - i) * test.kappa_p))
+            test.kappa_p_holm = running_max
+        return tests
+
+
+def print_bootstrap_report(
+    outcomes: dict[str, dict[str, tuple[int, int]]],
+    n_replicates: int = N_REPLICATES,
+    confidence: float = CONFIDENCE,
+) -> None:
+    """
+    Prints bootstrap confidence intervals for every model and paired tests
+    between every pair of models. `outcomes` maps each model to
+    {question id: (true mask, pred mask)} for the questions it answered.
+    """
+    bootstrap = Bootstrap(n_replicates, confidence)
+    outcomes = {name: model_outcomes for name, model_outcomes in outcomes.items() if model_outcomes}
+
+    print("\n" + "=" * 60)
+    print(f"TOPIC EXTRACTION — BOOTSTRAP ({n_replicates} replicates, {confidence:.0%} intervals)")
+    print("=" * 60)
+
+    estimates = {
+        name: bootstrap.model_estimates(model_outcomes) for name, model_outcomes in outcomes.items()
+    }
+    width = max([len(name) for name in estimates] + [5])
+    header = f"{'model':<{width}}  {'n':>4}  {'kappa':<24}  {'micro-F1':<24}  {'macro-F1':<24}"
+    print(header)
+    print("-" * len(header))
+    for name, estimate in estimates.items():
+        print(
+            f"{name:<{width}}  {estimate['n_questions']:>4}  {str(estimate['kappa']):<24}"
+            f"  {str(estimate['micro_f1']):<24}  {str(estimate['macro_f1']):<24}"
+        )
+
+    topic_width = max(len(topic) for topic in TOPIC_LIST)
+    for name, estimate in estimates.items():
+        print(f"\n{name}: per-topic intervals (topics present in its questions)")
+        print(f"  {'':>{topic_width}}  {'precision':<24}  {'recall':<24}  {'f1':<24}  support")
+        for t, topic in enumerate(TOPIC_LIST):
+            if estimate["support"][t] == 0:
+                continue
+            print(
+                f"  {topic:>{topic_width}}  {str(estimate['precision'][t]):<24}"
+                f"  {str(estimate['recall'][t]):<24}  {str(estimate['f1'][t]):<24}"
+                f"  {int(estimate['support'][t]):>7}"
+            )
+
+    tests = bootstrap.paired_tests(outcomes)
+    if tests:
+        print("\nPaired differences (first model minus second, on the questions both answered):")
+    for test in tests:
+        print(f"\n{test.model_a}  vs  {test.model_b}  (n={test.n_questions})")
+        kappa_diff, micro_f1_diff = test.kappa_diff, test.micro_f1_diff
+        print(
+            f"  kappa     {kappa_diff.value:+.4f} [{kappa_diff.low:+.4f}, {kappa_diff.high:+.4f}]"
+            f"  p={test.kappa_p:.4f}  p(Holm)={test.kappa_p_holm:.4f}"
+        )
+        print(
+            f"  micro-F1  {micro_f1_diff.value:+.4f} [{micro_f1_diff.low:+.4f}, {micro_f1_diff.high:+.4f}]"
+            f"  p={test.micro_f1_p:.4f}"
+        )
+
+    print("=" * 60)
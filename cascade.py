@@ -0,0 +1,170 @@
+import threading
+from eval_engine import _run_sampled, parse_topics
+from response_parsing import parse_json_object
+from telemetry import Telemetry
+from topics import count_invalid, encode
+
+# reasons a stage's answer is not trusted, in the order they are checked
+GATES = ["unparseable", "empty", "invalid", "low_agreement", "baseline_disagreement"]
+
+
+def self_agreement(agreement: dict[str, float]) -> float:
+    """
+    How consistently sampled responses chose their topics: the mean over
+    every topic any sample chose of max(a, 1 - a), where a is the fraction of
+    samples that chose it. 1 when all samples agree, 0.5 for coin flips.
+    """
+    if not agreement:
+        return 1.0
+    return sum(max(a, 1 - a) for a in agreement.values()) / len(agreement)
+
+
+class CascadeExtractor:
+    """
+    Topic extractor that asks the cheapest model first and escalates to the
+    next (stronger, slower) stage only when a gate fires on the answer:
+
+    - unparseable: no response, or no JSON object in it;
+    - empty: no topics;
+    - invalid: a topic that matches nothing in the topic list;
+    - low_agreement: with `samples` > 1, the stage's samples disagree
+      (self-agreement below `min_self_agreement`);
+    - baseline_disagreement: with a `baseline`, the answer shares no topic
+      with the local baseline classifier's.
+
+    The last stage's answer is taken as it is, unless it is unparseable and an
+    earlier one wasn't. Exposes the wrappers' `invoke(system_prompt,
+    user_text)` interface, so it can go in `llm_list` or replace a single
+    model in the app, and counts which stage answered and which gates fired.
+    """
+
+    max_concurrency: int = 4
+
+    def __init__(
+        self,
+        stages: list[tuple[str, object]],
+        baseline=None,
+        samples: int = 1,
+        min_self_agreement: float = 0.75,
+    ) -> None:
+        self.stages = stages
+        self.baseline = baseline
+        self.samples = samples
+        self.min_self_agreement = min_self_agreement
+        self.model = " -> ".join(name for name, _ in stages)
+        self.telemetry = Telemetry()
+        self._lock = threading.Lock()
+        # questions sent to and answered by each stage, and how often each gate fired
+        self.asked = [0] * len(stages)
+        self.answered_by = [0] * len(stages)
+        self.gate_counts = dict.fromkeys(GATES, 0)
+
+    def gates(self, question: str, response: str | None) -> list[str]:
+        """
+        The gates that fire on one stage's response (empty if it is trusted).
+        """
+        topics = parse_topics(response) if response is not None else None
+        if topics is None:
+            return ["unparseable"]
+        if not topics:
+            return ["empty"]
+
+        fired = []
+        if count_invalid(topics):
+            fired.append("invalid")
+        # sampled responses (see eval_engine._run_sampled) carry each topic's agreement
+        agreement = parse_json_object(response).get("agreement")
+        if isinstance(agreement, dict) and self_agreement(agreement) < self.min_self_agreement:
+            fired.append("low_agreement")
+        if self.baseline is not None and not encode(topics) & self.baseline.invoke_mask(question):
+            fired.append("baseline_disagreement")
+        return fired
+
+    def choose(self, question: str, responses: list[str | None]) -> tuple[int, list[list[str]]]:
+        """
+        Runs the gates over stage responses in order. Returns the index of the
+        stage whose answer is used and the gates fired at each stage asked.
+        This is the decision `invoke` makes live, for replaying the cascade
+        over responses the stage models already gave (e.g. in a run log).
+        """
+        fired_per_stage = []
+        for stage, response in enumerate(responses):
+            fired = self.gates(question, response)
+            fired_per_stage.append(fired)
+            if not fired:
+                return stage, fired_per_stage
+        return self._fallback(fired_per_stage), fired_per_stage
+
+    @staticmethod
+    def _fallback(fired_per_stage: list[list[str]]) -> int:
+        # the last stage, unless it is unparseable and an earlier stage isn't
+        for stage in range(len(fired_per_stage) - 1, -1, -1):
+            if fired_per_stage[stage] != ["unparseable"]:
+                return stage
+        return len(fired_per_stage) - 1
+
+    def record(self, stage: int, fired_per_stage: list[list[str]]) -> None:
+        with self._lock:
+            self.answered_by[stage] += 1
+            for asked, fired in enumerate(fired_per_stage):
+                self.asked[asked] += 1
+                for gate in fired:
+                    self.gate_counts[gate] += 1
+
+    def _ask(self, llm, system_prompt: str, user_text: str, stream: bool) -> str | None:
+        if self.samples > 1 and hasattr(llm, "sample"):
+            return _run_sampled(llm, system_prompt, user_text, self.samples)
+        invoke = getattr(llm, "invoke_stream", llm.invoke) if stream else llm.invoke
+        return invoke(system_prompt, user_text)
+
+    def _invoke(self, system_prompt: str, user_text: str, stream: bool) -> str | None:
+        with self.telemetry.track(self.model, "cascade") as stats:
+            responses: list[str | None] = []
+            fired_per_stage: list[list[str]] = []
+            for _, llm in self.stages:
+                responses.append(self._ask(llm, system_prompt, user_text, stream))
+                fired_per_stage.append(self.gates(user_text, responses[-1]))
+                if not fired_per_stage[-1]:
+                    break
+
+            if fired_per_stage[-1]:
+                stage = self._fallback(fired_per_stage)
+            else:
+                stage = len(responses) - 1
+            self.record(stage, fired_per_stage)
+            response = responses[stage]
+            stats.status = "ok" if response is not None else "error"
+            return response
+
+    def invoke(self, system_prompt: str, user_text: str) -> str | None:
+        """
+        Returns the answer of the first stage no gate fires on.
+        """
+        return self._invoke(system_prompt, user_text, stream=False)
+
+    def invoke_stream(self, system_prompt: str, user_text: str) -> str | None:
+        """
+        Like invoke, with stages that can stream called through invoke_stream.
+        """
+        return self._invoke(system_prompt, user_text, stream=True)
+
+    def escalation_rates(self) -> list[float]:
+        """
+        For each stage after the first, the fraction of questions escalated to it.
+        """
+        with self._lock:
+            if self.asked[0] == 0:
+                return [0.0] * (len(self.stages) - 1)
+            return [asked / self.asked[0] for asked in self.asked[1:]]
+
+    def summary(self) -> str:
+        """
+        One line of escalation rates and gate counts.
+        """
+        rates = ", ".join(
+            f"to {name}: {rate:.0%}"
+            for (name, _), rate in zip(self.stages[1:], self.escalation_rates())
+        )
+        with self._lock:
+            gates = ", ".join(f"{gate} {count}" for gate, count in self.gate_counts.items() if count)
+        return f"escalated {rates} (gates fired: {gates or 'none'})"
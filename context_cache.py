@@ -0,0 +1,188 @@
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types
+
+
+@dataclass
+class CachedContext:
+    # the API's resource name, "cachedContents/..."
+    name: str
+    expires_at: float
+
+
+class ContextCache:
+    """
+    Registers static request prefixes (a system prompt, optionally with
+    uploaded files) as Gemini cached contents, so later requests send only
+    what changes, e.g. the question, and refer to the cached prefix by name.
+    That cuts billed input tokens and prefill time for every call after the first.
+
+    Contexts are keyed by model and a hash of the prefix, so an edited prompt
+    file gets a fresh context, and the stale one is never used again.
+    Contexts are created with a TTL of `ttl_seconds`. A context used within
+    `refresh_margin_seconds` of its expiry has its TTL extended, so unused
+    contexts expire on their own and stop costing storage.
+
+    `get` returns None whenever the prefix can't be cached, and callers then
+    send the full prompt (the plain path). This happens when the prefix is
+    below the API's minimum size (checked locally for text, so no request is
+    wasted), when the model or server has no caching, or when a create call
+    fails. A prefix the API rejected is not tried again. One instance can be
+    shared by every wrapper using the same API key.
+
+    The topic prompts (about 300 tokens in full, half that when routed) are
+    well under the minimum, so for topic extraction this is a no-op until the
+    prompt grows (e.g. with worked examples). PDF extraction, whose prefix
+    holds the PDF itself, is cached.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 900,
+        refresh_margin_seconds: float = 180,
+        min_tokens: int = 1024,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        # the API rejects smaller contexts (the minimum is higher for some models)
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        self._entries: dict[str, CachedContext] = {}
+        # prefixes the API would not cache
+        self._rejected: set[str] = set()
+        # one lock per prefix, so concurrent callers create a context only once
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._clients: dict[str, genai.Client] = {}
+
+    @staticmethod
+    def make_key(model: str, system_instruction: str, contents_key: str = "") -> str:
+        """
+        The key of a prefix. `contents_key` identifies any cached files, e.g.
+        their content hash.
+        """
+        return hashlib.sha256(
+            json.dumps([model, system_instruction, contents_key]).encode("utf-8")
+        ).hexdigest()
+
+    def get(
+        self,
+        client: genai.Client,
+        model: str,
+        system_instruction: str,
+        contents: list | None = None,
+        contents_key: str = "",
+    ) -> str | None:
+        """
+        Returns the name of a live cached context for the prefix, creating or
+        refreshing it if needed, or None to use the plain path.
+        """
+        # files count towards the minimum but can't be measured here, leave it to the API
+        if not contents and len(system_instruction) // 4 < self.min_tokens:
+            return None
+
+        key = self.make_key(model, system_instruction, contents_key)
+        with self._lock:
+            if key in self._rejected:
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at - time.time() > self.refresh_margin_seconds:
+                return entry.name
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # another thread may have created or refreshed it meanwhile
+            with self._lock:
+                entry = self._entries.get(key)
+            now = time.time()
+            if entry is not None and entry.expires_at - now > self.refresh_margin_seconds:
+                return entry.name
+
+            if entry is not None and entry.expires_at > now:
+                refreshed = self._refresh(client, entry)
+                if refreshed is not None:
+                    return refreshed.name
+
+            return self._create(client, key, model, system_instruction, contents)
+
+    def _create(
+        self, client: genai.Client, key: str, model: str, system_instruction: str, contents: list | None
+    ) -> str | None:
+        try:
+            cached = client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    display_name=f"fyp-{key[:12]}",
+                    system_instruction=system_instruction,
+                    contents=contents,
+                    ttl=f"{self.ttl_seconds:.0f}s",
+                ),
+            )
+        except genai_errors.ClientError as e:
+            # too small, unsupported model, no caching endpoint: don't ask again
+            print(f"  [API Warning] Context caching unavailable, sending the full prompt: {e}")
+            with self._lock:
+                self._rejected.add(key)
+                self._entries.pop(key, None)
+            return None
+        except Exception as e:
+            # server errors and timeouts may pass, try again on a later call
+            print(f"  [API Warning] Could not create a cached context: {e}")
+            return None
+
+        entry = CachedContext(cached.name, self._expires_at(cached))
+        with self._lock:
+            self._entries[key] = entry
+            self._clients[entry.name] = client
+        return entry.name
+
+    def _refresh(self, client: genai.Client, entry: CachedContext) -> CachedContext | None:
+        """
+        Extends a context's TTL. Returns None if it is gone and must be recreated.
+        """
+        try:
+            cached = client.caches.update(
+                name=entry.name,
+                config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds:.0f}s"),
+            )
+        except Exception as e:
+            print(f"  [API Warning] Could not refresh cached context {entry.name}: {e}")
+            return None
+        entry.expires_at = self._expires_at(cached)
+        return entry
+
+    def _expires_at(self, cached: types.CachedContent) -> float:
+        if cached.expire_time is not None:
+            return cached.expire_time.timestamp()
+        return time.time() + self.ttl_seconds
+
+    def invalidate(self, name: str) -> None:
+        """
+        Forgets a context the API no longer accepts (expired or deleted
+        elsewhere). The next `get` for its prefix creates a new one.
+        """
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if entry.name == name:
+                    del self._entries[key]
+            self._clients.pop(name, None)
+
+    def clear(self) -> None:
+        """
+        Deletes every context this instance created, instead of waiting for
+        them to expire.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            clients = dict(self._clients)
+            self._entries.clear()
+            self._clients.clear()
+        for entry in entries:
+            try:
+                clients[entry.name].caches.delete(name=entry.name)
+            except Exception as e:
+                print(f"  [API Warning] Could not delete cached context {entry.name}: {e}")
@@ -0,0 +1,187 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from response_parsing import parse_json_object
+from topics import resolver
+
+
+def parse_topics(response: str) -> set | None:
+    """
+    Parses the "topics" list out of a model response.
+    Returns None if no JSON object could be found in the response, or if its
+    "topics" is not a list of strings (e.g. null), which counts as invalid output.
+    """
+    parsed = parse_json_object(response)
+    if parsed is None:
+        return None
+    topics = parsed.get("topics", [])
+    if not isinstance(topics, list) or not all(isinstance(topic, str) for topic in topics):
+        return None
+    return set(topics)
+
+
+def vote_topics(
+    responses: list[str | None], min_agreement: float = 0.5
+) -> tuple[set[str], dict[str, float]] | None:
+    """
+    Majority vote over sampled responses to the same question. Topic names are
+    resolved to the registry first, so spelling variants vote together, and
+    unparseable samples don't vote. Returns the topics chosen by more than
+    `min_agreement` of the voting samples, and every topic's agreement (the
+    fraction of voting samples that chose it), or None if no sample parsed.
+    """
+    votes: dict[str, int] = {}
+    num_voting = 0
+    for response in responses:
+        topics = parse_topics(response)
+        if topics is None:
+            continue
+        num_voting += 1
+        for topic in {resolver.canonical(topic) or topic for topic in topics}:
+            votes[topic] = votes.get(topic, 0) + 1
+
+    if num_voting == 0:
+        return None
+    agreement = {topic: count / num_voting for topic, count in votes.items()}
+    majority = {topic for topic, score in agreement.items() if score > min_agreement}
+    return majority, agreement
+
+
+def _run_sampled(llm, system_prompt: str, question: str, n: int) -> str | None:
+    """
+    Samples `n` responses with `llm.sample` and returns the voted prediction as
+    a single-question response (with the agreement scores alongside).
+    """
+    voted = vote_topics(llm.sample(system_prompt, question, n))
+    if voted is None:
+        return None
+    majority, agreement = voted
+    return json.dumps({"topics": sorted(majority), "agreement": agreement})
+
+
+def _timed(call, *args):
+    """
+    Runs `call(*args)` and returns (result, latency in seconds).
+    """
+    start = time.perf_counter()
+    result = call(*args)
+    return result, time.perf_counter() - start
+
+
+def _run_batch(llm, system_prompt: str, batch: dict[int, str]) -> dict[int, str | None]:
+    """
+    Runs one batch through `llm.invoke_batch` and re-encodes each answer as a
+    single-question response, so batched and unbatched results parse the same.
+    """
+    answers = llm.invoke_batch(system_prompt, {f"q{q_idx}": q for q_idx, q in batch.items()})
+    return {
+        q_idx: None
+        if answers[f"q{q_idx}"] is None
+        else json.dumps({"topics": answers[f"q{q_idx}"]})
+        for q_idx in batch
+    }
+
+
+def run_jobs(
+    questions: list[str],
+    llm_list: list,
+    system_prompt: str | list[str],
+    on_result=None,
+    skip: set[tuple[int, str]] | None = None,
+    stream: bool = False,
+    samples: int = 1,
+):
+    """
+    Sends every question x model job out at once and collects the raw responses.
+    `system_prompt` is either shared by all questions or a list with one
+    (e.g. routed) prompt per question. Jobs whose (q_idx, llm_name) is in
+    `skip` (e.g. already in a run log) are not sent. With `stream`, models
+    that have an `invoke_stream` method are called through it, so generation
+    stops as soon as the JSON answer is complete. With `samples` above 1,
+    models that have a `sample` method answer with the majority vote over that
+    many samples (see vote_topics) instead of a single response.
+
+    Each backend (wrapper class) gets its own thread pool sized by its
+    `max_concurrency`, so one slow backend cannot starve the others, while
+    requests stay paced by each wrapper's rate limiter. Models with a
+    `batch_size` above 1 get one job per batch of questions via `invoke_batch`
+    (and are not sampled).
+    `on_result(q_idx, llm_name, response, latency)` is called as each answer
+    completes (batched answers share their batch's latency), and an exception
+    it raises is printed rather than ending the run.
+
+    Returns a dict mapping (q_idx, llm_name) -> response (None on failure).
+    """
+    executors: dict[type, ThreadPoolExecutor] = {}
+    for _, llm in llm_list:
+        backend = type(llm)
+        if backend not in executors:
+            executors[backend] = ThreadPoolExecutor(
+                max_workers=getattr(backend, "max_concurrency", 1),
+                thread_name_prefix=backend.__name__,
+            )
+
+    if isinstance(system_prompt, str):
+        prompts = [system_prompt] * len(questions)
+    else:
+        prompts = system_prompt
+
+    # questions sharing a prompt, in question order, so batches never mix prompts
+    prompt_groups: dict[str, list[int]] = {}
+    for q_idx, prompt in enumerate(prompts):
+        prompt_groups.setdefault(prompt, []).append(q_idx)
+
+    skip = skip or set()
+    responses: dict[tuple[int, str], str | None] = {}
+    try:
+        futures = {}
+        # batched models get one job per batch of questions
+        for llm_name, llm in llm_list:
+            batch_size = getattr(llm, "batch_size", 1)
+            if batch_size <= 1:
+                continue
+            for prompt, q_idxs in prompt_groups.items():
+                q_idxs = [q_idx for q_idx in q_idxs if (q_idx, llm_name) not in skip]
+                for start in range(0, len(q_idxs), batch_size):
+                    batch = {q_idx: questions[q_idx] for q_idx in q_idxs[start : start + batch_size]}
+                    future = executors[type(llm)].submit(_timed, _run_batch, llm, prompt, batch)
+                    futures[future] = (list(batch), llm_name, True)
+
+        # submit question-major so each backend works through questions in order
+        for q_idx, question in enumerate(questions):
+            for llm_name, llm in llm_list:
+                if getattr(llm, "batch_size", 1) > 1 or (q_idx, llm_name) in skip:
+                    continue
+                if samples > 1 and hasattr(llm, "sample"):
+                    future = executors[type(llm)].submit(
+                        _timed, _run_sampled, llm, prompts[q_idx], question, samples
+                    )
+                else:
+                    invoke = getattr(llm, "invoke_stream", llm.invoke) if stream else llm.invoke
+                    future = executors[type(llm)].submit(_timed, invoke, prompts[q_idx], question)
+                futures[future] = ([q_idx], llm_name, False)
+
+        for future in as_completed(futures):
+            q_idxs, llm_name, is_batch = futures[future]
+            try:
+                result, latency = future.result()
+                if not is_batch:
+                    result = {q_idxs[0]: result}
+            except Exception as e:
+                # e.g. a 4xx from raise_for_status, keep the rest of the run going
+                print(f"  [API Error] {llm_name} on question(s) {[i + 1 for i in q_idxs]}: {e}")
+                result, latency = {q_idx: None for q_idx in q_idxs}, None
+            for q_idx, response in result.items():
+                responses[(q_idx, llm_name)] = response
+                if on_result is None:
+                    continue
+                try:
+                    on_result(q_idx, llm_name, response, latency)
+                except Exception as e:
+                    # a callback failing on one odd response shouldn't lose the in-flight jobs
+                    print(f"  [Error] Handling {llm_name} on question {q_idx + 1} failed: {e}")
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return responses
@@ -0,0 +1,404 @@
+import argparse
+import os
+import pathlib
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import numpy as np
+from dotenv import load_dotenv
+from bootstrap import Bootstrap
+from eval_engine import parse_topics, run_jobs
+from metrics import MetricAccumulator
+from prompt_routing import TopicRouter
+from question_store import QuestionStore, question_key
+from run_log import RunLog, make_key, read_records
+from topics import count_invalid, encode
+
+# backends a grid's models can use, each run in its own worker process
+BACKENDS = ("nala", "gemini", "baseline")
+
+# bootstrap replicates per cell of the grid report, enough for a stable 95%
+# kappa interval without making a table of dozens of cells slow
+GRID_REPLICATES = 1000
+
+
+@dataclass
+class ModelSpec:
+    # label in run logs and the table, e.g. "GPT-5 (high)"
+    label: str
+    backend: str
+    model: str | None
+    # reasoning_effort (NALA) or thinking_level (Gemini)
+    setting: str | None
+
+
+@dataclass
+class Grid:
+    name: str
+    run_dir: pathlib.Path
+    # prompt name -> system prompt text
+    prompts: dict[str, str]
+    models: list[ModelSpec]
+    # subset name -> filter, see select_questions
+    subsets: dict[str, dict]
+    routing: bool = True
+    stream: bool = True
+    samples: int = 1
+
+
+@dataclass
+class Cell:
+    prompt: str
+    model: str
+    subset: str
+    # keys of the cell's jobs (see run_log.make_key), in question order
+    job_keys: list[str]
+
+
+def load_grid(path: str) -> Grid:
+    """
+    Reads an experiment grid from a TOML file (see experiments.toml).
+    """
+    with open(path, mode="rb") as f:
+        config = tomllib.load(f)
+
+    name = config.get("name", pathlib.Path(path).stem)
+    prompts = {}
+    for prompt_name, prompt_path in config["prompts"].items():
+        with open(prompt_path, mode="r") as f:
+            prompts[prompt_name] = f.read()
+
+    samples = config.get("samples", 1)
+    models = []
+    for entry in config["models"]:
+        if entry["backend"] not in BACKENDS:
+            raise ValueError(
+                f"Unknown backend {entry['backend']!r} for {entry['name']}, expected one of {BACKENDS}"
+            )
+        # the local baseline has no settings and isn't sampled
+        settings = entry.get("settings", [None]) if entry["backend"] != "baseline" else [None]
+        for setting in settings:
+            label = entry["name"] if setting is None else f"{entry['name']} ({setting})"
+            if samples > 1 and entry["backend"] != "baseline":
+                label += f" (vote@{samples})"
+            models.append(ModelSpec(label, entry["backend"], entry.get("model"), setting))
+
+    labels = [spec.label for spec in models]
+    if len(set(labels)) != len(labels):
+        raise ValueError(f"Model labels must be unique, got {labels}")
+
+    return Grid(
+        name=name,
+        run_dir=pathlib.Path(config.get("run_dir", f"runs/{name}")),
+        prompts=prompts,
+        models=models,
+        subsets=config.get("subsets", {"all": {}}),
+        routing=config.get("routing", True),
+        stream=config.get("stream", True),
+        samples=samples,
+    )
+
+
+def select_questions(df, subset: dict):
+    """
+    The rows of the labelled question bank in a subset. A subset may list
+    `major_topics` to keep and a `limit` on the number of questions (taken in
+    bank order after the major topic filter).
+    """
+    if "major_topics" in subset:
+        df = df[df["major_topic"].isin(subset["major_topics"])]
+    if "limit" in subset:
+        df = df.head(subset["limit"])
+    return df
+
+
+def expand(grid: Grid, df) -> tuple[list[Cell], dict[str, dict]]:
+    """
+    Expands a grid into cells (prompt x model x subset) and the jobs they
+    need. A question x prompt x model job in several subsets is run once and
+    shared by every cell that needs it. Returns (cells, jobs by key).
+    """
+    routers = {}
+    if grid.routing:
+        routers = {name: TopicRouter(prompt) for name, prompt in grid.prompts.items()}
+
+    jobs: dict[str, dict] = {}
+    cells = []
+    for subset_name, subset in grid.subsets.items():
+        rows = select_questions(df, subset)
+        for prompt_name, prompt in grid.prompts.items():
+            if grid.routing:
+                prompt_texts = [
+                    routers[prompt_name].route(q, m)
+                    for q, m in zip(rows["question"], rows["major_topic"])
+                ]
+            else:
+                prompt_texts = [prompt] * len(rows)
+            for spec in grid.models:
+                job_keys = []
+                for (_, row), prompt_text in zip(rows.iterrows(), prompt_texts):
+                    key = make_key(row["question"], spec.label, prompt_text)
+                    job_keys.append(key)
+                    jobs.setdefault(
+                        key,
+                        {
+                            "key": key,
+                            "question": row["question"],
+                            "major_topic": row["major_topic"],
+                            "target_topics": sorted(t.strip() for t in row["topics"].split(",")),
+                            "prompt": prompt_name,
+                            "prompt_text": prompt_text,
+                            "model": spec.label,
+                            "backend": spec.backend,
+                        },
+                    )
+                cells.append(Cell(prompt_name, spec.label, subset_name, job_keys))
+    return cells, jobs
+
+
+def make_llm(spec: ModelSpec):
+    """
+    Builds the wrapper of one model x setting, in the worker process that runs it.
+    """
+    from llm_wrappers import GeminiWrapper, NalaGPTWrapper, ResponseCache
+
+    if spec.backend == "baseline":
+        from baseline_classifier import BaselineTopicClassifier
+
+        return BaselineTopicClassifier()
+
+    cache = ResponseCache(
+        os.getenv("LLM_CACHE", "llm_cache.sqlite"),
+        replay_only=os.getenv("LLM_REPLAY_ONLY") == "1",
+    )
+    kwargs = {"model": spec.model} if spec.model else {}
+    if spec.backend == "nala":
+        if spec.setting is not None:
+            kwargs["reasoning_effort"] = spec.setting
+        return NalaGPTWrapper(os.getenv("NALA_API_KEY"), cache=cache, **kwargs)
+
+    from context_cache import ContextCache
+
+    if spec.setting is not None:
+        kwargs["thinking_level"] = spec.setting
+    return GeminiWrapper(
+        os.getenv("GEMINI_API_KEY"),
+        requests_per_minute=int(os.getenv("GEMINI_RPM", "15")),
+        cache=cache,
+        context_cache=ContextCache(),
+        **kwargs,
+    )
+
+
+def run_backend(
+    backend: str, specs: list[ModelSpec], jobs: list[dict], log_path: str, stream: bool, samples: int
+) -> int:
+    """
+    Runs one backend's pending jobs in a worker process and appends each
+    answer to that backend's run log. Returns the number of jobs answered.
+
+    Jobs are sent question-major through run_jobs, so every model x setting
+    of the backend is kept busy and the backend's rate budget stays in use.
+    """
+    load_dotenv()
+    llm_list = [(spec.label, make_llm(spec)) for spec in specs]
+
+    # one entry per distinct (question, prompt) pair, models not asked are skipped
+    items: dict[tuple[str, str], int] = {}
+    wanted: set[tuple[int, str]] = set()
+    job_by_item: dict[tuple[int, str], dict] = {}
+    for job in jobs:
+        idx = items.setdefault((job["question"], job["prompt_text"]), len(items))
+        wanted.add((idx, job["model"]))
+        job_by_item[(idx, job["model"])] = job
+    questions = [question for question, _ in items]
+    prompts = [prompt_text for _, prompt_text in items]
+    skip = {(idx, spec.label) for idx in range(len(items)) for spec in specs} - wanted
+
+    run_log = RunLog(log_path)
+    answered = 0
+
+    def on_result(idx: int, llm_name: str, response: str | None, latency: float | None) -> None:
+        nonlocal answered
+        job = job_by_item[(idx, llm_name)]
+        topics = parse_topics(response) if response is not None else None
+        run_log.append(
+            {
+                "key": job["key"],
+                "question": job["question"],
+                "major_topic": job["major_topic"],
+                "target_topics": job["target_topics"],
+                "prompt": job["prompt"],
+                "model": llm_name,
+                "raw_response": response,
+                "topics": sorted(topics) if topics is not None else None,
+                "latency_s": latency,
+            }
+        )
+        answered += response is not None
+        print(f"  [{backend}] {answered}/{len(jobs)} {llm_name} ({job['prompt']})", flush=True)
+
+    try:
+        run_jobs(
+            questions, llm_list, prompts, on_result=on_result, skip=skip, stream=stream, samples=samples
+        )
+    finally:
+        run_log.close()
+    return answered
+
+
+def completed_records(run_dir: pathlib.Path) -> dict[str, dict]:
+    """
+    The latest answered record of every job in a grid's run logs.
+    """
+    return {
+        record["key"]: record
+        for record in read_records(*sorted(str(path) for path in run_dir.glob("*.jsonl")))
+        if record.get("raw_response") is not None
+    }
+
+
+def run_grid(grid: Grid, workers: int | None = None) -> None:
+    """
+    Runs every job of the grid that isn't in its run logs yet, with one
+    worker process per backend. Backends don't share a rate budget, so they
+    run side by side and the grid takes as long as its slowest backend's quota
+    allows. Wrappers sharing an API key still share its rate limiter across
+    processes (see rate_limiter.py).
+    """
+    df = QuestionStore().questions(labelled=True)
+    cells, jobs = expand(grid, df)
+    done = completed_records(grid.run_dir)
+
+    complete = [cell for cell in cells if all(key in done for key in cell.job_keys)]
+    pending = [job for key, job in jobs.items() if key not in done]
+    print(
+        f"Grid {grid.name!r}: {len(cells)} cells, {len(complete)} already complete; "
+        f"{len(jobs)} distinct jobs, {len(pending)} to run",
+        # flushed before the workers fork, so they don't print it again
+        flush=True,
+    )
+    if not pending:
+        return
+
+    # question-major, so every prompt's cells fill up together and early results
+    # already cover the whole grid
+    order = {question: i for i, question in enumerate(df["question"])}
+    pending.sort(key=lambda job: order[job["question"]])
+
+    by_backend: dict[str, list[dict]] = {}
+    for job in pending:
+        by_backend.setdefault(job["backend"], []).append(job)
+    grid.run_dir.mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=workers or len(by_backend)) as executor:
+        # the backend with the most jobs first, in case there are fewer workers than backends
+        futures = {
+            executor.submit(
+                run_backend,
+                backend,
+                [spec for spec in grid.models if spec.backend == backend],
+                backend_jobs,
+                str(grid.run_dir / f"{backend}.jsonl"),
+                grid.stream,
+                grid.samples,
+            ): backend
+            for backend, backend_jobs in sorted(by_backend.items(), key=lambda item: -len(item[1]))
+        }
+        for future in as_completed(futures):
+            backend = futures[future]
+            try:
+                answered = future.result()
+                print(f"[{backend}] {answered}/{len(by_backend[backend])} jobs answered")
+            except Exception as e:
+                print(f"  [API Error] {backend} worker failed: {e}")
+
+
+def print_grid_report(grid: Grid, n_replicates: int = GRID_REPLICATES) -> None:
+    """
+    Prints one comparison table of every cell in the grid, from its run logs:
+    kappa (with a bootstrap interval), micro-F1, invalid topics and median
+    latency, grouped by question subset.
+    """
+    df = QuestionStore().questions(labelled=True)
+    cells, _ = expand(grid, df)
+    done = completed_records(grid.run_dir)
+    bootstrap = Bootstrap(n_replicates) if n_replicates > 0 else None
+
+    print("\n" + "=" * 60)
+    print(f"EXPERIMENT GRID — {grid.name}")
+    print("=" * 60)
+
+    prompt_width = max(len(name) for name in grid.prompts)
+    model_width = max(len(spec.label) for spec in grid.models)
+    header = (
+        f"{'prompt':<{prompt_width}}  {'model':<{model_width}}  {'n':>7}  {'kappa':<24}"
+        f"  {'micro-F1':>8} {'invalid':>7} {'p50 s':>7}"
+    )
+    for subset in grid.subsets:
+        print(f"\nSubset: {subset}")
+        print(header)
+        print("-" * len(header))
+        for cell in (cell for cell in cells if cell.subset == subset):
+            records = [done[key] for key in cell.job_keys if key in done]
+            accumulator = MetricAccumulator()
+            outcomes = {}
+            for record in records:
+                extracted_topics = set(record["topics"] or [])
+                true_mask, pred_mask = encode(record["target_topics"]), encode(extracted_topics)
+                accumulator.update(true_mask, pred_mask, num_invalid=count_invalid(extracted_topics))
+                outcomes[question_key(record["question"])] = (true_mask, pred_mask)
+
+            kappa = f"{accumulator.kappa():.4f}"
+            if bootstrap is not None and outcomes:
+                kappa = str(bootstrap.kappa_interval(outcomes))
+            latencies = [record["latency_s"] for record in records if record["latency_s"] is not None]
+            p50 = f"{np.median(latencies):7.2f}" if latencies else "-".rjust(7)
+            print(
+                f"{cell.prompt:<{prompt_width}}  {cell.model:<{model_width}}"
+                f"  {f'{len(records)}/{len(cell.job_keys)}':>7}  {kappa:<24}"
+                f"  {accumulator.micro_f1():8.4f} {accumulator.invalid:>7} {p50}"
+            )
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run an experiment grid (prompts x models x settings x subsets) and compare its cells."
+    )
+    parser.add_argument("config", nargs="?", default="experiments.toml", help="grid definition (TOML)")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only print how many jobs are left to run"
+    )
+    parser.add_argument(
+        "--report-only",
+        action="store_true",
+        help="print the table from the run logs without running anything",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="worker processes (defaults to one per backend)"
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=GRID_REPLICATES,
+        help="bootstrap replicates per cell for the kappa intervals (0 to skip)",
+    )
+    args = parser.parse_args()
+
+    grid = load_grid(args.config)
+    if args.dry_run:
+        cells, jobs = expand(grid, QuestionStore().questions(labelled=True))
+        done = completed_records(grid.run_dir)
+        for cell in cells:
+            remaining = sum(key not in done for key in cell.job_keys)
+            print(
+                f"  {cell.subset} / {cell.prompt} / {cell.model}: "
+                f"{remaining}/{len(cell.job_keys)} jobs left"
+            )
+        print(f"{sum(key not in done for key in jobs)}/{len(jobs)} distinct jobs left")
+    else:
+        if not args.report_only:
+            run_grid(grid, args.workers)
+        print_grid_report(grid, args.bootstrap)
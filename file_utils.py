@@ -0,0 +1,36 @@
+import hashlib
+import json
+import os
+import pathlib
+
+
+def file_hash(path) -> str:
+    """
+    SHA-256 of a file's contents, used to key caches of per-file work.
+    """
+    digest = hashlib.sha256()
+    with open(path, mode="rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_json_cache(path: pathlib.Path):
+    """
+    Returns the JSON value cached at `path`, or None if there is no entry or
+    it doesn't decode (e.g. left truncated by an older, non-atomic write).
+    """
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def write_json_atomic(path: pathlib.Path, value, **dumps_kwargs) -> None:
+    """
+    Writes `value` as JSON to a temporary file and renames it over `path`,
+    so an interrupted write never leaves a partial cache entry behind.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(value, **dumps_kwargs), encoding="utf-8")
+    os.replace(tmp_path, path)
@@ -0,0 +1,227 @@
+import argparse
+import os
+import sys
+from model_registry import MODELS
+from topics import MAJOR_TOPICS
+
+# modules that take a noticeable time to import, by what needs them. `fyp
+# --help` imports none of them, and every other command only what it uses
+BACKEND_MODULES: dict[str, list[str]] = {
+    "gemini": ["langchain_google_genai", "google.genai"],
+    "baseline": ["sklearn"],
+    "question bank": ["pandas"],
+    "app": ["streamlit"],
+}
+
+# import time in seconds (over a bare interpreter) each kind of command may
+# spend before doing any work, checked by `python benchmark.py startup`
+IMPORT_BUDGETS_S: dict[str, float] = {
+    "help": 0.1,
+    "nala": 0.6,
+    "baseline": 2.5,
+    "gemini": 2.0,
+}
+
+
+def cmd_extract(args: argparse.Namespace) -> None:
+    """
+    Extracts the topics of one or more questions with the chosen models,
+    building only those models' wrappers.
+    """
+    import json
+    from dotenv import load_dotenv
+    from eval_engine import parse_topics, run_jobs
+
+    load_dotenv()
+    models = args.models or ["gemini-low"]
+    questions = args.questions
+    if questions == ["-"]:
+        # one question per line, so shell loops can send many questions to one process
+        questions = [line.strip() for line in sys.stdin if line.strip()]
+
+    with open(args.prompt, mode="r") as f:
+        system_prompt = f.read()
+    prompts = [system_prompt] * len(questions)
+    if args.major_topic is not None:
+        from prompt_routing import TopicRouter
+
+        router = TopicRouter(system_prompt)
+        prompts = [router.route(q, args.major_topic) for q in questions]
+
+    cache = None
+    if any(key != "baseline" for key in models):
+        from llm_wrappers import ResponseCache
+
+        cache = ResponseCache(os.getenv("LLM_CACHE", "llm_cache.sqlite"))
+    context_cache = None
+    if any(key.startswith("gemini") for key in models):
+        from context_cache import ContextCache
+
+        context_cache = ContextCache()
+
+    from model_registry import build_models
+
+    llm_list = build_models(
+        models, cache=cache, context_cache=context_cache, batch_size=args.batch_size
+    )
+
+    def on_result(q_idx: int, llm_name: str, response: str | None, latency: float | None) -> None:
+        topics = parse_topics(response) if response is not None else None
+        if args.json:
+            print(
+                json.dumps(
+                    {
+                        "question": questions[q_idx],
+                        "model": llm_name,
+                        "topics": sorted(topics) if topics is not None else None,
+                        "latency_s": latency,
+                    },
+                    ensure_ascii=False,
+                ),
+                flush=True,
+            )
+            return
+        prefix = f"[{q_idx + 1}/{len(questions)}] {llm_name}"
+        if response is None:
+            print(f"{prefix}: ERROR: No response received.")
+        elif topics is None:
+            print(f"{prefix}: ERROR: Could not parse response: {response[:100]}")
+        else:
+            print(f"{prefix}: {sorted(topics)} ({latency:.2f}s)")
+
+    try:
+        run_jobs(
+            questions, llm_list, prompts, on_result=on_result, stream=True, samples=args.samples
+        )
+    finally:
+        if context_cache is not None:
+            context_cache.clear()
+
+
+def cmd_eval(args: argparse.Namespace) -> None:
+    """
+    Runs the full evaluation (topic_extraction_test.py), configured through
+    the environment variables it reads.
+    """
+    import runpy
+
+    settings = {
+        "EVAL_MODELS": ",".join(args.models) if args.models else None,
+        "LLM_REPLAY_ONLY": "1" if args.replay else None,
+        "SELF_CONSISTENCY": str(args.samples) if args.samples else None,
+        "EVAL_BATCH_SIZE": str(args.batch_size) if args.batch_size else None,
+        "RUN_LOG": args.run_log,
+        "LLM_STREAM": "0" if args.no_stream else None,
+        "TOPIC_ROUTING": "0" if args.no_routing else None,
+        "CASCADE": "0" if args.no_cascade else None,
+        "BOOTSTRAP": str(args.bootstrap) if args.bootstrap is not None else None,
+    }
+    os.environ.update({name: value for name, value in settings.items() if value is not None})
+    runpy.run_module("topic_extraction_test", run_name="__main__")
+
+
+def cmd_label(args: argparse.Namespace) -> None:
+    import runpy
+
+    runpy.run_module("topic_labelling", run_name="__main__")
+
+
+def cmd_ingest(args: argparse.Namespace) -> None:
+    from latex_ocr_test_gemini import main
+
+    main(args.folder)
+
+
+def cmd_topics(args: argparse.Namespace, extra: list[str]) -> None:
+    from topic_list_extractor import main
+
+    main(extra)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="fyp", description="Topic extraction from student questions using LLMs."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="extract the topics of one or more questions")
+    extract.add_argument(
+        "questions", nargs="+", help='question text(s), or "-" to read one per line from stdin'
+    )
+    extract.add_argument(
+        "-m",
+        "--model",
+        dest="models",
+        action="append",
+        choices=list(MODELS),
+        help="model to ask, repeat for several (default: gemini-low)",
+    )
+    extract.add_argument(
+        "--major-topic", choices=list(MAJOR_TOPICS), help="send only this major topic's topics"
+    )
+    extract.add_argument("--prompt", default="system_prompt.md", help="system prompt file")
+    extract.add_argument("--samples", type=int, default=1, help="majority vote over n samples")
+    extract.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="questions per Gemini request (batched models are not streamed or sampled)",
+    )
+    extract.add_argument("--json", action="store_true", help="print one JSON object per answer")
+    extract.set_defaults(handler=cmd_extract)
+
+    evaluate = commands.add_parser("eval", help="evaluate models on the labelled question bank")
+    evaluate.add_argument(
+        "-m",
+        "--model",
+        dest="models",
+        action="append",
+        choices=list(MODELS),
+        help="model to evaluate, repeat for several (default: all models)",
+    )
+    evaluate.add_argument(
+        "--replay", action="store_true", help="only use cached responses, no API calls"
+    )
+    evaluate.add_argument("--samples", type=int, help="majority vote over n samples per question")
+    evaluate.add_argument(
+        "--batch-size",
+        type=int,
+        help="questions per Gemini request (batched models are not streamed or sampled)",
+    )
+    evaluate.add_argument("--run-log", help="run log to append to and resume from")
+    evaluate.add_argument("--no-stream", action="store_true", help="wait for full completions")
+    evaluate.add_argument("--no-routing", action="store_true", help="send the full topic list")
+    evaluate.add_argument("--no-cascade", action="store_true", help="leave out the cascade report")
+    evaluate.add_argument("--bootstrap", type=int, help="bootstrap replicates (0 to skip)")
+    evaluate.set_defaults(handler=cmd_eval)
+
+    label = commands.add_parser("label", help="label the question bank's questions by hand")
+    label.set_defaults(handler=cmd_label)
+
+    ingest = commands.add_parser(
+        "ingest", help="extract questions from PDF worksheets into the bank"
+    )
+    ingest.add_argument("folder", nargs="?", default="./question sources")
+    ingest.set_defaults(handler=cmd_ingest)
+
+    # its options are topic_list_extractor.py's own, see `fyp topics --help`
+    topics = commands.add_parser(
+        "topics", help="extract the topic list from lecture notes", add_help=False
+    )
+    topics.set_defaults(handler=cmd_topics)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.command == "topics":
+        args.handler(args, extra)
+        return
+    if extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
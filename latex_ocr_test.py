@@ -1,7 +1,148 @@
-from pix2text import Pix2Text
+import argparse
+import os
+import pathlib
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pdf2image import convert_from_path, pdfinfo_from_path
+from file_utils import file_hash
 
-p2t = Pix2Text()
+# loaded once per worker process by _init_worker
+p2t = None
 
-# process PDF file
-doc = p2t.recognize_pdf("question sources/linear_algebra.pdf")
-doc.to_markdown("linalg.md")
+# rough resident memory of one worker with Pix2Text's models loaded
+WORKER_MEMORY_BYTES = 2 * 1024**3
+
+
+def default_workers() -> int:
+    """
+    As many workers as there are cores and free memory for, since every
+    worker holds its own copy of the models.
+    """
+    try:
+        available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        # no sysconf (e.g. Windows), stay conservative
+        return 2
+    return max(1, min(os.cpu_count() or 1, available // WORKER_MEMORY_BYTES))
+
+
+def _init_worker() -> None:
+    global p2t
+    from pix2text import Pix2Text
+
+    p2t = Pix2Text()
+
+
+def render_page(pdf_path: str, page_no: int, dpi: int, cache_dir: pathlib.Path, digest: str) -> pathlib.Path:
+    """
+    Renders one page to PNG, cached by PDF hash, page and DPI.
+    """
+    image_path = cache_dir / "pages" / f"{digest}_{page_no}_{dpi}.png"
+    if not image_path.exists():
+        image_path.parent.mkdir(parents=True, exist_ok=True)
+        # only this page is rasterised, so memory stays at one page per worker
+        image = convert_from_path(pdf_path, dpi=dpi, first_page=page_no, last_page=page_no)[0]
+        tmp_path = image_path.with_suffix(".tmp.png")
+        image.save(tmp_path)
+        os.replace(tmp_path, image_path)
+    return image_path
+
+
+def ocr_dir(cache_dir: pathlib.Path, digest: str, page_no: int, dpi: int) -> pathlib.Path:
+    """
+    Directory holding one page's cached markdown and figures.
+    """
+    return cache_dir / "ocr" / f"{digest}_{page_no}_{dpi}"
+
+
+def ocr_page(args: tuple[str, int, int, str, str]) -> tuple[int, str]:
+    """
+    Runs OCR on one page in a worker process. Returns (page number, directory
+    holding the page's markdown and figures), cached by PDF hash, page and DPI.
+    """
+    pdf_path, page_no, dpi, cache_dir_str, digest = args
+    cache_dir = pathlib.Path(cache_dir_str)
+    page_dir = ocr_dir(cache_dir, digest, page_no, dpi)
+    if (page_dir / "page.md").exists():
+        return page_no, str(page_dir)
+
+    image_path = render_page(pdf_path, page_no, dpi, cache_dir, digest)
+    page = p2t.recognize_page(str(image_path), page_id=str(page_no))
+
+    # write to a temporary directory first so a crash never leaves a partial cache entry
+    tmp_dir = page_dir.with_name(page_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    page.to_markdown(str(tmp_dir), markdown_fn="page.md")
+    shutil.rmtree(page_dir, ignore_errors=True)
+    os.replace(tmp_dir, page_dir)
+    return page_no, str(page_dir)
+
+
+def recognize_pdf(
+    pdf_path: str,
+    out_dir: str,
+    dpi: int = 300,
+    workers: int | None = None,
+    cache_dir: str = ".ocr_cache",
+) -> None:
+    """
+    OCRs a PDF page by page across a process pool and streams the result to
+    `out_dir`/output.md (with figures in `out_dir`/figures), in page order.
+    The pool (and its model loads) is only started for pages not in the cache,
+    with at most `workers` processes (see default_workers).
+    """
+    num_pages = pdfinfo_from_path(pdf_path)["Pages"]
+    digest = file_hash(pdf_path)
+    out_path = pathlib.Path(out_dir)
+    (out_path / "figures").mkdir(parents=True, exist_ok=True)
+    cache_path = pathlib.Path(cache_dir)
+    cache_path.mkdir(parents=True, exist_ok=True)
+
+    pending = [
+        (pdf_path, page_no, dpi, cache_dir, digest)
+        for page_no in range(1, num_pages + 1)
+        if not (ocr_dir(cache_path, digest, page_no, dpi) / "page.md").exists()
+    ]
+    executor = None
+    ocr_results = iter(())
+    if pending:
+        workers = min(workers or default_workers(), len(pending))
+        print(f"OCR of {len(pending)}/{num_pages} pages on {workers} workers, the rest are cached")
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        # map yields results in page order, so each page is written as soon as
+        # it and all pages before it are done
+        ocr_results = executor.map(ocr_page, pending)
+    pending_pages = {page_no for _, page_no, _, _, _ in pending}
+
+    try:
+        with open(out_path / "output.md", mode="w", encoding="utf-8") as md_file:
+            for page_no in range(1, num_pages + 1):
+                if page_no in pending_pages:
+                    _, page_dir_str = next(ocr_results)
+                    page_dir = pathlib.Path(page_dir_str)
+                else:
+                    page_dir = ocr_dir(cache_path, digest, page_no, dpi)
+                md_file.write((page_dir / "page.md").read_text(encoding="utf-8"))
+                md_file.write("\n\n")
+                md_file.flush()
+
+                figures_dir = page_dir / "figures"
+                if figures_dir.is_dir():
+                    shutil.copytree(figures_dir, out_path / "figures", dirs_exist_ok=True)
+                print(f"Page {page_no}/{num_pages} done")
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Page-parallel Pix2Text OCR of a PDF to markdown.")
+    parser.add_argument("pdf", nargs="?", default="question sources/linear_algebra.pdf")
+    parser.add_argument("--out", default="linalg.md", help="output directory (markdown + figures)")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=None, help="defaults to what cores and free memory allow")
+    parser.add_argument("--cache-dir", default=".ocr_cache")
+    args = parser.parse_args()
+
+    # process PDF file
+    recognize_pdf(args.pdf, args.out, dpi=args.dpi, workers=args.workers, cache_dir=args.cache_dir)
@@ -1,9 +1,17 @@
 import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 import pathlib
-import pandas as pd
 from google import genai
+from google.genai import errors as genai_errors
 from google.genai import types
+from pdf2image import pdfinfo_from_path
+from pdf2image.exceptions import PDFInfoNotInstalledError, PDFPageCountError
+from context_cache import ContextCache
+from file_utils import file_hash, read_json_cache, write_json_atomic
+from question_store import QuestionStore, question_key
 
 # get API key
 load_dotenv("../.env")
@@ -11,92 +19,245 @@ load_dotenv("../.env")
 # create client
 client = genai.Client()
 
+PROMPT = """
+You are a highly accurate mathematical document parser.
+I have provided a PDF tutorial worksheet. Your task is to extract ONLY the exercises/questions from this document.
 
-def extract_questions_to_csv(pdf_folder_str):
+Strict Formatting Rules:
+1. Output a valid JSON object with a single key "questions". Its value must be a list of strings, where each string contains exactly one question.
+2. Do not extract question numbers and headings.
+3. Convert all mathematical equations, variables, matrices, and expressions into strict LaTeX format.
+4. Use a single dollar sign ($...$) for inline equations.
+5. Use double dollar signs ($$...$$) for display/block equations.
+6. Do not include the answers or hints provided in the document brackets. Extract the question text and math only.
+"""
+
+# extraction results and File API uploads are cached by PDF content hash
+CACHE_DIR = pathlib.Path(".ingest_cache")
+# long PDFs are split into page ranges that are extracted concurrently
+PAGES_PER_CHUNK = 10
+MAX_WORKERS = 4
+MODEL = "gemini-3.1-flash-lite-preview"
+
+# the page ranges of a long PDF share one cached context holding the PDF and
+# the prompt, so each range request only sends its page numbers
+context_cache = ContextCache()
+
+
+def page_ranges(pdf_path: pathlib.Path) -> list[tuple[int, int] | None]:
+    """
+    Splits a PDF into 1-indexed inclusive page ranges of PAGES_PER_CHUNK pages.
+    Returns [None] (the whole document) for short PDFs or if poppler is missing.
+    """
+    try:
+        num_pages = pdfinfo_from_path(str(pdf_path))["Pages"]
+    except (PDFInfoNotInstalledError, PDFPageCountError):
+        return [None]
+    if num_pages <= PAGES_PER_CHUNK:
+        return [None]
+    return [
+        (start, min(start + PAGES_PER_CHUNK - 1, num_pages))
+        for start in range(1, num_pages + 1, PAGES_PER_CHUNK)
+    ]
+
+
+class UploadCache:
+    """
+    Maps PDF content hashes to File API uploads, so a PDF is uploaded once
+    even when several page ranges (or a rerun after a failure) need it.
+    """
+
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._digest_locks: dict[str, threading.Lock] = {}
+        self._names: dict[str, str] = read_json_cache(path) or {}
+
+    def _save(self) -> None:
+        write_json_atomic(self.path, self._names, indent=2)
+
+    def get_or_upload(self, pdf_path: pathlib.Path, digest: str):
+        with self._lock:
+            digest_lock = self._digest_locks.setdefault(digest, threading.Lock())
+
+        with digest_lock:
+            name = self._names.get(digest)
+            if name is not None:
+                try:
+                    # uploads expire after 48h, only reuse ones that still exist
+                    return client.files.get(name=name)
+                except Exception:
+                    pass
+
+            print(f"Uploading {pdf_path.name}...")
+            uploaded_file = client.files.upload(file=pdf_path)
+            with self._lock:
+                self._names[digest] = uploaded_file.name
+                self._save()
+            return uploaded_file
+
+    def release(self, digest: str) -> None:
+        with self._lock:
+            name = self._names.pop(digest, None)
+            self._save()
+        if name is not None:
+            print("Cleaning up File API data...")
+            client.files.delete(name=name)
+
+
+def extraction_cache_path(digest: str, page_range: tuple[int, int] | None) -> pathlib.Path:
+    prompt_hash = hashlib.sha256(PROMPT.encode("utf-8")).hexdigest()[:12]
+    suffix = "all" if page_range is None else f"{page_range[0]}-{page_range[1]}"
+    return CACHE_DIR / f"{digest}_{prompt_hash}_{suffix}.json"
+
+
+def extract_range(
+    pdf_path: pathlib.Path, digest: str, page_range: tuple[int, int] | None, uploads: UploadCache
+) -> list[str]:
+    """
+    Extracts the questions on one page range of a PDF (or the whole PDF),
+    served from the extraction cache if this content was already processed.
+    """
+    cache_path = extraction_cache_path(digest, page_range)
+    cached = read_json_cache(cache_path)
+    if cached is not None:
+        return cached
+
+    uploaded_file = uploads.get_or_upload(pdf_path, digest)
+    prompt = PROMPT
+    range_instruction = None
+    if page_range is not None:
+        range_instruction = f"7. Only extract questions that start on pages {page_range[0]} to {page_range[1]} of the document."
+        prompt += f"\n{range_instruction}\n"
+
+    response = None
+    if range_instruction is not None:
+        context = context_cache.get(
+            client,
+            MODEL,
+            PROMPT,
+            contents=[
+                types.Content(
+                    role="user",
+                    parts=[
+                        types.Part.from_uri(
+                            file_uri=uploaded_file.uri, mime_type=uploaded_file.mime_type
+                        )
+                    ],
+                )
+            ],
+            contents_key=digest,
+        )
+        if context is not None:
+            try:
+                response = client.models.generate_content(
+                    model=MODEL,
+                    contents=[range_instruction],
+                    config=types.GenerateContentConfig(
+                        cached_content=context,
+                        response_mime_type="application/json",
+                    ),
+                )
+            except genai_errors.ClientError as e:
+                # expired or deleted meanwhile, send the PDF and prompt instead
+                print(f"  [API Warning] Cached context rejected for {pdf_path.name}: {e}")
+                context_cache.invalidate(context)
+
+    if response is None:
+        # enforce JSON output using the generation config
+        response = client.models.generate_content(
+            model=MODEL,
+            contents=[uploaded_file, prompt],
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+            ),
+        )
+
+    # parse JSON response
+    questions = json.loads(response.text).get("questions", [])
+    write_json_atomic(cache_path, questions, ensure_ascii=False)
+    return questions
+
+
+def extract_questions_to_bank(pdf_folder_str, store: QuestionStore) -> int:
+    """
+    Extracts questions from every PDF in a folder into the question bank.
+    PDFs and their page ranges are processed concurrently; unchanged PDFs are
+    served from the cache without any upload or model call. Questions already
+    in the bank, or near-duplicates of one (e.g. from an overlapping
+    worksheet), are skipped. Returns the number of new questions added.
+    """
     pdf_folder = pathlib.Path(pdf_folder_str)
 
     if not pdf_folder.is_dir():
         print(f"Error: Directory '{pdf_folder}' not found.")
+        return 0
 
-    extracted_data = []
-
-    for pdf_path in pdf_folder.glob("*.pdf"):
-        print(f"--- Processing: {pdf_path.name} ---")
-        uploaded_file = client.files.upload(file=pdf_path)
-        print("Upload complete. Processing document...")
-
-        try:
-            prompt = """
-            You are a highly accurate mathematical document parser. 
-            I have provided a PDF tutorial worksheet. Your task is to extract ONLY the exercises/questions from this document.
-            
-            Strict Formatting Rules:
-            1. Output a valid JSON object with a single key "questions". Its value must be a list of strings, where each string contains exactly one question.
-            2. Do not extract question numbers and headings.
-            3. Convert all mathematical equations, variables, matrices, and expressions into strict LaTeX format.
-            4. Use a single dollar sign ($...$) for inline equations.
-            5. Use double dollar signs ($$...$$) for display/block equations.
-            6. Do not include the answers or hints provided in the document brackets. Extract the question text and math only.
-            """
-
-            # enforce JSON output using the generation config
-            response = client.models.generate_content(
-                model="gemini-3.1-flash-lite-preview",
-                contents=[uploaded_file, prompt],
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json",
-                ),
-            )
+    CACHE_DIR.mkdir(exist_ok=True)
+    uploads = UploadCache(CACHE_DIR / "uploads.json")
 
-            # parse JSON response
-            response_data = json.loads(response.text)
-            questions = response_data.get("questions", [])
+    # one job per (PDF, page range)
+    pdf_jobs: dict[pathlib.Path, dict] = {}
+    for pdf_path in sorted(pdf_folder.glob("*.pdf")):
+        digest = file_hash(pdf_path)
+        ranges = page_ranges(pdf_path)
+        pdf_jobs[pdf_path] = {"digest": digest, "ranges": ranges, "results": {}, "failed": False}
 
-            if not questions:
-                print("No questions were extracted.")
-                continue
+    total_added = 0
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(extract_range, pdf_path, job["digest"], page_range, uploads): (
+                pdf_path,
+                page_range,
+            )
+            for pdf_path, job in pdf_jobs.items()
+            for page_range in job["ranges"]
+        }
 
-            for question_text in questions:
-                extracted_data.append(
-                    {
-                        "major_topic": pdf_path.name.rstrip(".pdf"),
-                        "question": question_text,
-                        "topics": "",
-                    }
+        for future in as_completed(futures):
+            pdf_path, page_range = futures[future]
+            job = pdf_jobs[pdf_path]
+            try:
+                job["results"][page_range] = future.result()
+            except json.JSONDecodeError:
+                print(
+                    f"Error: The model did not return valid JSON for {pdf_path.name}. Please try again."
                 )
+                job["failed"] = True
+            except Exception as e:
+                print(f"An error occurred while processing {pdf_path.name}: {e}")
+                job["failed"] = True
 
-            print(
-                f"Successfully extracted {len(questions)} questions from {pdf_path.name}."
-            )
+            if job["failed"] or len(job["results"]) < len(job["ranges"]):
+                continue
 
-        except json.JSONDecodeError:
+            # all ranges done, add this PDF's questions in page order
+            questions = [q for r in job["ranges"] for q in job["results"][r]]
+            added, skipped = store.ingest(pdf_path.stem, questions)
+            total_added += len(added)
             print(
-                f"Error: The model did not return valid JSON for {pdf_path.name}. Please try again."
+                f"--- {pdf_path.name}: {len(questions)} questions extracted, {len(added)} new ---"
             )
-        except Exception as e:
-            print(f"An error occurred while processing {pdf_path.name}: {e}")
+            for question, match, similarity in skipped:
+                if match.key != question_key(question):
+                    print(f"  near-duplicate ({similarity:.2f}) skipped: {question[:80]}")
+                    print(f"    already in the bank as: {match.question[:80]}")
+            uploads.release(job["digest"])
 
-        finally:
-            if uploaded_file:
-                print("Cleaning up File API data...")
-                client.files.delete(name=uploaded_file.name)
+    # the PDFs' cached contexts would otherwise be stored until their TTL runs out
+    context_cache.clear()
+    return total_added
 
-    # convert extracted questions to Dataframe
-    output_df = pd.DataFrame(
-        extracted_data, columns=["major_topic", "question", "topics"]
-    )
-    return output_df
 
-
-if __name__ == "__main__":
-    pdf_folder_path = "./sources"
-    questions_df = extract_questions_to_csv(pdf_folder_path)
+def main(pdf_folder_path: str = "./question sources") -> None:
+    store = QuestionStore()
+    added = extract_questions_to_bank(pdf_folder_path, store)
+    if added:
+        store.export_csv()
 
     print("\n=== EXTRACTION COMPLETE ===")
-    print(questions_df.head())
-    print(f"\nTotal questions extracted: {len(questions_df)}")
+    print(f"\nNew questions added to {store.csv_path}: {added}")
 
-    if not questions_df.empty:
-        csv_path = "question_bank.csv"
-        questions_df.to_csv(csv_path, index=False)
-        print(f"Saved DataFrame to {csv_path}")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,229 @@
 import requests
+import requests.adapters
+import httpx
+import asyncio
+import weakref
+import random
+import email.utils
 import time
 import json
-from langchain_google_genai import ChatGoogleGenerativeAI
+import hashlib
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_core.rate_limiters import InMemoryRateLimiter
+from rate_limiter import SharedRateLimiter
+from response_parsing import JsonObjectScanner, parse_json_object
+from telemetry import CallStats, Telemetry
+
+# langchain_google_genai and google.genai take about a second to import, so
+# they are only imported by GeminiWrapper when it is used (NALA-only and
+# cache-only callers never pay for them)
+if TYPE_CHECKING:
+    from context_cache import ContextCache
+
+
+# Gemini's documented free-tier quota, the default ceiling the shared rate limiter
+# may climb to (GEMINI_MAX_RPM raises it for paid tiers)
+GEMINI_TIER_RPM = 15
+
+# appended to the system prompt when several questions are packed into one request
+BATCH_INSTRUCTIONS = """
+
+You will be given several questions, each preceded by its ID in the form [ID: ...].
+Extract the topics for each question independently.
+This replaces the output format above: **only** output a valid JSON object that maps every question ID to its list of topics, e.g. {"q0": ["Topic A"], "q1": ["Topic B", "Topic C"]}.
+"""
+
+
+def retry_delay(attempt: int, retry_after: str | float | None = None) -> float:
+    """
+    Returns how long to wait before the next attempt. A server-provided
+    Retry-After (seconds or HTTP date) is honoured, otherwise exponential
+    backoff with full jitter (capped at 30s) is used.
+    """
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                retry_at = email.utils.parsedate_to_datetime(retry_after)
+                return max(0.0, retry_at.timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(30.0, 2 ** (attempt + 1)))
+
+
+class CacheMissError(LookupError):
+    """
+    Raised by a replay-only ResponseCache when a request has no cached response.
+    """
+
+
+class ResponseCache:
+    """
+    Disk-backed (SQLite) cache of model responses shared by the wrappers.
+
+    Responses are keyed by model, reasoning setting, a hash of the system
+    prompt and the user text. Entries older than `ttl_seconds` are ignored,
+    and the least recently used entries are evicted once the cache holds more
+    than `max_entries` (checked every `evict_every` puts, so it may briefly
+    hold a few more). In `replay_only` mode a miss raises CacheMissError
+    instead of calling the API, so re-scoring a past run makes no API calls.
+    """
+
+    def __init__(
+        self,
+        path: str = "llm_cache.sqlite",
+        max_entries: int = 100_000,
+        ttl_seconds: float | None = None,
+        replay_only: bool = False,
+        evict_every: int = 100,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.replay_only = replay_only
+        self.evict_every = evict_every
+        self._puts_since_evict = 0
+        self._lock = threading.Lock()
+        # the experiment grid runs one process per backend on the same file
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # readers don't block a writer, and writers only wait for each other
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, setting: str, system_prompt: str, user_text: str) -> str:
+        """
+        Builds the content-addressed key for a single request.
+        """
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        key_material = json.dumps([model, setting, prompt_hash, user_text])
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        """
+        Returns the cached response for a key, or None if missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            response, created_at = row
+            if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return response
+
+    def put(self, key: str, response: str) -> None:
+        """
+        Stores a response, and every `evict_every` puts evicts the least
+        recently used entries over the limit.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= self.evict_every:
+                self._puts_since_evict = 0
+                (num_entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+                if num_entries > self.max_entries:
+                    self._conn.execute(
+                        """
+                        DELETE FROM responses WHERE key IN (
+                            SELECT key FROM responses ORDER BY last_access ASC LIMIT ?
+                        )
+                        """,
+                        (num_entries - self.max_entries,),
+                    )
+            self._conn.commit()
+
+    def cached_call(self, key: str, call):
+        """
+        Returns the cached response for a key, otherwise runs `call()` and
+        caches a non-empty result.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        if self.replay_only:
+            raise CacheMissError(f"No cached response for key {key[:12]} (replay-only mode)")
+
+        response = call()
+        if response is not None:
+            self.put(key, response)
+        return response
+
+    async def acached_call(self, key: str, call):
+        """
+        Async version of cached_call, `call()` must return an awaitable.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        if self.replay_only:
+            raise CacheMissError(f"No cached response for key {key[:12]} (replay-only mode)")
+
+        response = await call()
+        if response is not None:
+            self.put(key, response)
+        return response
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def cached_samples(cache: ResponseCache | None, key: str, call) -> list[str | None]:
+    """
+    Runs `call()`, which returns a list of sampled responses, through the
+    response cache. The list is only stored if every sample succeeded.
+    """
+    if cache is None:
+        return call()
+
+    cached = cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    if cache.replay_only:
+        raise CacheMissError(f"No cached samples for key {key[:12]} (replay-only mode)")
+
+    responses = call()
+    if all(response is not None for response in responses):
+        cache.put(key, json.dumps(responses))
+    return responses
 
 
 class NalaGPTWrapper:
@@ -11,17 +231,116 @@ class NalaGPTWrapper:
     Wrapper for NALA API Gemini endpoint to adapt it to LangChain model interface.
     """
 
-    def __init__(self, api_key: str, model: str = "gpt-5", reasoning_effort: str = "low") -> None:
+    # max in-flight requests across all instances when run concurrently
+    max_concurrency: int = 8
+
+    # status codes worth retrying, anything else in 4xx is raised immediately
+    retry_status_codes: set[int] = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-5",
+        reasoning_effort: str = "low",
+        cache: ResponseCache | None = None,
+        rate_limiter: SharedRateLimiter | None = None,
+        base_url: str | None = None,
+    ) -> None:
         self.api_key = api_key
         self.model = model
         self.reasoning_effort = reasoning_effort
-        self.base_url = "https://nala.ntu.edu.sg/api/llm/"
+        self.cache = cache
+        # NALA publishes no quota, so requests are only paced if a limiter is given
+        self.rate_limiter = rate_limiter
+        # per-call timings, tokens and retries, see telemetry.py
+        self.telemetry = Telemetry()
+        # NALA_BASE_URL points every wrapper at another server, e.g. standin_server.py
+        self.base_url = base_url or os.getenv("NALA_BASE_URL") or "https://nala.ntu.edu.sg/api/llm/"
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/xml",
         }
 
+        # pooled keep-alive session so consecutive calls reuse TLS connections
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.max_concurrency
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # an httpx.AsyncClient's connections belong to the event loop that opened
+        # them, so ainvoke keeps one client per running loop (dropped with the loop)
+        self._async_clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, httpx.AsyncClient
+        ] = weakref.WeakKeyDictionary()
+
     def invoke(self, system_prompt: str, user_text: str, max_retries: int = 5):
+        """
+        Returns the model response, served from the response cache if one is set.
+        """
+        with self.telemetry.track(self.model, self.reasoning_effort) as stats:
+            if self.cache is None:
+                return self._invoke(system_prompt, user_text, max_retries, stats)
+
+            key = ResponseCache.make_key(
+                self.model, self.reasoning_effort, system_prompt, user_text
+            )
+            return self.cache.cached_call(
+                key, lambda: self._invoke(system_prompt, user_text, max_retries, stats)
+            )
+
+    async def ainvoke(self, system_prompt: str, user_text: str, max_retries: int = 5):
+        """
+        Async version of invoke, so many NALA calls can share one event loop.
+        """
+        with self.telemetry.track(self.model, self.reasoning_effort) as stats:
+            if self.cache is None:
+                return await self._ainvoke(system_prompt, user_text, max_retries, stats)
+
+            key = ResponseCache.make_key(
+                self.model, self.reasoning_effort, system_prompt, user_text
+            )
+            return await self.cache.acached_call(
+                key, lambda: self._ainvoke(system_prompt, user_text, max_retries, stats)
+            )
+
+    def sample(
+        self, system_prompt: str, user_text: str, n: int = 3, max_retries: int = 5
+    ) -> list[str | None]:
+        """
+        Returns `n` independently generated responses (None for failed ones),
+        e.g. for self-consistency voting. The NALA endpoint has no candidate
+        count, so the n requests are sent concurrently and cost about one
+        round-trip of latency. Cached as one entry, apart from invoke's.
+        """
+        key = ResponseCache.make_key(
+            self.model, f"{self.reasoning_effort}/sample{n}", system_prompt, user_text
+        )
+        return cached_samples(
+            self.cache, key, lambda: self._sample(system_prompt, user_text, n, max_retries)
+        )
+
+    def _sample(
+        self, system_prompt: str, user_text: str, n: int, max_retries: int
+    ) -> list[str | None]:
+        def call(_) -> str | None:
+            with self.telemetry.track(self.model, f"{self.reasoning_effort}/sample") as stats:
+                return self._invoke(system_prompt, user_text, max_retries, stats)
+
+        with ThreadPoolExecutor(max_workers=min(n, self.max_concurrency)) as executor:
+            return list(executor.map(call, range(n)))
+
+    def invoke_stream(self, system_prompt: str, user_text: str, max_retries: int = 5):
+        """
+        Same interface as GeminiWrapper.invoke_stream. The NALA endpoint only
+        returns the finished completion in one JSON envelope, so there is no
+        generation to cancel early and this is the same as invoke.
+        """
+        return self.invoke(system_prompt, user_text, max_retries)
+
+    def _build_payload(self, system_prompt: str, user_text: str) -> str:
         """
         Constructs the XML payload with text.
         """
@@ -35,7 +354,7 @@ class NalaGPTWrapper:
             .replace(">", "&gt;")
         )
 
-        xml_payload = f"""
+        return f"""
         <llm_request>
             <model>{self.model}</model>
             <system_prompt>{safe_system}</system_prompt>
@@ -47,100 +366,632 @@ class NalaGPTWrapper:
         </llm_request>
         """
 
+    @staticmethod
+    def _parse_response(text: str) -> str:
+        response_json = json.loads(text)
+        # json_expr = parse("$..text")
+        # return json_expr.find(response_json)
+        return response_json["raw"]["output"][1]["content"][0]["text"]
+
+    @staticmethod
+    def _parse_usage(text: str) -> tuple[int | None, int | None]:
+        """
+        Returns (input tokens, output tokens) from the response envelope, if reported.
+        """
+        usage = (json.loads(text).get("raw") or {}).get("usage") or {}
+        return usage.get("input_tokens"), usage.get("output_tokens")
+
+    def _invoke(
+        self,
+        system_prompt: str,
+        user_text: str,
+        max_retries: int = 5,
+        stats: CallStats | None = None,
+    ):
+        if stats is None:
+            stats = CallStats(self.model, self.reasoning_effort, started_at=time.time())
+        xml_payload = self._build_payload(system_prompt, user_text)
+
         for attempt in range(max_retries):
+            stats.retries = attempt
+            if self.rate_limiter is not None:
+                wait_start = time.perf_counter()
+                self.rate_limiter.acquire(blocking=True)
+                stats.queue_wait_s += time.perf_counter() - wait_start
+            request_start = time.perf_counter()
             try:
                 # 60s timeout for large image uploads
-                response = requests.post(
-                    self.base_url, headers=self.headers, data=xml_payload, timeout=60
-                )
+                response = self.session.post(self.base_url, data=xml_payload, timeout=60)
+                stats.network_s += time.perf_counter() - request_start
 
                 # Check for success
                 if response.status_code == 200:
-                    response_json = json.loads(response.text)
-                    # json_expr = parse("$..text")
-                    # return json_expr.find(response_json)
-                    return response_json["raw"]["output"][1]["content"][0]["text"]
-
-                # Check specifically for 502 Bad Gateway (or 503 Service Unavailable)
-                elif response.status_code in [502, 503, 504]:
-                    wait_time = 2 ** (attempt + 1)  # Exponential Backoff: 2s, 4s, 8s
+                    stats.status = "ok"
+                    stats.input_tokens, stats.output_tokens = self._parse_usage(response.text)
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.on_success()
+                    return self._parse_response(response.text)
+
+                # Retry on rate limiting and 5xx server errors
+                elif response.status_code in self.retry_status_codes:
+                    wait_time = retry_delay(
+                        attempt, response.headers.get("Retry-After")
+                    )
+                    if response.status_code == 429 and self.rate_limiter is not None:
+                        self.rate_limiter.on_throttle(wait_time)
                     print(
-                        f"  [API Warning] {response.status_code} Server Error on attempt {attempt + 1}. Retrying in {wait_time}s..."
+                        f"  [API Warning] Status {response.status_code} on attempt {attempt + 1}. Retrying in {wait_time:.1f}s..."
                     )
+                    stats.backoff_s += wait_time
                     time.sleep(wait_time)
                     continue
 
                 # If it's a client error (4xx), do not retry. Raise immediately.
                 else:
+                    stats.status = f"http_{response.status_code}"
                     print(
                         f"  [API Error] Status {response.status_code}: {response.text}"
                     )
                     response.raise_for_status()
 
+            except requests.exceptions.HTTPError:
+                raise
+
             except requests.exceptions.RequestException as e:
                 # Handle network-level errors (e.g., connection reset)
+                stats.network_s += time.perf_counter() - request_start
+                print(f"  [Network Error] Attempt {attempt + 1} failed: {e}")
+                if attempt < max_retries - 1:
+                    wait_time = retry_delay(attempt)
+                    stats.backoff_s += wait_time
+                    time.sleep(wait_time)
+                else:
+                    stats.status = "network_error"
+                    return None
+
+        stats.status = "retries_exceeded"
+        print("  [API Error] Max retries exceeded.")
+        return None
+
+    def _async_client(self) -> httpx.AsyncClient:
+        """
+        The async client of the running event loop, created on first use.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=60,
+                limits=httpx.Limits(max_connections=self.max_concurrency),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    async def _ainvoke(
+        self,
+        system_prompt: str,
+        user_text: str,
+        max_retries: int = 5,
+        stats: CallStats | None = None,
+    ):
+        if stats is None:
+            stats = CallStats(self.model, self.reasoning_effort, started_at=time.time())
+        client = self._async_client()
+        xml_payload = self._build_payload(system_prompt, user_text)
+
+        for attempt in range(max_retries):
+            stats.retries = attempt
+            if self.rate_limiter is not None:
+                wait_start = time.perf_counter()
+                await self.rate_limiter.aacquire(blocking=True)
+                stats.queue_wait_s += time.perf_counter() - wait_start
+            request_start = time.perf_counter()
+            try:
+                response = await client.post(self.base_url, content=xml_payload)
+                stats.network_s += time.perf_counter() - request_start
+
+                if response.status_code == 200:
+                    stats.status = "ok"
+                    stats.input_tokens, stats.output_tokens = self._parse_usage(response.text)
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.on_success()
+                    return self._parse_response(response.text)
+
+                elif response.status_code in self.retry_status_codes:
+                    wait_time = retry_delay(
+                        attempt, response.headers.get("Retry-After")
+                    )
+                    if response.status_code == 429 and self.rate_limiter is not None:
+                        self.rate_limiter.on_throttle(wait_time)
+                    print(
+                        f"  [API Warning] Status {response.status_code} on attempt {attempt + 1}. Retrying in {wait_time:.1f}s..."
+                    )
+                    stats.backoff_s += wait_time
+                    await asyncio.sleep(wait_time)
+                    continue
+
+                else:
+                    stats.status = f"http_{response.status_code}"
+                    print(
+                        f"  [API Error] Status {response.status_code}: {response.text}"
+                    )
+                    response.raise_for_status()
+
+            except httpx.TransportError as e:
+                stats.network_s += time.perf_counter() - request_start
                 print(f"  [Network Error] Attempt {attempt + 1} failed: {e}")
                 if attempt < max_retries - 1:
-                    time.sleep(2)
+                    wait_time = retry_delay(attempt)
+                    stats.backoff_s += wait_time
+                    await asyncio.sleep(wait_time)
                 else:
+                    stats.status = "network_error"
                     return None
 
+        stats.status = "retries_exceeded"
         print("  [API Error] Max retries exceeded.")
         return None
 
+    async def aclose(self) -> None:
+        """
+        Closes the pooled connections of both transports (the async ones of
+        the running event loop).
+        """
+        self.session.close()
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
 
 class GeminiWrapper:
     """
     Wrapper for Google Gemini API using langchain-google-genai.
     """
 
+    # max in-flight requests across all instances when run concurrently,
+    # requests are still paced by the API key's shared rate limiter
+    max_concurrency: int = 4
+
     def __init__(
         self,
         api_key: str,
         model: str = "gemini-3.1-flash-lite-preview",
         thinking_level: str = "high",
         requests_per_minute: int = 15,
+        cache: ResponseCache | None = None,
+        batch_size: int = 1,
+        max_retries: int = 5,
+        base_url: str | None = None,
+        context_cache: "ContextCache | None" = None,
+        max_requests_per_minute: float | None = None,
     ) -> None:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         self.api_key = api_key
         self.model = model
+        self.thinking_level = thinking_level
+        self.cache = cache
+        # if set, system prompts are sent once as cached contexts, then referred to by name
+        self.context_cache = context_cache
+        # questions packed into one request by invoke_batch
+        self.batch_size = batch_size
+        self.telemetry = Telemetry()
+        self.max_retries = max_retries
+        # cleared if the model rejects candidate_count, sample() then fans out instead
+        self.supports_candidates = True
+        # one bucket per API key, shared with every other wrapper and process using
+        # the key, and acquired here rather than inside LangChain so the wait is measurable.
+        # It starts at `requests_per_minute` and may probe up to the quota's ceiling
+        if max_requests_per_minute is None:
+            max_requests_per_minute = float(os.getenv("GEMINI_MAX_RPM", GEMINI_TIER_RPM))
+        self.rate_limiter = SharedRateLimiter(
+            api_key,
+            requests_per_minute,
+            max_requests_per_minute=max(requests_per_minute, max_requests_per_minute),
+        )
+        # retries are done by _call_with_retries, so 429s can slow the shared limiter
+        # GEMINI_BASE_URL points every wrapper at another server, e.g. standin_server.py
+        self.base_url = base_url or os.getenv("GEMINI_BASE_URL")
         self.llm = ChatGoogleGenerativeAI(
             model=self.model,
             api_key=self.api_key,
-            max_retries=5,
+            max_retries=1,
             thinking_level=thinking_level,
-            rate_limiter=InMemoryRateLimiter(
-                requests_per_second=requests_per_minute / 60.0,
-                check_every_n_seconds=0.5,
-                max_bucket_size=requests_per_minute,
-            ),
+            base_url=self.base_url,
         )
 
     def invoke(self, system_prompt: str, user_text: str):
+        """
+        Returns the model response, served from the response cache if one is set.
+        """
+        with self.telemetry.track(self.model, self.thinking_level) as stats:
+            if self.cache is None:
+                return self._invoke(system_prompt, user_text, stats)
+
+            key = ResponseCache.make_key(
+                self.model, self.thinking_level, system_prompt, user_text
+            )
+            return self.cache.cached_call(
+                key, lambda: self._invoke(system_prompt, user_text, stats)
+            )
+
+    def invoke_stream(self, system_prompt: str, user_text: str):
+        """
+        Like invoke, but streams the response and stops the generation as soon
+        as the first JSON object closes, so trailing text after the answer is
+        never generated. Shares invoke's cache entries.
+        """
+        with self.telemetry.track(self.model, self.thinking_level) as stats:
+            if self.cache is None:
+                return self._invoke_stream(system_prompt, user_text, stats)
+
+            key = ResponseCache.make_key(
+                self.model, self.thinking_level, system_prompt, user_text
+            )
+            return self.cache.cached_call(
+                key, lambda: self._invoke_stream(system_prompt, user_text, stats)
+            )
+
+    def invoke_structured(self, system_prompt: str, user_text: str, schema):
+        """
+        Returns the response parsed into `schema` (a pydantic model) with
+        structured output, or None if the model gave no answer (e.g. a
+        refusal). A request that still fails after retries raises, so callers
+        can tell it apart from an empty answer. Goes through the same rate
+        limiter, retries and cached contexts as invoke, but is not cached
+        (callers cache the parsed result, under structured_cache_key).
+        """
+        structured_llm = self.llm.with_structured_output(schema)
+        with self.telemetry.track(self.model, f"{self.thinking_level}/structured") as stats:
+            result = self._call_with_context(
+                stats,
+                system_prompt,
+                user_text,
+                lambda messages, kwargs: structured_llm.invoke(messages, **kwargs),
+            )
+            stats.status = "ok" if result is not None else "empty"
+            return result
+
+    def sample(self, system_prompt: str, user_text: str, n: int = 3) -> list[str | None]:
+        """
+        Returns `n` independently generated responses (None for failed ones),
+        e.g. for self-consistency voting. All n come from one request using
+        Gemini's candidate count, so they cost one round-trip and one
+        rate-limited request. If the model doesn't accept a candidate count,
+        the n requests are sent concurrently instead. Cached as one entry,
+        apart from invoke's.
+        """
+        key = ResponseCache.make_key(
+            self.model, f"{self.thinking_level}/sample{n}", system_prompt, user_text
+        )
+        return cached_samples(self.cache, key, lambda: self._sample(system_prompt, user_text, n))
+
+    def _sample(self, system_prompt: str, user_text: str, n: int) -> list[str | None]:
+        from langchain_google_genai.chat_models import GoogleInvalidRequestError
+
+        if self.supports_candidates:
+            with self.telemetry.track(self.model, f"{self.thinking_level}/sample{n}") as stats:
+                try:
+                    result = self._call_with_context(
+                        stats,
+                        system_prompt,
+                        user_text,
+                        lambda messages, kwargs: self.llm.generate(
+                            [messages], candidate_count=n, **kwargs
+                        ),
+                    )
+                    candidates = [
+                        self._content_text(generation.message.content) or None
+                        for generation in result.generations[0]
+                    ]
+                    if candidates:
+                        self._record_usage(stats, result.generations[0][0].message.usage_metadata)
+                    stats.status = "ok" if len(candidates) == n else "partial"
+                    return candidates + [None] * (n - len(candidates))
+                except GoogleInvalidRequestError as e:
+                    stats.status = "unsupported"
+                    print(f"  [API Warning] Candidate count rejected, sending {n} requests instead: {e}")
+                    self.supports_candidates = False
+                except Exception as e:
+                    stats.status = "error"
+                    print(f"  [API Error] {e}")
+                    return [None] * n
+
+        def call(_) -> str | None:
+            with self.telemetry.track(self.model, f"{self.thinking_level}/sample") as stats:
+                return self._invoke(system_prompt, user_text, stats)
+
+        with ThreadPoolExecutor(max_workers=min(n, self.max_concurrency)) as executor:
+            return list(executor.map(call, range(n)))
+
+    @staticmethod
+    def _content_text(content) -> str:
+        # message content can be a str or a list of content blocks
+        if isinstance(content, list):
+            return "".join(
+                block.get("text", "") if isinstance(block, dict) else str(block)
+                for block in content
+            )
+        return content
+
+    @staticmethod
+    def _retry_after(error: Exception) -> str | float | None:
+        """
+        The server's requested wait from a Retry-After header, or from the
+        RetryInfo detail (e.g. "retryDelay": "17s") Gemini puts in 429 bodies.
+        """
+        # LangChain re-raises the SDK's APIError, which has the response attached
+        for source in (error, error.__cause__):
+            response = getattr(source, "response", None)
+            headers = getattr(response, "headers", None)
+            if headers and headers.get("Retry-After"):
+                return headers.get("Retry-After")
+
+            details = getattr(source, "details", None)
+            if isinstance(details, dict):
+                for detail in details.get("error", {}).get("details", []):
+                    delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+                    if isinstance(delay, str) and delay.endswith("s"):
+                        try:
+                            return float(delay[:-1])
+                        except ValueError:
+                            pass
+        return None
+
+    def _call_with_retries(self, stats: CallStats, call):
+        """
+        Runs `call()` under the shared rate limiter, retrying rate-limit (429)
+        and server errors with backoff. A 429 slows the limiter down for every
+        user of the API key, and successes let it speed back up.
+        """
+        from langchain_google_genai.chat_models import GoogleAPIError, GoogleRateLimitError
+
+        for attempt in range(self.max_retries):
+            stats.retries = attempt
+            wait_start = time.perf_counter()
+            self.rate_limiter.acquire(blocking=True)
+            stats.queue_wait_s += time.perf_counter() - wait_start
+
+            request_start = time.perf_counter()
+            try:
+                result = call()
+            except Exception as e:
+                # measured before any backoff sleep, which is counted in backoff_s
+                stats.network_s += time.perf_counter() - request_start
+                if not isinstance(e, (GoogleRateLimitError, GoogleAPIError)):
+                    raise
+                if attempt == self.max_retries - 1:
+                    raise
+                wait_time = retry_delay(attempt, self._retry_after(e))
+                if isinstance(e, GoogleRateLimitError):
+                    self.rate_limiter.on_throttle(wait_time)
+                print(
+                    f"  [API Warning] {type(e).__name__} on attempt {attempt + 1}. Retrying in {wait_time:.1f}s..."
+                )
+                stats.backoff_s += wait_time
+                time.sleep(wait_time)
+                continue
+            stats.network_s += time.perf_counter() - request_start
+
+            self.rate_limiter.on_success()
+            return result
+
+    def _request(self, system_prompt: str, user_text: str) -> tuple[list, dict]:
+        """
+        The messages and extra request arguments for a call: the user text
+        alone plus the context's name if the system prompt is cached,
+        otherwise both messages.
+        """
+        if self.context_cache is not None:
+            name = self.context_cache.get(self.llm.client, self.model, system_prompt)
+            if name is not None:
+                return [HumanMessage(content=user_text)], {"cached_content": name}
+        return [SystemMessage(content=system_prompt), HumanMessage(content=user_text)], {}
+
+    def _call_with_context(self, stats: CallStats, system_prompt: str, user_text: str, call):
+        """
+        Runs `call(messages, kwargs)` through _call_with_retries, on the cached
+        context if there is one. If the API no longer accepts the context
+        (expired or deleted), it is dropped and the call is repeated with the
+        full prompt.
+        """
+        from langchain_google_genai.chat_models import (
+            GoogleInvalidRequestError,
+            GoogleModelNotFoundError,
+            GooglePermissionDeniedError,
+        )
+
+        messages, kwargs = self._request(system_prompt, user_text)
+        try:
+            return self._call_with_retries(stats, lambda: call(messages, kwargs))
+        except (GooglePermissionDeniedError, GoogleModelNotFoundError, GoogleInvalidRequestError) as e:
+            if "cached_content" not in kwargs:
+                raise
+            print(f"  [API Warning] Cached context rejected, sending the full prompt: {e}")
+            self.context_cache.invalidate(kwargs["cached_content"])
+            messages = [SystemMessage(content=system_prompt), HumanMessage(content=user_text)]
+            return self._call_with_retries(stats, lambda: call(messages, {}))
+
+    @staticmethod
+    def _record_usage(stats: CallStats, usage_metadata) -> None:
+        if usage_metadata:
+            stats.input_tokens = usage_metadata.get("input_tokens")
+            stats.output_tokens = usage_metadata.get("output_tokens")
+            stats.cached_input_tokens = (usage_metadata.get("input_token_details") or {}).get(
+                "cache_read"
+            )
+
+    def _invoke(self, system_prompt: str, user_text: str, stats: CallStats | None = None):
         """
         Sends a request to the Gemini API with a system prompt and user text.
         Returns the generated text, or None on failure.
         """
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_text),
-        ]
+        if stats is None:
+            stats = CallStats(self.model, self.thinking_level, started_at=time.time())
 
         try:
-            response = self.llm.invoke(messages)
+            response = self._call_with_context(
+                stats,
+                system_prompt,
+                user_text,
+                lambda messages, kwargs: self.llm.invoke(messages, **kwargs),
+            )
+            self._record_usage(stats, response.usage_metadata)
 
             if response.content:
-                # response.content can be a str or a list of content blocks
-                content = response.content
-                if isinstance(content, list):
-                    content = "".join(
-                        block.get("text", "") if isinstance(block, dict) else str(block)
-                        for block in content
-                    )
-                return content
+                stats.status = "ok"
+                return self._content_text(response.content)
 
+            stats.status = "empty"
             print("  [API Warning] Empty response.")
             return None
 
         except Exception as e:
+            stats.status = "error"
+            print(f"  [API Error] {e}")
+            return None
+
+    def _invoke_stream(
+        self, system_prompt: str, user_text: str, stats: CallStats | None = None
+    ):
+        """
+        Streams a response and returns the first complete JSON object in it
+        (or the whole text if no object closes). Returns None on failure.
+        Token usage is only known if the stream ran to its final chunk.
+        """
+        if stats is None:
+            stats = CallStats(self.model, self.thinking_level, started_at=time.time())
+
+        def read_stream(messages: list, kwargs: dict) -> JsonObjectScanner:
+            scanner = JsonObjectScanner()
+            request_start = time.perf_counter()
+            stream = self.llm.stream(messages, **kwargs)
+            try:
+                for chunk in stream:
+                    self._record_usage(stats, chunk.usage_metadata)
+                    text = self._content_text(chunk.content)
+                    if text and stats.ttft_s is None:
+                        stats.ttft_s = time.perf_counter() - request_start
+                    if scanner.feed(text):
+                        # closing the stream below cancels the rest of the generation
+                        break
+            finally:
+                stream.close()
+            return scanner
+
+        try:
+            scanner = self._call_with_context(stats, system_prompt, user_text, read_stream)
+        except Exception as e:
+            stats.status = "error"
             print(f"  [API Error] {e}")
             return None
+
+        if scanner.text:
+            stats.status = "ok"
+            return scanner.text
+
+        stats.status = "empty"
+        print("  [API Warning] Empty response.")
+        return None
+
+    def invoke_batch(
+        self, system_prompt: str, questions: dict[str, str], batch_size: int | None = None
+    ) -> dict[str, list[str] | None]:
+        """
+        Packs up to `batch_size` questions into each request, so the system
+        prompt is sent once per batch and each batch costs one rate-limited
+        request. Returns a mapping of question ID to its topics list (None if
+        the question could not be answered, even on its own).
+        """
+        batch_size = batch_size or self.batch_size
+        answers: dict[str, list[str] | None] = {}
+
+        pending: dict[str, str] = {}
+        for qid, text in questions.items():
+            cached = None
+            if self.cache is not None:
+                cached = self.cache.get(self._batch_cache_key(system_prompt, text))
+            if cached is not None:
+                answers[qid] = json.loads(cached)
+            else:
+                pending[qid] = text
+
+        if pending and self.cache is not None and self.cache.replay_only:
+            raise CacheMissError(
+                f"{len(pending)} batched questions not cached (replay-only mode)"
+            )
+
+        pending_ids = list(pending)
+        for i in range(0, len(pending_ids), batch_size):
+            chunk = {qid: pending[qid] for qid in pending_ids[i : i + batch_size]}
+            answers.update(self._invoke_chunk(system_prompt, chunk))
+
+        return {qid: answers.get(qid) for qid in questions}
+
+    def structured_cache_key(self, system_prompt: str, user_text: str) -> str:
+        """
+        Cache key for a parsed invoke_structured result. Kept apart from
+        invoke's raw responses, which share the cache but not the format.
+        """
+        return ResponseCache.make_key(
+            self.model, f"{self.thinking_level}/structured", system_prompt, user_text
+        )
+
+    def _batch_cache_key(self, system_prompt: str, user_text: str) -> str:
+        # batched answers are cached apart from single-question responses
+        return ResponseCache.make_key(
+            self.model, f"{self.thinking_level}/batch", system_prompt, user_text
+        )
+
+    def _invoke_chunk(
+        self, system_prompt: str, chunk: dict[str, str]
+    ) -> dict[str, list[str] | None]:
+        """
+        Sends one batch and re-splits it if the request fails or any ID is missing.
+        """
+        if len(chunk) == 1:
+            # a single question goes through the normal (cached) path
+            qid, text = next(iter(chunk.items()))
+            parsed = parse_json_object(self.invoke(system_prompt, text))
+            topics = parsed.get("topics") if parsed is not None else None
+            return {qid: topics if isinstance(topics, list) else None}
+
+        packed = "\n\n".join(f"[ID: {qid}]\n{text}" for qid, text in chunk.items())
+        with self.telemetry.track(
+            self.model, f"{self.thinking_level}/batch", num_questions=len(chunk)
+        ) as stats:
+            response = self._invoke(system_prompt + BATCH_INSTRUCTIONS, packed, stats)
+        parsed = parse_json_object(response)
+        if parsed is None:
+            parsed = {}
+
+        answers: dict[str, list[str] | None] = {}
+        for qid, text in chunk.items():
+            topics = parsed.get(qid)
+            if isinstance(topics, list):
+                answers[qid] = topics
+                if self.cache is not None:
+                    self.cache.put(
+                        self._batch_cache_key(system_prompt, text), json.dumps(topics)
+                    )
+
+        missing = {qid: text for qid, text in chunk.items() if qid not in answers}
+        if not missing:
+            return answers
+
+        print(
+            f"  [API Warning] Batch returned {len(answers)}/{len(chunk)} answers. Re-splitting {len(missing)} questions..."
+        )
+        if len(missing) < len(chunk):
+            # partial answer, retry the missing questions as one smaller batch
+            answers.update(self._invoke_chunk(system_prompt, missing))
+        else:
+            # nothing usable came back, halve the batch
+            missing_ids = list(missing)
+            half = len(missing_ids) // 2
+            for part in (missing_ids[:half], missing_ids[half:]):
+                answers.update(
+                    self._invoke_chunk(system_prompt, {qid: missing[qid] for qid in part})
+                )
+        return answers
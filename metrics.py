@@ -0,0 +1,249 @@
+import numpy as np
+from telemetry import Telemetry
+from topics import NUM_TOPICS, TOPIC_LIST
+
+# bit positions of every topic ID, used to unpack bitmasks in one vectorised step
+_TOPIC_BITS = np.arange(NUM_TOPICS, dtype=np.uint64)
+
+
+def unpack(masks) -> np.ndarray:
+    """
+    Unpacks an array of topic bitmasks into a dense (n_questions, n_topics) 0/1 matrix.
+    """
+    masks = np.asarray(masks, dtype=np.uint64)
+    return ((masks[:, None] >> _TOPIC_BITS) & np.uint64(1)).astype(np.uint8)
+
+
+class LabelMatrix:
+    """
+    Multilabel matrix stored as one packed bitmask (uint64) per question.
+    """
+
+    def __init__(self) -> None:
+        self._masks: list[int] = []
+
+    def append(self, mask: int) -> None:
+        self._masks.append(mask)
+
+    def __len__(self) -> int:
+        return len(self._masks)
+
+    @property
+    def masks(self) -> np.ndarray:
+        return np.array(self._masks, dtype=np.uint64)
+
+    def to_dense(self) -> np.ndarray:
+        """
+        Returns the (n_questions, n_topics) 0/1 matrix, e.g. for classification_report.
+        """
+        return unpack(self._masks).reshape(len(self._masks), NUM_TOPICS)
+
+
+class MetricAccumulator:
+    """
+    Online per-topic confusion counts for one model. Each update is a handful
+    of integer operations, so kappa and per-topic P/R/F1 can be read at any
+    point during a run instead of only at the end.
+    """
+
+    def __init__(self) -> None:
+        self.tp = np.zeros(NUM_TOPICS, dtype=np.int64)
+        self.fp = np.zeros(NUM_TOPICS, dtype=np.int64)
+        self.fn = np.zeros(NUM_TOPICS, dtype=np.int64)
+        self.n_questions = 0
+        self.invalid = 0
+
+    def update(self, true_mask: int, pred_mask: int, num_invalid: int = 0) -> None:
+        bits = unpack([true_mask & pred_mask, pred_mask & ~true_mask, true_mask & ~pred_mask])
+        self.tp += bits[0]
+        self.fp += bits[1]
+        self.fn += bits[2]
+        self.n_questions += 1
+        self.invalid += num_invalid
+
+    @property
+    def tn(self) -> np.ndarray:
+        return self.n_questions - self.tp - self.fp - self.fn
+
+    def kappa(self) -> float:
+        """
+        Cohen's kappa over all (question, topic) cells, equivalent to
+        cohen_kappa_score on the flattened label matrices.
+        """
+        n = self.n_questions * NUM_TOPICS
+        if n == 0:
+            return 0.0
+        tp, fp, fn, tn = (int(x.sum()) for x in (self.tp, self.fp, self.fn, self.tn))
+        p_observed = (tp + tn) / n
+        p_expected = ((tp + fp) * (tp + fn) + (fn + tn) * (fp + tn)) / n**2
+        if p_expected == 1:
+            return 0.0
+        return (p_observed - p_expected) / (1 - p_expected)
+
+    def precision_recall_f1(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns per-topic precision, recall and F1 (0 where undefined).
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.nan_to_num(self.tp / (self.tp + self.fp))
+            recall = np.nan_to_num(self.tp / (self.tp + self.fn))
+            f1 = np.nan_to_num(2 * precision * recall / (precision + recall))
+        return precision, recall, f1
+
+    def micro_f1(self) -> float:
+        tp, fp, fn = int(self.tp.sum()), int(self.fp.sum()), int(self.fn.sum())
+        return 2 * tp / (2 * tp + fp + fn) if tp else 0.0
+
+    def summary(self) -> str:
+        """
+        One-line running summary for live progress output.
+        """
+        return (
+            f"n={self.n_questions} kappa={self.kappa():.4f} "
+            f"micro-F1={self.micro_f1():.4f} invalid={self.invalid}"
+        )
+
+    def report(self) -> str:
+        """
+        Per-topic precision/recall/F1 table from the running counts.
+        """
+        precision, recall, f1 = self.precision_recall_f1()
+        support = self.tp + self.fn
+        width = max(len(topic) for topic in TOPIC_LIST)
+        lines = [f"{'':>{width}}  precision    recall  f1-score   support"]
+        for i, topic in enumerate(TOPIC_LIST):
+            lines.append(
+                f"{topic:>{width}}  {precision[i]:9.2f} {recall[i]:9.2f} {f1[i]:9.2f} {support[i]:9d}"
+            )
+        return "\n".join(lines)
+
+
+def print_report(
+    accumulators: dict[str, MetricAccumulator],
+    label_matrices: dict[str, tuple[LabelMatrix, LabelMatrix]],
+) -> None:
+    """
+    Prints the kappa and multilabel classification report for every model.
+    """
+    # sklearn takes over a second to import, and nothing else here needs it
+    from sklearn.metrics import classification_report
+
+    print("\n" + "=" * 60)
+    print("TOPIC EXTRACTION — MULTILABEL CLASSIFICATION REPORT")
+    print("=" * 60)
+
+    for llm_name, accumulator in accumulators.items():
+        y_true, y_pred = label_matrices[llm_name]
+
+        print(f"\n{llm_name}:")
+        print(f"  {accumulator.invalid} invalid topics")
+        print(f"  Cohen's Kappa: {accumulator.kappa():.4f}")
+        print("\n  Multilabel Classification Report (per topic):")
+        if len(y_true) == 0:
+            print("  No responses received.\n")
+            continue
+        print(
+            classification_report(
+                y_true.to_dense(),
+                y_pred.to_dense(),
+                target_names=TOPIC_LIST,
+                zero_division=0,
+            )
+        )
+
+    print("=" * 60)
+
+
+def _fmt(value: float | None, width: int = 7, spec: str = ".2f") -> str:
+    # "-" for values the backend didn't report
+    return "-".rjust(width) if value is None else format(value, f">{width}{spec}")
+
+
+def print_latency_report(telemetries: dict[str, Telemetry]) -> None:
+    """
+    Prints a per-model latency table for the calls made in this run.
+    Percentiles are over calls that reached the backend (cache hits are only
+    counted), throughput is questions answered per second of the model's
+    active time, and tokens are per question where the backend reports them.
+    """
+    print("\n" + "=" * 60)
+    print("TOPIC EXTRACTION — LATENCY REPORT")
+    print("=" * 60)
+
+    width = max([len(name) for name in telemetries] + [5])
+    header = (
+        f"{'model':<{width}}  {'calls':>5} {'cached':>6} {'errors':>6}"
+        f" {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'ttft s':>7} {'wait s':>7}"
+        f" {'retries':>7} {'q/s':>6} {'tok/q':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    for name, telemetry in telemetries.items():
+        calls = telemetry.snapshot()
+        if not calls:
+            print(f"{name:<{width}}  {0:>5} (no calls in this run)")
+            continue
+
+        api_calls = [c for c in calls if c.status != "cached"]
+        num_cached = len(calls) - len(api_calls)
+        num_errors = sum(1 for c in api_calls if c.status != "ok")
+
+        p50 = p95 = p99 = None
+        if api_calls:
+            p50, p95, p99 = np.percentile([c.total_s for c in api_calls], [50, 95, 99])
+        ttfts = [c.ttft_s for c in api_calls if c.ttft_s is not None]
+        ttft = float(np.median(ttfts)) if ttfts else None
+        wait = float(np.mean([c.queue_wait_s + c.backoff_s for c in api_calls])) if api_calls else None
+        known_retries = [c.retries for c in api_calls if c.retries is not None]
+        retries = sum(known_retries) if known_retries else None
+
+        num_questions = sum(c.num_questions for c in calls if c.status in ("ok", "cached"))
+        active_s = max(c.started_at + c.total_s for c in calls) - min(c.started_at for c in calls)
+        throughput = num_questions / active_s if active_s > 0 else None
+
+        # only calls that reported both counts, so cut-off streams don't skew the mean
+        with_usage = [
+            c for c in api_calls if c.input_tokens is not None and c.output_tokens is not None
+        ]
+        tokens = None
+        if with_usage:
+            tokens = sum(c.input_tokens + c.output_tokens for c in with_usage) / sum(
+                c.num_questions for c in with_usage
+            )
+
+        print(
+            f"{name:<{width}}  {len(calls):>5} {num_cached:>6} {num_errors:>6}"
+            f" {_fmt(p50)} {_fmt(p95)} {_fmt(p99)} {_fmt(ttft)} {_fmt(wait)}"
+            f" {_fmt(retries, 7, 'd')} {_fmt(throughput, 6, '.1f')} {_fmt(tokens, 7, '.0f')}"
+        )
+
+    print("=" * 60)
+
+
+def print_cascade_report(rows: dict[str, tuple[MetricAccumulator, list[float], str]]) -> None:
+    """
+    Prints quality against latency for cascades and the models they are built
+    from. `rows` maps a name to (accumulator, per-question latencies in
+    seconds, note), the note being e.g. a cascade's escalation rates.
+    """
+    print("\n" + "=" * 60)
+    print("TOPIC EXTRACTION — CASCADE REPORT")
+    print("=" * 60)
+
+    width = max([len(name) for name in rows] + [5])
+    header = f"{'model':<{width}}  {'n':>4} {'kappa':>7} {'micro-F1':>8} {'mean s':>7} {'p95 s':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, (accumulator, latencies, note) in rows.items():
+        mean = p95 = None
+        if latencies:
+            mean, p95 = float(np.mean(latencies)), float(np.percentile(latencies, 95))
+        print(
+            f"{name:<{width}}  {accumulator.n_questions:>4} {accumulator.kappa():7.4f}"
+            f" {accumulator.micro_f1():8.4f} {_fmt(mean)} {_fmt(p95)}"
+        )
+        if note:
+            print(f"{'':<{width}}  {note}")
+
+    print("=" * 60)
@@ -0,0 +1,64 @@
+import os
+
+# short model keys (for the CLI and EVAL_MODELS) -> names used in run logs and reports
+MODELS: dict[str, str] = {
+    "gpt5-high": "GPT-5 (High Thinking)",
+    "gpt5-low": "GPT-5 (Low Thinking)",
+    "gemini-high": "Gemini 3.1 Flash Lite Preview (High Thinking)",
+    "gemini-low": "Gemini 3.1 Flash Lite Preview (Low Thinking)",
+    "baseline": "Local Baseline (TF-IDF Ridge)",
+}
+
+
+def build_model(key: str, cache=None, context_cache=None, batch_size: int = 1):
+    """
+    Builds the wrapper of one model. Each backend's libraries are imported
+    here, so callers only pay for the backends they use. `cache` is a
+    ResponseCache, and `context_cache` a ContextCache and `batch_size` the
+    questions packed into one request (both Gemini only).
+    """
+    if key in ("gpt5-high", "gpt5-low"):
+        from llm_wrappers import NalaGPTWrapper
+
+        return NalaGPTWrapper(
+            os.getenv("NALA_API_KEY"), reasoning_effort=key.removeprefix("gpt5-"), cache=cache
+        )
+
+    if key in ("gemini-high", "gemini-low"):
+        from llm_wrappers import GeminiWrapper
+
+        return GeminiWrapper(
+            os.getenv("GEMINI_API_KEY"),
+            thinking_level="high" if key == "gemini-high" else "minimal",
+            # Gemini quota of the API key (the shared rate limiter adapts from here)
+            requests_per_minute=int(os.getenv("GEMINI_RPM", "15")),
+            cache=cache,
+            batch_size=batch_size,
+            context_cache=context_cache,
+        )
+
+    if key == "baseline":
+        # answers question-bank questions out-of-fold
+        from baseline_classifier import BaselineTopicClassifier
+
+        return BaselineTopicClassifier()
+
+    raise ValueError(f"Unknown model {key!r}, expected one of {list(MODELS)}")
+
+
+def build_models(
+    keys: list[str] | None = None, cache=None, context_cache=None, batch_size: int = 1
+) -> list[tuple[str, object]]:
+    """
+    (name, wrapper) pairs for `keys` (all models by default), in the order given.
+    With `batch_size` above 1 the Gemini models answer in batches, and are named
+    e.g. "... (batch@8)" so their results are logged apart from single requests.
+    """
+    models = []
+    for key in keys or MODELS:
+        llm = build_model(key, cache, context_cache, batch_size)
+        name = MODELS[key]
+        if getattr(llm, "batch_size", 1) > 1:
+            name = f"{name} (batch@{llm.batch_size})"
+        models.append((name, llm))
+    return models
@@ -0,0 +1,75 @@
+import numpy as np
+from topics import MAJOR_TOPICS, TOPIC_IDS
+
+
+def restrict_topic_list(system_prompt: str, topics: list[str]) -> str:
+    """
+    Returns the system prompt with its "- <topic>" list cut down to `topics`.
+    Other lines (including requirement bullets) are left untouched.
+    """
+    keep = set(topics)
+    lines = []
+    for line in system_prompt.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith("- ") and stripped[2:] in TOPIC_IDS and stripped[2:] not in keep:
+            continue
+        lines.append(line)
+    return "".join(lines)
+
+
+class TopicRouter:
+    """
+    Picks a per-question system prompt that lists only the topics of the
+    question's major topic (linear algebra, complex analysis or vector
+    calculus), cutting the input tokens of every call.
+
+    The major topic is taken from the question bank when known, otherwise it
+    is predicted by the local baseline classifier. If the classifier is not
+    confident, the full prompt is used. Topic names are unchanged, so results
+    still score against the global topic list.
+    """
+
+    def __init__(self, system_prompt: str, classifier=None, min_score: float = 0.35) -> None:
+        self.system_prompt = system_prompt
+        self.min_score = min_score
+        self._classifier = classifier
+        self.prompts: dict[str, str] = {
+            major: restrict_topic_list(system_prompt, topics)
+            for major, topics in MAJOR_TOPICS.items()
+        }
+        self._major_ids = {
+            major: np.array([TOPIC_IDS[t] for t in topics])
+            for major, topics in MAJOR_TOPICS.items()
+        }
+
+    @property
+    def classifier(self):
+        # only fitted when a question without a known major topic comes in
+        if self._classifier is None:
+            from baseline_classifier import BaselineTopicClassifier
+
+            self._classifier = BaselineTopicClassifier()
+        return self._classifier
+
+    def predict_major_topic(self, question: str) -> str | None:
+        """
+        Returns the major topic whose best topic scores highest, or None if no
+        topic scores above `min_score` or the question has no known tokens.
+        """
+        if not self.classifier.knows_any_token(question):
+            return None
+        scores = self.classifier.predict_scores(question)
+        best_major, best_score = None, self.min_score
+        for major, ids in self._major_ids.items():
+            score = float(scores[ids].max())
+            if score >= best_score:
+                best_major, best_score = major, score
+        return best_major
+
+    def route(self, question: str, major_topic: str | None = None) -> str:
+        """
+        Returns the system prompt to send with this question.
+        """
+        if major_topic not in self.prompts:
+            major_topic = self.predict_major_topic(question)
+        return self.prompts.get(major_topic, self.system_prompt)
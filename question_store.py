@@ -0,0 +1,485 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Iterable
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+# spacing commands and sizing that don't change what a question says
+LATEX_NOISE_PATTERN = re.compile(r"\\(?:left|right|displaystyle)\b|\\[,;:! ]")
+# whitespace next to anything but a letter or digit (x + 1 == x+1, \frac {a} == \frac{a})
+LATEX_SPACE_PATTERN = re.compile(r"\s+(?=[^\w\s])|(?<=[^\w\s])\s+")
+
+COLUMNS = ["major_topic", "question", "topics"]
+# estimated Jaccard similarity of character shingles above which a question
+# counts as a near-duplicate of one already in the bank. Variants of one
+# exercise with different numbers or functions score 0.75-0.88 in the bank,
+# re-extractions of the same exercise differ only in formatting and score higher
+NEAR_DUPLICATE_THRESHOLD = 0.9
+
+
+def normalize_latex(question: str) -> str:
+    """
+    Canonical form of a question for hashing: LaTeX spacing commands and
+    \\left / \\right are dropped, and whitespace is collapsed, or removed
+    entirely where it sits next to a symbol.
+    """
+    text = LATEX_NOISE_PATTERN.sub(" ", question)
+    text = " ".join(text.split())
+    return LATEX_SPACE_PATTERN.sub("", text)
+
+
+def question_key(question: str) -> str:
+    """
+    Content hash of the normalized LaTeX, the store's primary key.
+    """
+    return hashlib.sha256(normalize_latex(question).encode("utf-8")).hexdigest()[:32]
+
+
+class MinHasher:
+    """
+    MinHash signatures of character shingles, with LSH banding.
+
+    The signature is split into `bands` bands of `num_perm // bands` rows, and
+    two questions become duplicate candidates if any band matches exactly.
+    With the defaults (20 bands of 6 rows), a pair at Jaccard similarity 0.9 is
+    practically always found, one at 0.8 99.8% of the time and one at 0.5 only
+    27% of the time. Candidates are then checked against the actual threshold.
+    """
+
+    # largest prime below 2^32: with a, b < p and x < 2^32, a * x + b fits in uint64
+    PRIME = np.uint64(4294967291)
+
+    def __init__(self, num_perm: int = 120, bands: int = 20, shingle_size: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, self.PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, self.PRIME, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        The uint32 MinHash signature of a (normalized) text.
+        """
+        k = self.shingle_size
+        shingles = {text[i : i + k] for i in range(max(len(text) - k + 1, 1))}
+        # crc32 rather than hash(), which is salted per process
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        permuted = (self._a * hashes + self._b) % self.PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def buckets(self, signature: np.ndarray) -> list[int]:
+        """
+        One 64-bit bucket id per band.
+        """
+        return [
+            int.from_bytes(
+                hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "little", signed=True
+            )
+            for band in np.split(signature, self.bands)
+        ]
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """
+        Estimated Jaccard similarity of the shingle sets behind two signatures.
+        """
+        return float(np.mean(a == b))
+
+
+@dataclass
+class Question:
+    key: str
+    major_topic: str
+    question: str
+    topics: str
+
+
+class QuestionStore:
+    """
+    Indexed (SQLite) store of the question bank, keyed by a content hash of
+    each question's normalized LaTeX.
+
+    `major_topic` and label status are indexed, so filtered reads, single
+    lookups and label updates touch only the rows involved, and upserts are
+    incremental. Every question's MinHash signature is stored with its LSH
+    buckets, so ingestion can reject near-duplicates (e.g. the same exercise
+    from two overlapping worksheets) with a few index lookups.
+
+    `question_bank.csv` stays the tracked, human-readable copy: it is imported
+    when it changed since the store last read or wrote it (rows missing from
+    it are dropped, and an unlabelled row clears the label unless the label
+    was set after the last sync, see import_csv), and `export_csv()` writes it
+    back in one atomic replace.
+    """
+
+    def __init__(self, path: str | None = None, csv_path: str | None = "question_bank.csv") -> None:
+        # QUESTION_DB points scripts and benchmarks at another store
+        self.path = path or os.getenv("QUESTION_DB", "question_bank.sqlite")
+        self.csv_path = csv_path
+        self.hasher = MinHasher()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._lock:
+            # readers (the app, the evaluation) don't block a writer
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS questions (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT NOT NULL UNIQUE,
+                    major_topic TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    topics TEXT NOT NULL DEFAULT '',
+                    labelled INTEGER NOT NULL,
+                    signature BLOB NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_major_topic ON questions (major_topic, labelled);
+                CREATE INDEX IF NOT EXISTS idx_labelled ON questions (labelled);
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    PRIMARY KEY (band, bucket, question_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_lsh_question ON lsh_buckets (question_id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                );
+                """
+            )
+            self._conn.commit()
+        if self.csv_path is not None and os.path.exists(self.csv_path):
+            if self._csv_signature() != self._get_meta("csv_signature"):
+                self.import_csv()
+
+    # --- reads ---
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+    def get(self, question: str) -> Question | None:
+        """
+        Looks a question up by content, ignoring LaTeX spacing differences.
+        """
+        key = question_key(question)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, major_topic, question, topics FROM questions WHERE key = ?", (key,)
+            ).fetchone()
+        return Question(*row) if row is not None else None
+
+    def questions(self, major_topic: str | None = None, labelled: bool | None = None) -> pd.DataFrame:
+        """
+        The bank (or the rows of one major topic and/or label status) in
+        insertion order, with columns key, major_topic, question and topics.
+        """
+        conditions, params = [], []
+        if major_topic is not None:
+            conditions.append("major_topic = ?")
+            params.append(major_topic)
+        if labelled is not None:
+            conditions.append("labelled = ?")
+            params.append(int(labelled))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, major_topic, question, topics FROM questions{where} ORDER BY id",
+                params,
+            ).fetchall()
+        return pd.DataFrame(rows, columns=["key", *COLUMNS])
+
+    def counts(self) -> pd.DataFrame:
+        """
+        Number of labelled and unlabelled questions per major topic.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT major_topic, SUM(labelled), SUM(1 - labelled) FROM questions"
+                " GROUP BY major_topic ORDER BY major_topic"
+            ).fetchall()
+        return pd.DataFrame(rows, columns=["major_topic", "labelled", "unlabelled"])
+
+    def near_duplicates(
+        self, question: str, threshold: float = NEAR_DUPLICATE_THRESHOLD
+    ) -> list[tuple[Question, float]]:
+        """
+        Stored questions whose estimated similarity to `question` is at least
+        `threshold`, most similar first. An exact match (same key) is included.
+        """
+        signature = self.hasher.signature(normalize_latex(question))
+        with self._lock:
+            return self._near_duplicates(signature, threshold)
+
+    def duplicate_pairs(
+        self, threshold: float = NEAR_DUPLICATE_THRESHOLD
+    ) -> list[tuple[Question, Question, float]]:
+        """
+        All pairs of near-duplicate questions in the bank, from the LSH buckets
+        they share.
+        """
+        with self._lock:
+            pairs = self._conn.execute(
+                """
+                SELECT DISTINCT a.question_id, b.question_id FROM lsh_buckets a
+                JOIN lsh_buckets b ON a.band = b.band AND a.bucket = b.bucket
+                WHERE a.question_id < b.question_id
+                """
+            ).fetchall()
+            ids = sorted({i for pair in pairs for i in pair})
+            rows = {
+                row[0]: row[1:]
+                for row in self._conn.execute(
+                    "SELECT id, key, major_topic, question, topics, signature FROM questions"
+                    f" WHERE id IN ({','.join('?' * len(ids))})",
+                    ids,
+                )
+            } if ids else {}
+
+        duplicates = []
+        for a, b in pairs:
+            similarity = MinHasher.similarity(
+                np.frombuffer(rows[a][4], dtype=np.uint32), np.frombuffer(rows[b][4], dtype=np.uint32)
+            )
+            if similarity >= threshold:
+                duplicates.append((Question(*rows[a][:4]), Question(*rows[b][:4]), similarity))
+        return sorted(duplicates, key=lambda d: -d[2])
+
+    def _near_duplicates(self, signature: np.ndarray, threshold: float) -> list[tuple[Question, float]]:
+        """
+        Candidates from the LSH buckets, verified against the threshold. The
+        caller holds the lock.
+        """
+        buckets = self.hasher.buckets(signature)
+        candidates = self._conn.execute(
+            "SELECT DISTINCT q.key, q.major_topic, q.question, q.topics, q.signature"
+            " FROM lsh_buckets b JOIN questions q ON q.id = b.question_id"
+            f" WHERE {' OR '.join(['(b.band = ? AND b.bucket = ?)'] * len(buckets))}",
+            [value for band, bucket in enumerate(buckets) for value in (band, bucket)],
+        ).fetchall()
+
+        matches = []
+        for *fields, stored in candidates:
+            similarity = MinHasher.similarity(signature, np.frombuffer(stored, dtype=np.uint32))
+            if similarity >= threshold:
+                matches.append((Question(*fields), similarity))
+        return sorted(matches, key=lambda m: -m[1])
+
+    # --- writes ---
+
+    def upsert(self, major_topic: str, question: str, topics: str | None = None) -> str:
+        """
+        Inserts a question, or updates its major topic, text and (if given)
+        topics. Returns its key.
+        """
+        return self.upsert_many([(major_topic, question, topics)])[0]
+
+    def upsert_many(self, rows: Iterable[tuple[str, str, str | None]]) -> list[str]:
+        """
+        Upserts (major_topic, question, topics) rows in one transaction. Topics
+        of None leave an existing question's label unchanged.
+        """
+        keys = []
+        with self._lock, self._conn:
+            for major_topic, question, topics in rows:
+                keys.append(self._upsert(major_topic, question, topics))
+        return keys
+
+    def _upsert(self, major_topic: str, question: str, topics: str | None) -> str:
+        normalized = normalize_latex(question)
+        key = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+        now = time.time()
+        existing = self._conn.execute("SELECT id FROM questions WHERE key = ?", (key,)).fetchone()
+        if existing is not None:
+            if topics is None:
+                self._conn.execute(
+                    "UPDATE questions SET major_topic = ?, question = ?, updated_at = ? WHERE id = ?",
+                    (major_topic, question, now, existing[0]),
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE questions SET major_topic = ?, question = ?, topics = ?, labelled = ?,"
+                    " updated_at = ? WHERE id = ?",
+                    (major_topic, question, topics, int(topics.strip() != ""), now, existing[0]),
+                )
+            return key
+
+        topics = topics or ""
+        signature = self.hasher.signature(normalized)
+        question_id = self._conn.execute(
+            "INSERT INTO questions (key, major_topic, question, topics, labelled, signature, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, major_topic, question, topics, int(topics.strip() != ""), signature.tobytes(), now),
+        ).lastrowid
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO lsh_buckets VALUES (?, ?, ?)",
+            [(band, bucket, question_id) for band, bucket in enumerate(self.hasher.buckets(signature))],
+        )
+        return key
+
+    def set_topics(self, question: str, topics: str) -> bool:
+        """
+        Labels one question. Returns False if it isn't in the store.
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE questions SET topics = ?, labelled = ?, updated_at = ? WHERE key = ?",
+                (topics, int(topics.strip() != ""), time.time(), question_key(question)),
+            )
+        return cursor.rowcount > 0
+
+    def ingest(
+        self, major_topic: str, questions: Iterable[str], threshold: float = NEAR_DUPLICATE_THRESHOLD
+    ) -> tuple[list[str], list[tuple[str, Question, float]]]:
+        """
+        Adds unlabelled questions, skipping any that are already in the bank
+        or near-duplicates of a stored question (including ones added earlier
+        in the same call). Existing rows and their labels are never touched.
+
+        Returns the keys of the added questions, and (question, stored match,
+        similarity) for every skipped one.
+        """
+        added, skipped = [], []
+        with self._lock, self._conn:
+            for question in questions:
+                signature = self.hasher.signature(normalize_latex(question))
+                matches = self._near_duplicates(signature, threshold)
+                if matches:
+                    skipped.append((question, *matches[0]))
+                    continue
+                added.append(self._upsert(major_topic, question, ""))
+        return added, skipped
+
+    def delete(self, keys: Iterable[str]) -> int:
+        """
+        Removes questions (and their LSH buckets) by key. Returns the number removed.
+        """
+        removed = 0
+        with self._lock, self._conn:
+            for key in keys:
+                row = self._conn.execute("SELECT id FROM questions WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    continue
+                self._conn.execute("DELETE FROM lsh_buckets WHERE question_id = ?", row)
+                self._conn.execute("DELETE FROM questions WHERE id = ?", row)
+                removed += 1
+        return removed
+
+    # --- CSV sync ---
+
+    def _csv_signature(self) -> str:
+        stat = os.stat(self.csv_path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _get_meta(self, name: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _set_meta(self, name: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, value))
+
+    def _labelled_since_sync(self) -> set[str]:
+        """
+        Keys of questions labelled after the CSV was last imported or exported,
+        i.e. labels the CSV can't know about yet.
+        """
+        synced_at = float(self._get_meta("synced_at") or 0)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM questions WHERE labelled = 1 AND updated_at > ?", (synced_at,)
+            ).fetchall()
+        return {key for (key,) in rows}
+
+    def import_csv(self, csv_path: str | None = None) -> None:
+        """
+        Makes the store match a CSV: its rows are upserted in file order, and
+        questions missing from it are removed. An unlabelled row clears the
+        stored label (so labels can be removed by editing the CSV), except a
+        label set after the last import or export, which the CSV can't have
+        seen yet (e.g. labelling was interrupted before it exported).
+
+        Rows without a question or major topic are skipped with a warning,
+        and a stored question of a skipped row is kept as it is.
+        """
+        csv_path = csv_path or self.csv_path
+        df = pd.read_csv(csv_path)
+        df["topics"] = df["topics"].fillna("").astype(str)
+        unsynced = self._labelled_since_sync()
+
+        rows, skipped_keys = [], set()
+        for line, (major_topic, question, topics) in enumerate(
+            zip(df["major_topic"], df["question"], df["topics"]), start=2
+        ):
+            if not isinstance(question, str) or not question.strip():
+                print(f"  [Warning] {csv_path}:{line}: no question, row skipped")
+                continue
+            if not isinstance(major_topic, str) or not major_topic.strip():
+                print(f"  [Warning] {csv_path}:{line}: no major_topic, row skipped")
+                skipped_keys.add(question_key(question))
+                continue
+            if not topics.strip() and question_key(question) in unsynced:
+                topics = None
+            rows.append((major_topic, question, topics))
+
+        keys = self.upsert_many(rows)
+        stale = set(self.questions()["key"]) - set(keys) - skipped_keys
+        if stale:
+            self.delete(stale)
+        if csv_path == self.csv_path:
+            self._set_meta("csv_signature", self._csv_signature())
+            self._set_meta("synced_at", str(time.time()))
+
+    def export_csv(self, csv_path: str | None = None) -> None:
+        """
+        Writes the bank to a CSV through a temporary file and one rename, so
+        readers never see a half-written file.
+        """
+        csv_path = csv_path or self.csv_path
+        tmp_path = csv_path + ".tmp"
+        self.questions()[COLUMNS].to_csv(tmp_path, index=False)
+        os.replace(tmp_path, csv_path)
+        if csv_path == self.csv_path:
+            # our own write is not an external change to re-import
+            self._set_meta("csv_signature", self._csv_signature())
+            self._set_meta("synced_at", str(time.time()))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Question bank summary and near-duplicate report.")
+    parser.add_argument("--threshold", type=float, default=NEAR_DUPLICATE_THRESHOLD)
+    parser.add_argument("--export", action="store_true", help="rewrite question_bank.csv from the store")
+    args = parser.parse_args()
+
+    store = QuestionStore()
+    print(f"{len(store)} questions in {store.path}\n")
+    print(store.counts().to_string(index=False))
+
+    pairs = store.duplicate_pairs(args.threshold)
+    print(f"\n{len(pairs)} near-duplicate pairs at similarity >= {args.threshold}")
+    for a, b, similarity in pairs:
+        print(f"\n  {similarity:.2f}  [{a.major_topic}] {a.question[:100]}")
+        print(f"        [{b.major_topic}] {b.question[:100]}")
+
+    if args.export:
+        store.export_csv()
+        print(f"\nWrote {store.csv_path}")
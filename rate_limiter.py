@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from langchain_core.rate_limiters import BaseRateLimiter
+
+
+class SharedRateLimiter(BaseRateLimiter):
+    """
+    Token-bucket rate limiter shared by every wrapper, thread and process
+    using the same API key.
+
+    The bucket lives in a small SQLite file, and each acquire is one
+    `BEGIN IMMEDIATE` transaction, so concurrent processes (the evaluation,
+    the Streamlit app, a second terminal) take turns instead of each assuming
+    it has the whole quota.
+
+    The rate adapts to the API (additive increase, multiplicative decrease):
+    a 429 halves it and pauses the bucket for the server's Retry-After, and
+    each success of a request that had to wait for its token raises it by
+    1/rate, i.e. by about one request per minute for every minute spent
+    waiting on the limiter. It never goes above `max_requests_per_minute`,
+    which is the configured quota unless set higher to probe for headroom.
+    The learned rate persists between runs.
+
+    `burst` is how many unused requests may be saved up while idle. It is 1 by
+    default, so requests stay evenly paced and can't overshoot a per-minute
+    quota after an idle spell.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        requests_per_minute: float,
+        max_requests_per_minute: float | None = None,
+        min_requests_per_minute: float = 1.0,
+        burst: float = 1.0,
+        path: str | None = None,
+    ) -> None:
+        # the key is stored hashed, never in plain text
+        self.key = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        self.max_rate = max_requests_per_minute or requests_per_minute
+        self.min_rate = min(min_requests_per_minute, requests_per_minute)
+        self.burst = burst
+        # RATE_LIMIT_DB keeps test and benchmark buckets apart from the real ones
+        self.path = path or os.getenv("RATE_LIMIT_DB", ".rate_limits.sqlite")
+        self._lock = threading.Lock()
+        # whether the calling thread's last acquire had to wait for a token
+        self._local = threading.local()
+        # autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        with self._lock:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    rate REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL,
+                    last_decrease REAL NOT NULL
+                )
+                """
+            )
+            # a new bucket starts empty, like InMemoryRateLimiter
+            self._conn.execute(
+                "INSERT OR IGNORE INTO buckets VALUES (?, ?, 0, ?, 0, 0)",
+                (self.key, requests_per_minute, time.time()),
+            )
+
+    def _transaction(self, update):
+        """
+        Runs `update(rate, tokens, now, blocked_until, last_decrease)` on the
+        refilled bucket inside one write transaction. `update` returns
+        (new row values, result).
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rate, tokens, updated_at, blocked_until, last_decrease = self._conn.execute(
+                    "SELECT rate, tokens, updated_at, blocked_until, last_decrease"
+                    " FROM buckets WHERE key = ?",
+                    (self.key,),
+                ).fetchone()
+                now = time.time()
+                # the ceiling may have changed since the bucket was created
+                rate = min(max(rate, self.min_rate), self.max_rate)
+                if now > blocked_until:
+                    refill_from = max(updated_at, blocked_until)
+                    tokens = min(self.burst, tokens + (now - refill_from) * rate / 60)
+
+                (rate, tokens, blocked_until, last_decrease), result = update(
+                    rate, tokens, now, blocked_until, last_decrease
+                )
+                self._conn.execute(
+                    "UPDATE buckets SET rate = ?, tokens = ?, updated_at = ?,"
+                    " blocked_until = ?, last_decrease = ? WHERE key = ?",
+                    (rate, tokens, now, blocked_until, last_decrease, self.key),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def _try_take(self) -> float:
+        """
+        Takes one token if available. Returns 0, or the seconds to wait first.
+        """
+
+        def update(rate, tokens, now, blocked_until, last_decrease):
+            if now < blocked_until:
+                wait = blocked_until - now
+            elif tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) * 60 / rate
+            return (rate, tokens, blocked_until, last_decrease), wait
+
+        return self._transaction(update)
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        self._local.waited = False
+        while True:
+            wait = self._try_take()
+            if wait == 0:
+                return True
+            if not blocking:
+                return False
+            self._local.waited = True
+            # re-check at least every second, another process may have changed the rate
+            time.sleep(min(wait, 1.0))
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        self._local.waited = False
+        while True:
+            wait = self._try_take()
+            if wait == 0:
+                return True
+            if not blocking:
+                return False
+            self._local.waited = True
+            await asyncio.sleep(min(wait, 1.0))
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        """
+        Reports a 429. Halves the rate (at most once per request interval, so
+        a burst of concurrent 429s counts once) and pauses every user of the
+        key for `retry_after` seconds if the server sent one.
+        """
+
+        def update(rate, tokens, now, blocked_until, last_decrease):
+            if now - last_decrease >= 60 / rate:
+                rate = max(self.min_rate, rate / 2)
+                last_decrease = now
+            if retry_after:
+                blocked_until = max(blocked_until, now + retry_after)
+            return (rate, 0.0, blocked_until, last_decrease), None
+
+        self._transaction(update)
+
+    def on_success(self) -> None:
+        """
+        Reports a successful request, from the thread that acquired its token.
+        If that acquire had to wait (the caller is held back by the limiter,
+        not the other way round), probes for headroom by raising the rate.
+        """
+        if not getattr(self._local, "waited", False):
+            return
+
+        def update(rate, tokens, now, blocked_until, last_decrease):
+            rate = min(self.max_rate, rate + 1 / rate)
+            return (rate, tokens, blocked_until, last_decrease), None
+
+        self._transaction(update)
+
+    @property
+    def requests_per_minute(self) -> float:
+        """
+        The current (learned) rate of the shared bucket.
+        """
+        return self._transaction(
+            lambda rate, tokens, now, blocked_until, last_decrease: (
+                (rate, tokens, blocked_until, last_decrease),
+                rate,
+            )
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,87 @@
+import json
+
+
+def parse_json_object(response: str | None) -> dict | None:
+    """
+    Parses a JSON object from a model response, allowing for surrounding text
+    (e.g. a markdown code fence). Returns None if no object could be parsed.
+    """
+    if response is None:
+        return None
+    try:
+        parsed = json.loads(response)
+    except json.JSONDecodeError:
+        try:
+            json_start = response.index("{")
+            json_end = response.rindex("}") + 1
+            parsed = json.loads(response[json_start:json_end])
+        except (ValueError, json.JSONDecodeError):
+            return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+class JsonObjectScanner:
+    """
+    Incrementally scans streamed text for the first complete top-level JSON
+    object. Leading text (e.g. a markdown code fence) is skipped, and braces
+    inside strings are ignored, so `feed` can report the moment the object
+    closes and the rest of the generation can be cancelled.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[str] = []
+        self._length = 0
+        self._start: int | None = None
+        self._end: int | None = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def complete(self) -> bool:
+        return self._end is not None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Adds a chunk of text. Returns True once the first object has closed.
+        """
+        if self.complete:
+            return True
+
+        offset = self._length
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        for i, char in enumerate(chunk):
+            if self._start is None:
+                if char == "{":
+                    self._start = offset + i
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end = offset + i + 1
+                    return True
+        return False
+
+    @property
+    def text(self) -> str:
+        """
+        The complete object if it closed, otherwise everything received so far.
+        """
+        text = "".join(self._chunks)
+        if self.complete:
+            return text[self._start : self._end]
+        return text
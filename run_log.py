@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def make_key(question: str, llm_name: str, system_prompt: str) -> str:
+    """
+    Identifies one question x model x prompt job, so a resumed run only skips
+    jobs that were run with the same prompt.
+    """
+    key_material = json.dumps([question, llm_name, system_prompt])
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class RunLog:
+    """
+    Append-only JSONL log with one record per completed question x model job.
+
+    Each record is flushed to disk as soon as it is written, so a crash loses
+    at most the jobs still in flight, and a rerun can skip every job that
+    already has a response.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, mode="a", encoding="utf-8")
+
+    def append(self, record: dict) -> None:
+        record = {"timestamp": time.time(), **record}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def completed(self) -> dict[str, dict]:
+        """
+        Returns the latest record with a response for each job key in this log.
+        """
+        return {
+            record["key"]: record
+            for record in read_records(self.path)
+            if record.get("raw_response") is not None
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def read_records(*paths: str) -> list[dict]:
+    """
+    Reads the records of one or more run logs in order. A truncated last line
+    (e.g. from a crash mid-write) is skipped.
+    """
+    records = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, mode="r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"  [Run Log] Skipping malformed line in {path}")
+    return records
@@ -0,0 +1,448 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from question_store import QuestionStore
+from topics import TOPIC_LIST
+
+# packed questions sent by GeminiWrapper.invoke_batch
+BATCH_ID_PATTERN = re.compile(r"^\[ID: (.+?)\]$", re.MULTILINE)
+
+
+class StandInConfig:
+    """
+    Behaviour of the stand-in server. Answers come from the question store at
+    `store_path` (QuestionStore's default if None). Latency is lognormal around
+    `latency_median` seconds, `error_rate` and `throttle_rate` are the
+    fractions of requests answered with a 503 or a 429 (with a Retry-After
+    of `retry_after` seconds), and `requests_per_minute` optionally enforces a
+    real quota (429 once exceeded, like the Gemini free tier). With `chatter`,
+    answers are followed by trailing text, as some models do.
+
+    `prefill_per_1k_tokens` adds seconds before the first token per 1,000
+    input tokens that were not served from a cached context. Cached contexts
+    smaller than `min_cache_tokens` are rejected like the real API does, and
+    `context_caching=False` answers the cachedContents endpoints with a 404.
+    """
+
+    def __init__(
+        self,
+        store_path: str | None = None,
+        latency_median: float = 0.5,
+        latency_sigma: float = 0.5,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        retry_after: float = 1.0,
+        requests_per_minute: float | None = None,
+        chatter: bool = False,
+        seed: int = 0,
+        prefill_per_1k_tokens: float = 0.0,
+        min_cache_tokens: int = 1024,
+        context_caching: bool = True,
+    ) -> None:
+        self.store_path = store_path
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.requests_per_minute = requests_per_minute
+        self.chatter = chatter
+        self.seed = seed
+        self.prefill_per_1k_tokens = prefill_per_1k_tokens
+        self.min_cache_tokens = min_cache_tokens
+        self.context_caching = context_caching
+
+
+class StandInServer:
+    """
+    Local stand-in for the NALA and Gemini APIs, for benchmarks and load tests
+    that shouldn't spend API quota.
+
+    - POST /api/llm/ takes NALA's XML request and answers in NALA's
+      `raw.output[1].content[0].text` envelope.
+    - POST /v1beta/models/<model>:generateContent and :streamGenerateContent
+      (server-sent events) speak the Gemini API, including candidateCount, so
+      GeminiWrapper and ChatGoogleGenerativeAI can point their base URL here.
+    - /v1beta/cachedContents creates, refreshes (PATCH), reads and deletes
+      cached contexts with a TTL, and generate calls can refer to them by
+      name. An expired or unknown context is rejected with a 403, as by Gemini.
+
+    Answers are deterministic: a question from the bank gets its labelled
+    topics, any other question gets a topic picked from its hash.
+    """
+
+    def __init__(self, config: StandInConfig | None = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StandInConfig()
+        self.store = QuestionStore(self.config.store_path)
+
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._request_times: list[float] = []
+        # (endpoint, status, seconds) per request
+        self.requests: list[tuple[str, int, float]] = []
+        # cached context name -> {"system": ..., "tokens": ..., "expires_at": ...}
+        self.contexts: dict[str, dict] = {}
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self) -> None:
+                server._handle(self)
+
+            do_GET = do_PATCH = do_DELETE = do_POST
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def nala_url(self) -> str:
+        return f"{self.base_url}/api/llm/"
+
+    def start(self) -> "StandInServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def answer(self, user_text: str) -> str:
+        """
+        The JSON answer for a user prompt, a `{id: topics}` mapping for packed batches.
+        """
+        ids = BATCH_ID_PATTERN.findall(user_text)
+        if ids:
+            parts = BATCH_ID_PATTERN.split(user_text)[1:]
+            texts = {parts[i]: parts[i + 1].strip() for i in range(0, len(parts), 2)}
+            text = json.dumps({qid: self._topics(texts[qid]) for qid in ids})
+        else:
+            text = json.dumps({"topics": self._topics(user_text)})
+        if self.config.chatter:
+            text += "\n\nThese topics cover the main concepts needed to solve the question."
+        return text
+
+    def _topics(self, question: str) -> list[str]:
+        stored = self.store.get(question)
+        if stored is not None and stored.topics.strip():
+            return [t.strip() for t in stored.topics.split(",")]
+        digest = int(hashlib.sha256(question.encode("utf-8")).hexdigest(), 16)
+        return [TOPIC_LIST[digest % len(TOPIC_LIST)]]
+
+    def _draw(self) -> tuple[float, str | None]:
+        """
+        Samples the latency and fault (None, "error" or "throttle") of one request.
+        """
+        config = self.config
+        with self._lock:
+            now = time.time()
+            if config.requests_per_minute:
+                self._request_times = [t for t in self._request_times if now - t < 60]
+                if len(self._request_times) >= config.requests_per_minute:
+                    return 0.0, "throttle"
+                self._request_times.append(now)
+
+            latency = config.latency_median * self._rng.lognormvariate(0, config.latency_sigma)
+            roll = self._rng.random()
+        if roll < config.error_rate:
+            return latency, "error"
+        if roll < config.error_rate + config.throttle_rate:
+            return 0.0, "throttle"
+        return latency, None
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        start = time.perf_counter()
+        body = handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+        path = urlparse(handler.path).path
+
+        if "/cachedContents" in path:
+            status = self._cached_contents(handler, path, body)
+            with self._lock:
+                self.requests.append(("cache", status, time.perf_counter() - start))
+            return
+
+        if path.rstrip("/") == "/api/llm":
+            endpoint = "nala"
+        elif ":generateContent" in path:
+            endpoint = "gemini"
+        elif ":streamGenerateContent" in path:
+            endpoint = "gemini-stream"
+        else:
+            self._send(handler, 404, {"error": f"unknown endpoint {path}"})
+            return
+
+        latency, fault = self._draw()
+        if fault == "throttle":
+            status = 429
+            self._send(
+                handler,
+                429,
+                {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}},
+                {"Retry-After": f"{self.config.retry_after:g}"},
+            )
+        elif fault == "error":
+            status = 503
+            time.sleep(latency)
+            self._send(
+                handler, 503, {"error": {"code": 503, "message": "Overloaded", "status": "UNAVAILABLE"}}
+            )
+        else:
+            status = 200
+            try:
+                if endpoint == "nala":
+                    self._nala(handler, body, latency)
+                else:
+                    self._gemini(handler, body, latency, stream=endpoint == "gemini-stream")
+            except (ET.ParseError, ValueError, KeyError) as e:
+                status = 400
+                self._send(handler, 400, {"error": {"code": 400, "message": str(e)}})
+            except PermissionError as e:
+                status = 403
+                self._send(
+                    handler,
+                    403,
+                    {"error": {"code": 403, "message": str(e), "status": "PERMISSION_DENIED"}},
+                )
+
+        with self._lock:
+            self.requests.append((endpoint, status, time.perf_counter() - start))
+
+    def _send(self, handler, status: int, payload: dict, headers: dict | None = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _nala(self, handler, body: bytes, latency: float) -> None:
+        request = ET.fromstring(body.decode("utf-8").strip())
+        system_prompt = request.findtext("system_prompt") or ""
+        user_text = request.findtext("user_prompt") or ""
+        text = self.answer(user_text)
+        time.sleep(latency)
+        self._send(
+            handler,
+            200,
+            {
+                "raw": {
+                    "model": request.findtext("model"),
+                    "output": [
+                        {"type": "reasoning", "summary": []},
+                        {"type": "message", "content": [{"type": "output_text", "text": text}]},
+                    ],
+                    "usage": {
+                        "input_tokens": (len(system_prompt) + len(user_text)) // 4,
+                        "output_tokens": len(text) // 4,
+                    },
+                }
+            },
+        )
+
+    def _gemini(self, handler, body: bytes, latency: float, stream: bool) -> None:
+        request = json.loads(body)
+        user_text = "".join(
+            part.get("text", "") for part in request["contents"][-1].get("parts", [])
+        )
+        system_text = "".join(
+            part.get("text", "")
+            for part in (request.get("systemInstruction") or {}).get("parts", [])
+        )
+        cached_tokens = 0
+        if request.get("cachedContent"):
+            if system_text:
+                raise ValueError("cachedContent can't be combined with a systemInstruction")
+            context = self._context(request["cachedContent"])
+            system_text = context["system"]
+            cached_tokens = context["tokens"]
+        candidate_count = (request.get("generationConfig") or {}).get("candidateCount") or 1
+        text = self.answer(user_text)
+        prompt_tokens = max(cached_tokens, len(system_text) // 4) + len(user_text) // 4
+        usage = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": candidate_count * len(text) // 4,
+            "totalTokenCount": prompt_tokens + candidate_count * len(text) // 4,
+        }
+        if cached_tokens:
+            usage["cachedContentTokenCount"] = cached_tokens
+        # prefill of the input that wasn't cached, before the first token
+        prefill = (prompt_tokens - cached_tokens) / 1000 * self.config.prefill_per_1k_tokens
+
+        def response(chunk: str, finished: bool) -> dict:
+            candidate = {"content": {"role": "model", "parts": [{"text": chunk}]}}
+            payload = {
+                "candidates": [{**candidate, "index": i} for i in range(candidate_count)],
+                "modelVersion": "stand-in",
+            }
+            if finished:
+                for c in payload["candidates"]:
+                    c["finishReason"] = "STOP"
+                payload["usageMetadata"] = usage
+            return payload
+
+        if not stream:
+            time.sleep(prefill + latency)
+            self._send(handler, 200, response(text, finished=True))
+            return
+
+        # first token after the prefill and half the latency, the rest spread over the other half
+        chunks = [text[i : i + 16] for i in range(0, len(text), 16)] or [""]
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        time.sleep(prefill + latency / 2)
+        try:
+            for i, chunk in enumerate(chunks):
+                event = json.dumps(response(chunk, finished=i == len(chunks) - 1))
+                handler.wfile.write(f"data: {event}\r\n\r\n".encode("utf-8"))
+                handler.wfile.flush()
+                time.sleep(latency / 2 / len(chunks))
+        except (BrokenPipeError, ConnectionResetError):
+            # the client stopped reading, e.g. after the JSON answer closed
+            pass
+        handler.close_connection = True
+
+    def _context(self, name: str) -> dict:
+        with self._lock:
+            context = self.contexts.get(name)
+            if context is None or context["expires_at"] < time.time():
+                self.contexts.pop(name, None)
+                raise PermissionError(f"CachedContent not found (or permission denied): {name}")
+            return context
+
+    def _cached_contents(self, handler: BaseHTTPRequestHandler, path: str, body: bytes) -> int:
+        """
+        Serves the cachedContents endpoints. Returns the response status.
+        """
+        method = handler.command
+        if not self.config.context_caching:
+            self._send(handler, 404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+            return 404
+
+        request = json.loads(body) if body else {}
+        name = path[path.index("cachedContents") :].rstrip("/")
+
+        def resource(name: str, context: dict) -> dict:
+            expire_time = datetime.fromtimestamp(context["expires_at"], timezone.utc)
+            return {
+                "name": name,
+                "model": context["model"],
+                "expireTime": expire_time.isoformat().replace("+00:00", "Z"),
+                "usageMetadata": {"totalTokenCount": context["tokens"]},
+            }
+
+        def ttl_seconds() -> float:
+            return float(request.get("ttl", "3600s").rstrip("s"))
+
+        if method == "POST" and name == "cachedContents":
+            system = "".join(
+                part.get("text", "") for part in (request.get("systemInstruction") or {}).get("parts", [])
+            )
+            parts = [part for content in request.get("contents") or [] for part in content.get("parts", [])]
+            # files are counted as one page's worth of tokens each
+            tokens = (len(system) + sum(len(part.get("text", "")) for part in parts)) // 4
+            tokens += 258 * sum("fileData" in part for part in parts)
+            if tokens < self.config.min_cache_tokens:
+                self._send(
+                    handler,
+                    400,
+                    {
+                        "error": {
+                            "code": 400,
+                            "message": f"Cached content is too small. total_token_count={tokens}, "
+                            f"min_total_token_count={self.config.min_cache_tokens}",
+                            "status": "INVALID_ARGUMENT",
+                        }
+                    },
+                )
+                return 400
+            context = {
+                "model": request.get("model"),
+                "system": system,
+                "tokens": tokens,
+                "expires_at": time.time() + ttl_seconds(),
+            }
+            name = f"cachedContents/{uuid.uuid4().hex[:16]}"
+            with self._lock:
+                self.contexts[name] = context
+            self._send(handler, 200, resource(name, context))
+            return 200
+
+        try:
+            context = self._context(name)
+        except PermissionError as e:
+            self._send(handler, 403, {"error": {"code": 403, "message": str(e), "status": "PERMISSION_DENIED"}})
+            return 403
+
+        if method == "PATCH":
+            with self._lock:
+                context["expires_at"] = time.time() + ttl_seconds()
+        elif method == "DELETE":
+            with self._lock:
+                self.contexts.pop(name, None)
+            self._send(handler, 200, {})
+            return 200
+        self._send(handler, 200, resource(name, context))
+        return 200
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline stand-in for the NALA and Gemini APIs.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-median", type=float, default=0.5, help="seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal shape")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After of 429s, seconds")
+    parser.add_argument("--rpm", type=float, default=None, help="enforce a requests-per-minute quota")
+    parser.add_argument("--chatter", action="store_true", help="add trailing text after answers")
+    parser.add_argument(
+        "--prefill", type=float, default=0.0, help="seconds per 1k uncached input tokens"
+    )
+    parser.add_argument("--no-context-caching", action="store_true", help="404 on cachedContents")
+    args = parser.parse_args()
+
+    server = StandInServer(
+        StandInConfig(
+            latency_median=args.latency_median,
+            latency_sigma=args.latency_sigma,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            retry_after=args.retry_after,
+            requests_per_minute=args.rpm,
+            chatter=args.chatter,
+            prefill_per_1k_tokens=args.prefill,
+            context_caching=not args.no_context_caching,
+        ),
+        port=args.port,
+    )
+    print(f"Stand-in server on {server.base_url}")
+    print(f"  NALA_BASE_URL={server.nala_url}")
+    print(f"  GEMINI_BASE_URL={server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,65 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+@dataclass
+class CallStats:
+    """
+    Timings and usage of one model call. Durations are in seconds, fields a
+    backend cannot observe (e.g. tokens of a cut-off stream) stay None.
+    """
+
+    model: str
+    setting: str
+    started_at: float
+    num_questions: int = 1
+    # None until the call finishes: "ok", "cached", "empty", "error", "http_<code>", ...
+    status: str | None = None
+    queue_wait_s: float = 0.0
+    backoff_s: float = 0.0
+    network_s: float = 0.0
+    ttft_s: float | None = None
+    total_s: float = 0.0
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+    # input tokens served from a cached context
+    cached_input_tokens: int | None = None
+    retries: int | None = 0
+
+
+class Telemetry:
+    """
+    Thread-safe collection of CallStats for one model instance.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.calls: list[CallStats] = []
+
+    @contextmanager
+    def track(self, model: str, setting: str, num_questions: int = 1):
+        """
+        Yields a CallStats for the caller to fill in, and records it with its
+        total latency when the block exits. A call that never set a status was
+        answered without reaching the backend, i.e. from the response cache.
+        """
+        stats = CallStats(model, setting, started_at=time.time(), num_questions=num_questions)
+        start = time.perf_counter()
+        try:
+            yield stats
+        except Exception as e:
+            if stats.status is None:
+                stats.status = type(e).__name__
+            raise
+        finally:
+            stats.total_s = time.perf_counter() - start
+            if stats.status is None:
+                stats.status = "cached"
+            with self._lock:
+                self.calls.append(stats)
+
+    def snapshot(self) -> list[CallStats]:
+        with self._lock:
+            return list(self.calls)
@@ -1,28 +1,24 @@
 import os
 import json
-import pandas as pd
+from question_store import QuestionStore
 from dotenv import load_dotenv
-from llm_wrappers import NalaGPTWrapper, GeminiWrapper
+from model_registry import build_models
+from eval_engine import vote_topics
 
 # Load environment variables for API keys
 load_dotenv()
-NALA_API_KEY = os.getenv("NALA_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-# Define the list of models to test
-llm_list = [
-    ("GPT-5 (High Thinking)", NalaGPTWrapper(NALA_API_KEY, reasoning_effort="high")),
-    ("GPT-5 (Low Thinking)", NalaGPTWrapper(NALA_API_KEY, reasoning_effort="low")),
-    ("Gemini 3.1 Flash Lite Preview (High Thinking)", GeminiWrapper(GEMINI_API_KEY, thinking_level="high")),
-    ("Gemini 3.1 Flash Lite Preview (Low Thinking)", GeminiWrapper(GEMINI_API_KEY, thinking_level="minimal")),
-]
+# Define the list of models to test (set TEST_MODELS to a comma-separated list of
+# model keys, see model_registry.py, to build and test only those)
+model_keys = os.getenv("TEST_MODELS", "gpt5-high,gpt5-low,gemini-high,gemini-low").split(",")
+llm_list = build_models(model_keys)
 
 # Load global system prompt
 with open("system_prompt.md", mode="r") as f:
     system_prompt: str = f.read()
 
-# Load the question bank
-df = pd.read_csv("question_bank.csv")
+# Load the labelled questions from the bank
+df = QuestionStore().questions(labelled=True)
 
 # Get the first question only
 first_row = df.iloc[0]
@@ -31,14 +27,14 @@ target_topics_raw: str = first_row["topics"]
 target_topics: set = {t.strip() for t in target_topics_raw.split(",")}
 
 print(f"Question: {question}")
-print(f"Target Topics (CSV): {target_topics}\n")
+print(f"Target Topics (Bank): {target_topics}\n")
 
 # Process the question with each model in the list
 for llm_name, llm in llm_list:
     print(f"Model: {llm_name}")
-    for trial in range(3):
-        response: str = llm.invoke(system_prompt, question)
-
+    # all trials are generated together (one request, or concurrent requests)
+    responses: list[str | None] = llm.sample(system_prompt, question, n=3)
+    for trial, response in enumerate(responses):
         if response is None:
             print("  ERROR: No response received.")
             continue
@@ -60,4 +56,13 @@ for llm_name, llm in llm_list:
             print(f"ERROR: Could not parse JSON response: {e}")
             print(f"Raw Response Snippet: {response[:200]}...")
 
+    voted = vote_topics(responses)
+    if voted is not None:
+        majority, agreement = voted
+        print(f"Majority Topics: {sorted(majority)}")
+        print(
+            "Agreement: "
+            + ", ".join(f"{topic} {score:.0%}" for topic, score in sorted(agreement.items(), key=lambda x: -x[1]))
+        )
+
 print("\n--- Test Complete ---")
\ No newline at end of file
@@ -0,0 +1,48 @@
+import pathlib
+import pytest
+from standin_server import StandInConfig, StandInServer
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(monkeypatch, tmp_path):
+    """
+    Runs every test from the repo root (scripts read system_prompt.md and
+    question_bank.csv relative to it) with throwaway caches and stores.
+    """
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv("RATE_LIMIT_DB", str(tmp_path / "rate_limits.sqlite"))
+    monkeypatch.setenv("LLM_CACHE", str(tmp_path / "llm_cache.sqlite"))
+    monkeypatch.setenv("QUESTION_DB", str(tmp_path / "question_bank.sqlite"))
+    for name in ("NALA_BASE_URL", "GEMINI_BASE_URL", "GEMINI_MAX_RPM", "LLM_REPLAY_ONLY"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def start_standin(tmp_path, monkeypatch):
+    """
+    Starts stand-in NALA/Gemini servers (answering bank questions with their
+    labels) with StandInConfig overrides, and points the wrappers at the last
+    one started. Every server is stopped after the test.
+    """
+    servers = []
+
+    def start(**config) -> StandInServer:
+        config.setdefault("latency_median", 0.01)
+        config.setdefault("latency_sigma", 0.1)
+        store_path = str(tmp_path / f"standin_store_{len(servers)}.sqlite")
+        server = StandInServer(StandInConfig(store_path=store_path, **config)).start()
+        servers.append(server)
+        monkeypatch.setenv("NALA_BASE_URL", server.nala_url)
+        monkeypatch.setenv("GEMINI_BASE_URL", server.base_url)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def standin(start_standin):
+    return start_standin()
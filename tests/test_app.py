@@ -0,0 +1,61 @@
+import pathlib
+import pandas as pd
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+APP = str(pathlib.Path(__file__).resolve().parent.parent / "app.py")
+QUESTIONS = ["Find the determinant of $A$.", "Compute the curl of $F = (y, -x, 0)$."]
+
+
+@pytest.fixture
+def start_app(monkeypatch):
+    """
+    Runs the app with its Gemini wrapper pointed at `base_url`.
+    """
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_RPM", "6000")
+
+    def start(base_url: str) -> AppTest:
+        monkeypatch.setenv("GEMINI_BASE_URL", base_url)
+        # the wrapper and cache are cache_resource singletons, shared across app runs
+        st.cache_resource.clear()
+        app = AppTest.from_file(APP, default_timeout=120)
+        app.run()
+        return app
+
+    return start
+
+
+@pytest.fixture
+def unreachable_app(start_app):
+    # nothing listens on port 9, so every call fails
+    return start_app("http://127.0.0.1:9")
+
+
+def tag_all(app: AppTest) -> pd.DataFrame:
+    csv_bytes = pd.DataFrame({"question": QUESTIONS}).to_csv(index=False).encode("utf-8")
+    app.file_uploader[0].set_value(("questions.csv", csv_bytes, "text/csv"))
+    app.run()
+    next(button for button in app.button if button.label == "Tag All Questions").click().run()
+    return app.session_state["bulk_results"]
+
+
+def test_bulk_marks_failed_calls_as_errors(unreachable_app):
+    results = tag_all(unreachable_app)
+    assert all(status.startswith("error: ") for status in results["status"])
+    assert (results["topics"] == "").all()
+
+
+def test_single_question_shows_the_failure(unreachable_app):
+    app = unreachable_app
+    app.text_area[0].input(QUESTIONS[0])
+    next(button for button in app.button if button.label == "Extract Topics").click().run()
+    assert [error.value for error in app.error][0].startswith("Topic extraction failed:")
+    assert not app.info
+
+
+def test_bulk_tags_questions_against_the_standin(start_app, standin):
+    results = tag_all(start_app(standin.base_url))
+    assert (results["status"] == "done").all()
+    assert results["topics"].str.len().gt(0).all()
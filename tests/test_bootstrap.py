@@ -0,0 +1,80 @@
+import random
+import pytest
+from bootstrap import Bootstrap
+from topics import NUM_TOPICS
+
+
+def outcomes_with_accuracy(n: int, flip_rate: float, seed: int) -> dict[str, tuple[int, int]]:
+    """
+    {question id: (true mask, pred mask)} with each topic bit of the
+    prediction flipped with probability `flip_rate`.
+    """
+    rng = random.Random(seed)
+    outcomes = {}
+    for i in range(n):
+        true_mask = 1 << rng.randrange(NUM_TOPICS) | 1 << rng.randrange(NUM_TOPICS)
+        flips = sum(1 << t for t in range(NUM_TOPICS) if rng.random() < flip_rate)
+        outcomes[f"q{i}"] = (true_mask, true_mask ^ flips)
+    return outcomes
+
+
+@pytest.fixture
+def outcomes():
+    return {
+        "strong": outcomes_with_accuracy(60, 0.01, 1),
+        "medium": outcomes_with_accuracy(60, 0.05, 2),
+        "weak": outcomes_with_accuracy(60, 0.1, 3),
+        "weak-twin": outcomes_with_accuracy(60, 0.1, 4),
+    }
+
+
+def test_intervals_contain_the_point_estimate(outcomes):
+    estimates = Bootstrap(n_replicates=500).model_estimates(outcomes["medium"])
+    for name in ("kappa", "micro_f1", "macro_f1"):
+        estimate = estimates[name]
+        assert estimate.low <= estimate.value <= estimate.high
+    assert estimates["n_questions"] == 60
+
+
+def test_kappa_interval_matches_model_estimates(outcomes):
+    # same seed, same weights: the kappa-only path must give the same interval
+    full = Bootstrap(n_replicates=500, seed=7).model_estimates(outcomes["weak"])["kappa"]
+    assert Bootstrap(n_replicates=500, seed=7).kappa_interval(outcomes["weak"]) == full
+
+
+def test_identical_models_do_not_differ(outcomes):
+    test = Bootstrap(n_replicates=200).paired_test("a", outcomes["weak"], "b", outcomes["weak"])
+    assert test.kappa_diff.value == test.kappa_diff.low == test.kappa_diff.high == 0
+    assert test.kappa_p == 1.0
+
+
+def test_paired_test_uses_only_shared_questions(outcomes):
+    partial = dict(list(outcomes["weak"].items())[:20])
+    test = Bootstrap(n_replicates=200).paired_test("a", outcomes["strong"], "b", partial)
+    assert test.n_questions == 20
+    assert Bootstrap(n_replicates=200).paired_test("a", {"x": (1, 1)}, "b", {"y": (1, 1)}) is None
+
+
+def test_clear_difference_is_significant(outcomes):
+    test = Bootstrap(n_replicates=1000).paired_test(
+        "strong", outcomes["strong"], "weak", outcomes["weak"]
+    )
+    assert test.kappa_diff.low > 0
+    assert test.kappa_p < 0.01
+
+
+def test_holm_correction(outcomes):
+    tests = Bootstrap(n_replicates=500).paired_tests(outcomes)
+    assert len(tests) == 6
+
+    ordered = sorted(tests, key=lambda test: test.kappa_p)
+    expected, running_max = [], 0.0
+    for i, test in enumerate(ordered):
+        running_max = max(running_max, min(1.0, (len(tests) - i) * test.kappa_p))
+        expected.append(running_max)
+    assert [test.kappa_p_holm for test in ordered] == pytest.approx(expected)
+    for test in tests:
+        assert test.kappa_p <= test.kappa_p_holm <= 1.0
+    # adjusted p-values keep the order of the raw ones
+    holm = [test.kappa_p_holm for test in ordered]
+    assert holm == sorted(holm)
@@ -0,0 +1,105 @@
+import json
+import pytest
+from cascade import CascadeExtractor, self_agreement
+from topics import encode
+
+
+class StubModel:
+    """
+    Answers every question with a fixed response and counts its calls.
+    """
+
+    def __init__(self, response: str | None) -> None:
+        self.response = response
+        self.calls = 0
+
+    def invoke(self, system_prompt: str, user_text: str) -> str | None:
+        self.calls += 1
+        return self.response
+
+
+class StubBaseline:
+    def __init__(self, topics: list[str]) -> None:
+        self.mask = encode(topics)
+
+    def invoke_mask(self, question: str) -> int:
+        return self.mask
+
+
+def answer(*topics: str, **extra) -> str:
+    return json.dumps({"topics": list(topics), **extra})
+
+
+@pytest.mark.parametrize(
+    "response, fired",
+    [
+        (None, ["unparseable"]),
+        ("I think it's about determinants.", ["unparseable"]),
+        ('{"topics": null}', ["unparseable"]),
+        (answer(), ["empty"]),
+        (answer("Determinants", "Fourier Series"), ["invalid"]),
+        (answer("Determinants"), []),
+        (answer("Determinants", agreement={"Determinants": 0.6}), ["low_agreement"]),
+        (answer("Determinants", agreement={"Determinants": 1.0, "Laplacian": 0.0}), []),
+    ],
+)
+def test_gates(response, fired):
+    cascade = CascadeExtractor([("cheap", StubModel(None))])
+    assert cascade.gates("q", response) == fired
+
+
+def test_baseline_disagreement_gate():
+    cascade = CascadeExtractor([("cheap", StubModel(None))], baseline=StubBaseline(["Laplacian"]))
+    assert cascade.gates("q", answer("Determinants")) == ["baseline_disagreement"]
+    # sharing any topic with the baseline is enough
+    assert cascade.gates("q", answer("Determinants", "Laplacian")) == []
+
+
+def test_choose_stops_at_first_trusted_stage():
+    cascade = CascadeExtractor([("a", None), ("b", None), ("c", None)])
+    stage, fired = cascade.choose("q", [answer(), answer("Determinants"), answer("Laplacian")])
+    assert stage == 1
+    assert fired == [["empty"], []]
+
+
+def test_choose_falls_back_past_an_unparseable_last_stage():
+    cascade = CascadeExtractor([("a", None), ("b", None), ("c", None)])
+    stage, fired = cascade.choose("q", [answer(), answer("Fourier Series"), "garbage"])
+    assert stage == 1
+    assert fired == [["empty"], ["invalid"], ["unparseable"]]
+
+    stage, _ = cascade.choose("q", [None, None, None])
+    assert stage == 2
+
+
+def test_invoke_escalates_and_counts():
+    cheap, strong = StubModel(answer()), StubModel(answer("Determinants"))
+    cascade = CascadeExtractor([("cheap", cheap), ("strong", strong)])
+    for _ in range(4):
+        assert cascade.invoke("prompt", "q") == answer("Determinants")
+    assert (cheap.calls, strong.calls) == (4, 4)
+    assert cascade.escalation_rates() == [1.0]
+    assert cascade.answered_by == [0, 4]
+    assert cascade.gate_counts["empty"] == 4
+
+
+def test_escalation_rates_from_replayed_choices():
+    cascade = CascadeExtractor([("a", None), ("b", None), ("c", None)])
+    assert cascade.escalation_rates() == [0.0, 0.0]
+    replays = [
+        [answer("Determinants")],
+        [answer(), answer("Determinants")],
+        [answer(), answer(), answer("Determinants")],
+        [answer("Laplacian")],
+    ]
+    for responses in replays:
+        cascade.record(*cascade.choose("q", responses))
+    assert cascade.asked == [4, 2, 1]
+    assert cascade.escalation_rates() == [0.5, 0.25]
+    assert cascade.answered_by == [2, 1, 1]
+
+
+def test_self_agreement():
+    assert self_agreement({}) == 1.0
+    assert self_agreement({"A": 1.0, "B": 0.0}) == 1.0
+    assert self_agreement({"A": 0.5}) == 0.5
@@ -0,0 +1,82 @@
+import pytest
+from context_cache import ContextCache
+from eval_engine import parse_topics
+from llm_wrappers import GeminiWrapper
+from prompt_routing import TopicRouter
+from question_store import QuestionStore
+
+
+@pytest.fixture
+def system_prompt():
+    with open("system_prompt.md", "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def long_prompt(system_prompt):
+    # a prompt with worked examples, comfortably above the 1,024-token minimum
+    example = "\n\nExample: Find the determinant of $A$.\nAnswer: {\"topics\": [\"Determinants\"]}"
+    prompt = system_prompt + example * 80
+    assert len(prompt) // 4 > 1024
+    return prompt
+
+
+@pytest.fixture
+def labelled():
+    store = QuestionStore()
+    rows = store.questions(labelled=True).head(3)
+    store.close()
+    return {
+        row.question: {topic.strip() for topic in row.topics.split(",")}
+        for row in rows.itertuples()
+    }
+
+
+def gemini(context_cache: ContextCache) -> GeminiWrapper:
+    return GeminiWrapper(
+        "test-key", thinking_level="minimal", requests_per_minute=6000, context_cache=context_cache
+    )
+
+
+def context_requests(server) -> int:
+    return sum(endpoint == "cache" for endpoint, _, _ in server.requests)
+
+
+def test_topic_prompts_are_below_the_minimum(standin, system_prompt, labelled):
+    context_cache = ContextCache()
+    llm = gemini(context_cache)
+    router = TopicRouter(system_prompt)
+    for question, topics in labelled.items():
+        for prompt in (system_prompt, router.route(question)):
+            assert parse_topics(llm.invoke(prompt, question)) == topics
+    # sent in full, without asking the API to cache them
+    assert context_requests(standin) == 0
+    assert not standin.contexts
+
+
+def test_long_prompt_is_sent_once_as_a_cached_context(standin, long_prompt, labelled):
+    context_cache = ContextCache()
+    llm = gemini(context_cache)
+    for question, topics in labelled.items():
+        assert parse_topics(llm.invoke(long_prompt, question)) == topics
+    assert len(standin.contexts) == 1
+    assert context_requests(standin) == 1
+    # every request refers to the context, its tokens are billed as cached input
+    assert all(stats.cached_input_tokens > 1024 for stats in llm.telemetry.snapshot())
+
+    context_cache.clear()
+    assert not standin.contexts
+
+
+def test_deleted_context_is_recreated(standin, long_prompt, labelled):
+    context_cache = ContextCache()
+    llm = gemini(context_cache)
+    question, topics = next(iter(labelled.items()))
+    assert parse_topics(llm.invoke(long_prompt, question)) == topics
+    (first,) = standin.contexts
+    # deleted elsewhere: the call falls back to the full prompt, the next one caches again
+    standin.contexts.clear()
+    assert parse_topics(llm.invoke(long_prompt, question)) == topics
+    assert parse_topics(llm.invoke(long_prompt, question)) == topics
+    (second,) = standin.contexts
+    assert second != first
@@ -0,0 +1,108 @@
+import json
+import threading
+import pytest
+from eval_engine import parse_topics, run_jobs, vote_topics
+
+
+class StubModel:
+    """
+    Answers with each question's text as its only topic.
+    """
+
+    max_concurrency = 2
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.calls = []
+
+    def invoke(self, system_prompt: str, user_text: str) -> str:
+        with self.lock:
+            self.calls.append(user_text)
+        return json.dumps({"topics": [user_text]})
+
+
+class StubBatchModel(StubModel):
+    batch_size = 2
+
+    def invoke_batch(self, system_prompt: str, questions: dict[str, str]) -> dict:
+        with self.lock:
+            self.calls.append(sorted(questions))
+        return {qid: [text] for qid, text in questions.items()}
+
+
+@pytest.mark.parametrize(
+    "response, topics",
+    [
+        ('{"topics": ["A", "B"]}', {"A", "B"}),
+        ('Sure: {"topics": ["A"]} done', {"A"}),
+        ("{}", set()),
+        ('{"topics": null}', None),
+        ('{"topics": "A"}', None),
+        ('{"topics": ["A", 1]}', None),
+        ("no json", None),
+        (None, None),
+    ],
+)
+def test_parse_topics(response, topics):
+    assert parse_topics(response) == topics
+
+
+def test_vote_topics_resolves_spellings_and_ignores_unparseable_samples():
+    responses = [
+        '{"topics": ["Row Reduction", "Determinants"]}',
+        '{"topics": ["gaussian elimination"]}',
+        "garbage",
+        '{"topics": ["Gaussian Elimination", "Laplacian"]}',
+    ]
+    majority, agreement = vote_topics(responses)
+    assert majority == {"Gaussian Elimination"}
+    assert agreement["Gaussian Elimination"] == 1.0
+    assert agreement["Determinants"] == pytest.approx(1 / 3)
+    assert vote_topics(["garbage", None]) is None
+
+
+def test_run_jobs_collects_every_response():
+    questions = ["q1", "q2", "q3"]
+    model, batched = StubModel(), StubBatchModel()
+    responses = run_jobs(questions, [("single", model), ("batched", batched)], "prompt")
+
+    for q_idx, question in enumerate(questions):
+        assert parse_topics(responses[(q_idx, "single")]) == {question}
+        assert parse_topics(responses[(q_idx, "batched")]) == {question}
+    assert sorted(model.calls) == questions
+    # two batches of at most two questions
+    assert sorted(len(batch) for batch in batched.calls) == [1, 2]
+
+
+def test_run_jobs_skips_done_jobs():
+    model = StubModel()
+    responses = run_jobs(["q1", "q2"], [("m", model)], "prompt", skip={(0, "m")})
+    assert model.calls == ["q2"]
+    assert list(responses) == [(1, "m")]
+
+
+def test_run_jobs_survives_a_failing_callback(capsys):
+    handled = []
+
+    def on_result(q_idx, llm_name, response, latency):
+        if q_idx == 1:
+            raise ValueError("odd response")
+        handled.append(q_idx)
+
+    responses = run_jobs(["q1", "q2", "q3"], [("m", StubModel())], "prompt", on_result=on_result)
+    assert len(responses) == 3
+    assert sorted(handled) == [0, 2]
+    assert "[Error] Handling m on question 2 failed: odd response" in capsys.readouterr().out
+
+
+def test_run_jobs_records_a_failing_model_as_none(capsys):
+    class FailingModel(StubModel):
+        def invoke(self, system_prompt, user_text):
+            if user_text == "q2":
+                raise RuntimeError("400 Bad Request")
+            return super().invoke(system_prompt, user_text)
+
+    responses = run_jobs(["q1", "q2"], [("m", FailingModel())], "prompt")
+    assert responses[(1, "m")] is None
+    assert parse_topics(responses[(0, "m")]) == {"q1"}
+    assert "[API Error] m on question(s) [2]: 400 Bad Request" in capsys.readouterr().out
@@ -0,0 +1,59 @@
+import random
+import numpy as np
+import pytest
+from sklearn.metrics import cohen_kappa_score
+from bootstrap import kappa, question_counts
+from metrics import MetricAccumulator, unpack
+from topics import NUM_TOPICS
+
+
+def random_masks(n: int, seed: int) -> tuple[list[int], list[int]]:
+    rng = random.Random(seed)
+    true_masks = [rng.getrandbits(NUM_TOPICS) & rng.getrandbits(NUM_TOPICS) for _ in range(n)]
+    # predictions agree with the labels on most bits
+    flips = [rng.getrandbits(NUM_TOPICS) & rng.getrandbits(NUM_TOPICS) for _ in range(n)]
+    pred_masks = [
+        mask ^ (flip & rng.getrandbits(NUM_TOPICS)) for mask, flip in zip(true_masks, flips)
+    ]
+    return true_masks, pred_masks
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_kappa_matches_sklearn_on_flattened_labels(seed):
+    true_masks, pred_masks = random_masks(50, seed)
+    accumulator = MetricAccumulator()
+    for true_mask, pred_mask in zip(true_masks, pred_masks):
+        accumulator.update(true_mask, pred_mask)
+
+    expected = cohen_kappa_score(unpack(true_masks).ravel(), unpack(pred_masks).ravel())
+    assert accumulator.kappa() == pytest.approx(expected)
+
+
+def test_bootstrap_kappa_matches_accumulator():
+    true_masks, pred_masks = random_masks(30, 3)
+    accumulator = MetricAccumulator()
+    for true_mask, pred_mask in zip(true_masks, pred_masks):
+        accumulator.update(true_mask, pred_mask)
+
+    counts = [c.sum(axis=0) for c in question_counts(true_masks, pred_masks)]
+    assert float(kappa(*counts, len(true_masks))) == pytest.approx(accumulator.kappa())
+
+
+def test_counts_and_micro_f1():
+    accumulator = MetricAccumulator()
+    accumulator.update(0b011, 0b110, num_invalid=2)
+    accumulator.update(0b100, 0b100)
+    assert accumulator.tp[:3].tolist() == [0, 1, 1]
+    assert accumulator.fp[:3].tolist() == [0, 0, 1]
+    assert accumulator.fn[:3].tolist() == [1, 0, 0]
+    assert int(accumulator.tn.sum()) == 2 * NUM_TOPICS - 4
+    assert accumulator.invalid == 2
+    # 2 TP, 1 FP, 1 FN
+    assert accumulator.micro_f1() == pytest.approx(4 / 6)
+
+
+def test_empty_accumulator_is_zero():
+    accumulator = MetricAccumulator()
+    assert accumulator.kappa() == 0.0
+    assert accumulator.micro_f1() == 0.0
+    assert np.all(accumulator.precision_recall_f1()[2] == 0)
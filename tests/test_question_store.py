@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+from question_store import QuestionStore, normalize_latex, question_key
+
+QUESTION = r"Evaluate $\displaystyle\int_0^1 \left( x^2 + 1 \right) \, dx$."
+
+
+@pytest.fixture
+def store(tmp_path):
+    csv_path = tmp_path / "bank.csv"
+    pd.DataFrame(
+        [
+            ["linear_algebra", "Find the determinant of $A$.", "Determinants"],
+            ["vector_calculus", QUESTION, ""],
+        ],
+        columns=["major_topic", "question", "topics"],
+    ).to_csv(csv_path, index=False)
+    store = QuestionStore(str(tmp_path / "bank.sqlite"), str(csv_path))
+    yield store
+    store.close()
+
+
+@pytest.mark.parametrize(
+    "variant",
+    [
+        r"Evaluate $\int_0^1 (x^2+1) dx$.",
+        r"Evaluate  $\int_0^1 \left(x^2 + 1\right)\;dx$.",
+        "Evaluate $\\int_0^1 ( x^2 +\n 1 ) \\,dx$.",
+    ],
+)
+def test_formatting_variants_share_a_key(variant):
+    assert question_key(variant) == question_key(QUESTION)
+
+
+def test_different_questions_get_different_keys():
+    assert question_key(r"Evaluate $\int_0^2 (x^2+1) dx$.") != question_key(QUESTION)
+    # spaces between words still count
+    assert normalize_latex("let x be") != normalize_latex("letx be")
+
+
+def test_ingest_skips_exact_and_near_duplicates(store):
+    near_duplicate = r"Evaluate $\int_0^1 (x^2+1) dx$ ."
+    new = r"Find the curl of $\mathbf{F} = (y, -x, z)$."
+    added, skipped = store.ingest("vector_calculus", [near_duplicate, new, new])
+
+    assert added == [question_key(new)]
+    assert [(question, match.question) for question, match, _ in skipped] == [
+        (near_duplicate, QUESTION),
+        (new, new),
+    ]
+    assert all(similarity >= 0.9 for _, _, similarity in skipped)
+    assert len(store) == 3
+
+
+def test_ingest_keeps_similar_but_different_exercises(store):
+    variant = r"Evaluate $\displaystyle\int_0^2 \left( x^3 + 5 \right) \, dx$."
+    added, skipped = store.ingest("vector_calculus", [variant])
+    assert added and not skipped
+    assert store.near_duplicates(variant, threshold=0.5)
+
+
+def test_ingest_never_touches_labels(store):
+    store.ingest("linear_algebra", ["Find the determinant of $A$."])
+    assert store.get("Find the determinant of $A$.").topics == "Determinants"
+
+
+def test_import_csv_clears_removed_labels(store, tmp_path):
+    edited = tmp_path / "edited.csv"
+    df = store.questions()[["major_topic", "question", "topics"]]
+    df.loc[0, "topics"] = ""
+    df.to_csv(edited, index=False)
+    store.import_csv(str(edited))
+    assert store.get("Find the determinant of $A$.").topics == ""
+
+
+def test_import_csv_keeps_labels_set_after_the_last_sync(store, tmp_path):
+    store.set_topics(QUESTION, "Volume Integrals")
+    # the CSV is from before the label was set
+    store.import_csv()
+    assert store.get(QUESTION).topics == "Volume Integrals"
+
+
+def test_import_csv_skips_rows_without_a_major_topic(store, tmp_path, capsys):
+    edited = tmp_path / "edited.csv"
+    df = store.questions()[["major_topic", "question", "topics"]]
+    df.loc[1, "major_topic"] = None
+    df.to_csv(edited, index=False)
+    store.import_csv(str(edited))
+
+    assert f"{edited}:3: no major_topic, row skipped" in capsys.readouterr().out
+    # the stored question is kept as it was
+    assert store.get(QUESTION).major_topic == "vector_calculus"
+    assert len(store) == 2
+
+
+def test_export_then_import_round_trip(store, tmp_path):
+    store.upsert("linear_algebra", "Is $\\{(1, 0), (0, 1)\\}$ a basis?", "Basis and Dimension")
+    store.export_csv()
+    reopened = QuestionStore(str(tmp_path / "other.sqlite"), store.csv_path)
+    assert reopened.questions().drop(columns="key").equals(store.questions().drop(columns="key"))
+    reopened.close()
@@ -0,0 +1,69 @@
+import time
+import pytest
+from rate_limiter import SharedRateLimiter
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "rate_limits.sqlite")
+
+
+def test_idle_caller_does_not_raise_the_rate(db_path):
+    limiter = SharedRateLimiter("key", 60, max_requests_per_minute=120, path=db_path)
+    # a full bucket: the acquire doesn't wait, so the success says nothing about headroom
+    limiter._transaction(lambda rate, tokens, now, b, d: ((rate, 1.0, b, d), None))
+    assert limiter.acquire()
+    limiter.on_success()
+    assert limiter.requests_per_minute == 60
+
+
+def test_waiting_caller_raises_the_rate_up_to_the_ceiling(db_path):
+    # each success after a wait adds 1/rate, so two of them stay under the ceiling
+    ceiling = 600 + 2.5 / 600
+    limiter = SharedRateLimiter("key", 600, max_requests_per_minute=ceiling, path=db_path)
+    for _ in range(2):
+        assert limiter.acquire()
+        limiter.on_success()
+    assert 600 + 1.9 / 600 < limiter.requests_per_minute < ceiling
+    assert limiter.acquire()
+    limiter.on_success()
+    assert limiter.requests_per_minute == ceiling
+
+
+def test_throttle_halves_the_rate_once_per_interval(db_path):
+    limiter = SharedRateLimiter("key", 60, path=db_path)
+    limiter.on_throttle()
+    # concurrent 429s of the same burst count once
+    limiter.on_throttle()
+    assert limiter.requests_per_minute == 30
+
+
+def test_throttle_pauses_the_bucket_for_retry_after(db_path):
+    limiter = SharedRateLimiter("key", 60000, path=db_path)
+    limiter.on_throttle(retry_after=0.3)
+    start = time.monotonic()
+    assert not limiter.acquire(blocking=False)
+    assert limiter.acquire()
+    assert time.monotonic() - start >= 0.25
+
+
+def test_never_drops_below_the_floor(db_path):
+    limiter = SharedRateLimiter("key", 4, min_requests_per_minute=2, path=db_path)
+    for _ in range(3):
+        # let a request interval pass so every throttle counts
+        limiter._transaction(lambda rate, tokens, now, b, d: ((rate, tokens, b, 0.0), None))
+        limiter.on_throttle()
+    assert limiter.requests_per_minute == 2
+
+
+def test_instances_with_one_key_share_a_bucket(db_path):
+    first = SharedRateLimiter("key", 60, path=db_path)
+    second = SharedRateLimiter("key", 60, path=db_path)
+    other = SharedRateLimiter("other key", 60, path=db_path)
+    first.on_throttle()
+    assert second.requests_per_minute == 30
+    assert other.requests_per_minute == 60
+
+    first._transaction(lambda rate, tokens, now, b, d: ((rate, 1.0, b, d), None))
+    assert second.acquire(blocking=False)
+    assert not first.acquire(blocking=False)
@@ -0,0 +1,74 @@
+import time
+import pytest
+from llm_wrappers import CacheMissError, ResponseCache
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "llm_cache.sqlite")
+
+
+def test_key_depends_on_every_part():
+    key = ResponseCache.make_key("model", "low", "prompt", "question")
+    assert key == ResponseCache.make_key("model", "low", "prompt", "question")
+    assert len(
+        {
+            key,
+            ResponseCache.make_key("other", "low", "prompt", "question"),
+            ResponseCache.make_key("model", "high", "prompt", "question"),
+            ResponseCache.make_key("model", "low", "other", "question"),
+            ResponseCache.make_key("model", "low", "prompt", "other"),
+        }
+    ) == 5
+
+
+def test_expired_entries_are_ignored(cache_path):
+    cache = ResponseCache(cache_path, ttl_seconds=0.2)
+    cache.put("key", "response")
+    assert cache.get("key") == "response"
+    time.sleep(0.3)
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_entries_are_evicted(cache_path):
+    cache = ResponseCache(cache_path, max_entries=3, evict_every=2)
+    for key in "abc":
+        cache.put(key, key)
+        time.sleep(0.01)
+    # touch "a", so "b" is now the least recently used
+    assert cache.get("a") == "a"
+    cache.put("d", "d")
+    assert [cache.get(key) for key in "abcd"] == ["a", None, "c", "d"]
+
+
+def test_eviction_waits_for_evict_every_puts(cache_path):
+    cache = ResponseCache(cache_path, max_entries=1, evict_every=3)
+    cache.put("a", "a")
+    cache.put("b", "b")
+    assert cache.get("a") == "a"
+    cache.put("c", "c")
+    assert [cache.get(key) for key in "abc"] == [None, None, "c"]
+
+
+def test_cached_call_calls_once_and_skips_failures(cache_path):
+    cache = ResponseCache(cache_path)
+    calls = []
+    assert cache.cached_call("key", lambda: calls.append(1) or "response") == "response"
+    assert cache.cached_call("key", lambda: calls.append(1) or "other") == "response"
+    assert len(calls) == 1
+    # failed calls (None) are retried next time
+    assert cache.cached_call("failed", lambda: None) is None
+    assert cache.cached_call("failed", lambda: "late") == "late"
+
+
+def test_replay_only_raises_on_a_miss(cache_path):
+    ResponseCache(cache_path).put("key", "response")
+    replay = ResponseCache(cache_path, replay_only=True)
+    assert replay.cached_call("key", lambda: pytest.fail("called the API")) == "response"
+    with pytest.raises(CacheMissError):
+        replay.cached_call("missing", lambda: pytest.fail("called the API"))
+
+
+def test_uses_write_ahead_logging(cache_path):
+    cache = ResponseCache(cache_path)
+    assert cache._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
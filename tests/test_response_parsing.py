@@ -0,0 +1,63 @@
+import pytest
+from response_parsing import JsonObjectScanner, parse_json_object
+
+
+def feed_all(chunks: list[str]) -> tuple[JsonObjectScanner, int | None]:
+    """
+    Feeds chunks until the scanner reports the object closed. Returns the
+    scanner and the index of the chunk that closed it.
+    """
+    scanner = JsonObjectScanner()
+    for i, chunk in enumerate(chunks):
+        if scanner.feed(chunk):
+            return scanner, i
+    return scanner, None
+
+
+def test_object_wrapped_in_chatter_and_a_code_fence():
+    chunks = [
+        "Sure! Here you go:\n```json\n",
+        '{"topics": ["Determinants"]}',
+        "\n```\nHope this helps.",
+    ]
+    scanner, closed_at = feed_all(chunks)
+    assert closed_at == 1
+    assert scanner.text == '{"topics": ["Determinants"]}'
+
+
+def test_object_split_across_many_chunks():
+    text = 'x {"topics": ["Matrix Algebra", "Rank and Nullity"], "n": {"a": 1}} trailing'
+    scanner, closed_at = feed_all([text[i : i + 3] for i in range(0, len(text), 3)])
+    assert closed_at is not None
+    assert parse_json_object(scanner.text) == {
+        "topics": ["Matrix Algebra", "Rank and Nullity"],
+        "n": {"a": 1},
+    }
+
+
+def test_braces_and_escaped_quotes_inside_strings_are_ignored():
+    chunks = ['{"topics": ["a } b", "say \\"{\\" "]', ', "x": "\\\\"}', "{never reached}"]
+    scanner, closed_at = feed_all(chunks)
+    assert closed_at == 1
+    assert parse_json_object(scanner.text)["topics"] == ["a } b", 'say "{" ']
+
+
+def test_unclosed_object_returns_everything_received():
+    scanner, closed_at = feed_all(['{"topics": ["A"', ", "])
+    assert closed_at is None
+    assert not scanner.complete
+    assert scanner.text == '{"topics": ["A", '
+
+
+@pytest.mark.parametrize(
+    "response, expected",
+    [
+        ('{"topics": []}', {"topics": []}),
+        ('```json\n{"topics": ["A"]}\n```', {"topics": ["A"]}),
+        ("no json here", None),
+        ("[1, 2]", None),
+        (None, None),
+    ],
+)
+def test_parse_json_object(response, expected):
+    assert parse_json_object(response) == expected
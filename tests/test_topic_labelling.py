@@ -0,0 +1,50 @@
+import os
+import pathlib
+import subprocess
+import sys
+import pandas as pd
+
+SCRIPT = str(pathlib.Path(__file__).resolve().parent.parent / "topic_labelling.py")
+
+
+def run_labelling(workdir: pathlib.Path, rows: list[list[str]], answers: str) -> str:
+    """
+    Runs the labelling CLI without a Gemini key on a bank of (major_topic,
+    question, topics) rows, typing `answers`. Returns its output.
+    """
+    pd.DataFrame(rows, columns=["major_topic", "question", "topics"]).to_csv(
+        workdir / "question_bank.csv", index=False
+    )
+    env = {**os.environ, "GEMINI_API_KEY": "", "QUESTION_DB": str(workdir / "bank.sqlite")}
+    result = subprocess.run(
+        [sys.executable, SCRIPT],
+        input=answers,
+        capture_output=True,
+        text=True,
+        cwd=workdir,
+        env=env,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_starts_on_a_bank_with_no_labels(tmp_path):
+    rows = [
+        ["linear_algebra", "Find the determinant of $A$.", ""],
+        ["vector_calculus", "Compute the curl of $F$.", ""],
+    ]
+    output = run_labelling(tmp_path, rows, "3\nq\n")
+    assert "Suggestions from: none (no labelled questions yet)" in output
+    assert "Selected topics: Determinants" in output
+    saved = pd.read_csv(tmp_path / "question_bank.csv").fillna("")
+    assert saved["topics"].tolist() == ["Determinants", ""]
+
+
+def test_suggests_from_the_baseline_once_questions_are_labelled(tmp_path):
+    rows = [
+        ["linear_algebra", "Find the determinant of $A$.", "Determinants"],
+        ["linear_algebra", "Find the determinant of $B$.", ""],
+    ]
+    output = run_labelling(tmp_path, rows, "q\n")
+    assert "Suggestions from: local baseline" in output
@@ -0,0 +1,45 @@
+import pytest
+from topics import TOPIC_IDS, TopicResolver, count_invalid, decode, encode
+
+
+@pytest.fixture
+def resolver():
+    return TopicResolver()
+
+
+@pytest.mark.parametrize(
+    "name, topic",
+    [
+        ("Cauchy-Riemann Equations", "Cauchy-Riemann Equations"),
+        # case and punctuation
+        ("cauchy riemann equations", "Cauchy-Riemann Equations"),
+        ("EULERS FORMULA AND DE MOIVRES FORMULA", "Euler's Formula and De Moivre's Formula"),
+        # aliases
+        ("Row Reduction", "Gaussian Elimination"),
+        ("curl", "Del Operator"),
+        # typos go through the fuzzy trigram match
+        ("Eigenvalues and Eigenvector", "Eigenvalues and Eigenvectors"),
+        ("Diagonalisation", "Diagonalization"),
+    ],
+)
+def test_resolves_spelling_variants(resolver, name, topic):
+    assert resolver.resolve(name) == TOPIC_IDS[topic]
+    assert resolver.canonical(name) == topic
+
+
+@pytest.mark.parametrize("name", ["Fourier Series", "", "!!!", "Quantum Chromodynamics"])
+def test_unrelated_names_resolve_to_nothing(resolver, name):
+    assert resolver.resolve(name) is None
+
+
+def test_fuzzy_threshold_is_respected():
+    strict = TopicResolver(fuzzy_threshold=0.99)
+    assert strict.resolve("Diagonalisation") is None
+
+
+def test_encode_decode_round_trip():
+    topics = ["Determinants", "Laplacian", "Complex Numbers"]
+    assert set(decode(encode(topics))) == set(topics)
+    # unresolvable names are left out of the mask and counted as invalid
+    assert encode(topics + ["Fourier Series"]) == encode(topics)
+    assert count_invalid(topics + ["Fourier Series"]) == 1
@@ -0,0 +1,162 @@
+import asyncio
+import time
+import pytest
+from pydantic import BaseModel
+from eval_engine import parse_topics
+from llm_wrappers import GeminiWrapper, NalaGPTWrapper, ResponseCache
+from question_store import QuestionStore
+
+
+@pytest.fixture
+def system_prompt():
+    with open("system_prompt.md", "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def labelled():
+    """
+    A few labelled bank questions, as {question: set of topics}.
+    """
+    store = QuestionStore()
+    rows = store.questions(labelled=True).head(4)
+    store.close()
+    return {
+        row.question: {topic.strip() for topic in row.topics.split(",")}
+        for row in rows.itertuples()
+    }
+
+
+class Topics(BaseModel):
+    topics: list[str]
+
+
+def gemini(**kwargs) -> GeminiWrapper:
+    # fast enough that pacing doesn't slow the tests, slow enough to be paced
+    kwargs.setdefault("requests_per_minute", 6000)
+    return GeminiWrapper("test-key", thinking_level="minimal", **kwargs)
+
+
+def test_nala_invoke_and_cache(standin, system_prompt, labelled, tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    llm = NalaGPTWrapper("test-key", cache=cache)
+    for question, topics in labelled.items():
+        assert parse_topics(llm.invoke(system_prompt, question)) == topics
+
+    # answered again from the cache, with no requests
+    replay = NalaGPTWrapper(
+        "test-key",
+        cache=ResponseCache(cache.path, replay_only=True),
+        base_url="http://127.0.0.1:9/",
+    )
+    for question, topics in labelled.items():
+        assert parse_topics(replay.invoke(system_prompt, question)) == topics
+
+
+def test_nala_ainvoke_across_event_loops(standin, system_prompt, labelled):
+    llm = NalaGPTWrapper("test-key")
+    question, topics = next(iter(labelled.items()))
+    # each asyncio.run has its own loop, and the client of the first must not be reused
+    assert parse_topics(asyncio.run(llm.ainvoke(system_prompt, question))) == topics
+    assert parse_topics(asyncio.run(llm.ainvoke(system_prompt, question))) == topics
+
+    async def ask_all() -> list[str | None]:
+        try:
+            return await asyncio.gather(
+                *(llm.ainvoke(system_prompt, question) for question in labelled)
+            )
+        finally:
+            await llm.aclose()
+
+    responses = asyncio.run(ask_all())
+    assert [parse_topics(response) for response in responses] == list(labelled.values())
+
+
+def test_gemini_invoke_and_stream_through_chatter(start_standin, system_prompt, labelled):
+    start_standin(chatter=True)
+    llm = gemini()
+    for question, topics in labelled.items():
+        assert parse_topics(llm.invoke(system_prompt, question)) == topics
+        streamed = llm.invoke_stream(system_prompt, question)
+        assert parse_topics(streamed) == topics
+
+
+def test_gemini_invoke_batch(standin, system_prompt, labelled):
+    llm = gemini()
+    questions = {f"q{i}": question for i, question in enumerate(labelled)}
+    answers = llm.invoke_batch(system_prompt, questions, batch_size=3)
+    assert {qid: set(topics) for qid, topics in answers.items()} == {
+        qid: labelled[question] for qid, question in questions.items()
+    }
+
+
+def test_throttling_slows_the_shared_limiter(start_standin, system_prompt, labelled):
+    start_standin(throttle_rate=0.5, retry_after=0.05, seed=3)
+    llm = gemini()
+    for question, topics in labelled.items():
+        assert parse_topics(llm.invoke(system_prompt, question)) == topics
+    assert llm.rate_limiter.requests_per_minute < 6000
+    assert sum(stats.retries or 0 for stats in llm.telemetry.snapshot()) > 0
+
+
+def test_structured_results_are_cached_apart_from_raw_responses(
+    standin, system_prompt, labelled, tmp_path
+):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    llm = gemini(cache=cache)
+    question, topics = next(iter(labelled.items()))
+    raw_key = ResponseCache.make_key(llm.model, llm.thinking_level, system_prompt, question)
+    structured_key = llm.structured_cache_key(system_prompt, question)
+    assert structured_key != raw_key
+
+    # the eval's raw text, with chatter a schema can't parse
+    cache.put(raw_key, 'Answer: {"topics": ["Laplacian"]} because...')
+    assert cache.get(structured_key) is None
+
+    # the app's parsed result doesn't leak into the eval either
+    cache.put(structured_key, Topics(topics=["Determinants"]).model_dump_json())
+    assert llm.invoke(system_prompt, question) == 'Answer: {"topics": ["Laplacian"]} because...'
+    result = llm.invoke_structured(system_prompt, question, Topics)
+    assert set(result.topics) == topics
+
+
+def test_backoff_is_not_counted_as_network_time():
+    from langchain_google_genai.chat_models import GoogleRateLimitError
+    from telemetry import CallStats
+
+    llm = gemini()
+    attempts = []
+
+    def call() -> str:
+        attempts.append(1)
+        time.sleep(0.05)
+        if len(attempts) == 1:
+            raise GoogleRateLimitError("429 Resource exhausted")
+        return "ok"
+
+    stats = CallStats(llm.model, llm.thinking_level, started_at=time.time())
+    # a Retry-After the limiter and backoff both honour
+    llm._retry_after = lambda error: 0.3
+    assert llm._call_with_retries(stats, call) == "ok"
+    assert stats.retries == 1
+    assert stats.backoff_s == pytest.approx(0.3)
+    assert 0.1 <= stats.network_s < 0.2
+
+
+def test_gemini_limiter_probes_up_to_the_tier_ceiling(
+    monkeypatch, standin, system_prompt, labelled
+):
+    monkeypatch.setenv("GEMINI_MAX_RPM", "1000")
+    llm = gemini(requests_per_minute=600)
+    assert llm.rate_limiter.max_rate == 1000
+    for question in list(labelled) * 3:
+        llm.invoke(system_prompt, question)
+    # every request waited for its token, so each success raised the rate
+    assert llm.rate_limiter.requests_per_minute > 600
+
+
+def test_gemini_limiter_ceiling_defaults_to_the_tier_quota():
+    assert gemini(requests_per_minute=10).rate_limiter.max_rate == 15
+    # a configured rate above the tier quota is never capped below itself
+    assert gemini(requests_per_minute=60).rate_limiter.max_rate == 60
+    assert gemini(requests_per_minute=10, max_requests_per_minute=30).rate_limiter.max_rate == 30
@@ -1,152 +1,247 @@
 import os
-import json
-import pandas as pd
-from sklearn.metrics import cohen_kappa_score, classification_report
+from question_store import QuestionStore
 from dotenv import load_dotenv
-from llm_wrappers import NalaGPTWrapper, GeminiWrapper
-
-load_dotenv()  # get API key
-NALA_API_KEY: str = os.getenv("NALA_API_KEY")
-GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
-llm_list = [
-    ("GPT-5 (High Thinking)", NalaGPTWrapper(NALA_API_KEY, reasoning_effort="high")),
-    ("GPT-5 (Low Thinking)", NalaGPTWrapper(NALA_API_KEY, reasoning_effort="low")),
-    (
-        "Gemini 3.1 Flash Lite Preview (High Thinking)",
-        GeminiWrapper(GEMINI_API_KEY, thinking_level="high"),
-    ),
-    (
-        "Gemini 3.1 Flash Lite Preview (Low Thinking)",
-        GeminiWrapper(GEMINI_API_KEY, thinking_level="minimal"),
-    ),
-]
+from llm_wrappers import ResponseCache
+from eval_engine import run_jobs, parse_topics
+from bootstrap import N_REPLICATES, print_bootstrap_report
+from cascade import CascadeExtractor
+from prompt_routing import TopicRouter
+from model_registry import MODELS, build_models
+from metrics import MetricAccumulator, print_cascade_report, print_latency_report, print_report
+from run_log import RunLog, make_key
+from topic_report import question_outcomes, score_records
+from topics import count_invalid, encode
+
+load_dotenv()  # get API keys
+
+# responses are cached on disk, set LLM_REPLAY_ONLY=1 to re-score without API calls
+cache = ResponseCache(
+    os.getenv("LLM_CACHE", "llm_cache.sqlite"),
+    replay_only=os.getenv("LLM_REPLAY_ONLY") == "1",
+)
+# set EVAL_MODELS to a comma-separated list of model keys (see model_registry.py)
+# to evaluate only those, only their wrappers are built
+model_keys = os.getenv("EVAL_MODELS", ",".join(MODELS)).split(",")
+# system prompts large enough to be cached are sent once per run as cached
+# contexts (set GEMINI_CONTEXT_CACHE=0 to always send the full prompt). The
+# current topic prompts are below the API's minimum and are sent in full. Only
+# imported for Gemini runs, google.genai takes about a second to import
+context_cache = None
+if os.getenv("GEMINI_CONTEXT_CACHE", "1") == "1" and any(
+    key.startswith("gemini") for key in model_keys
+):
+    from context_cache import ContextCache
+
+    context_cache = ContextCache()
+# set EVAL_BATCH_SIZE=n to pack n questions into each Gemini request. Batched
+# models answer with one JSON mapping per batch, so they are neither streamed
+# nor sampled (LLM_STREAM and SELF_CONSISTENCY don't apply to them)
+batch_size = int(os.getenv("EVAL_BATCH_SIZE", "1"))
+llm_list = build_models(
+    model_keys, cache=cache, context_cache=context_cache, batch_size=batch_size
+)
+
+# set SELF_CONSISTENCY=n to score each model's majority vote over n samples per
+# question instead of a single response (models without sampling are unchanged)
+samples = int(os.getenv("SELF_CONSISTENCY", "1"))
+if samples > 1:
+    llm_list = [
+        (
+            f"{name} (vote@{samples})"
+            if hasattr(llm, "sample") and getattr(llm, "batch_size", 1) <= 1
+            else name,
+            llm,
+        )
+        for name, llm in llm_list
+    ]
+
+# cheap-first cascade: Flash Lite (minimal thinking), escalating to GPT-5 (high
+# thinking) when a gate fires (set CASCADE=0 to leave it out). It is scored by
+# replaying its gates over the two models' responses in this run, so it costs no
+# extra calls, and its latency is the sum of the stages each question went through
+cascade = None
+selected = dict(zip(model_keys, llm_list))
+if os.getenv("CASCADE", "1") == "1" and {"gemini-low", "gpt5-high", "baseline"} <= selected.keys():
+    cascade = CascadeExtractor(
+        [selected["gemini-low"], selected["gpt5-high"]],
+        baseline=selected["baseline"][1],
+        samples=samples,
+    )
 
 # load system prompt
 with open("system_prompt.md", mode="r") as f:
     system_prompt: str = f.read()
 
 # load question bank
-df = pd.read_csv("question_bank.csv")
-
-topic_list = {
-    "Systems of Linear Equations and Matrices",
-    "Gaussian Elimination",
-    "Matrix Algebra",
-    "Determinants",
-    "Elementary Matrices",
-    "LU Factorization",
-    "Vector Spaces and Subspaces",
-    "Linear Independence and Spanning Sets",
-    "Basis and Dimension",
-    "Rank and Nullity",
-    "Eigenvalues and Eigenvectors",
-    "Diagonalization",
-    "Complex Numbers",
-    "Euler's Formula and De Moivre's Formula",
-    "Complex Logarithm and Powers",
-    "Limits and Continuity of Complex Functions",
-    "Differentiability and Analyticity of Complex Functions",
-    "Cauchy-Riemann Equations",
-    "Complex Integration",
-    "Cauchy's Integral Theorem and Formula",
-    "Vector Differentiation",
-    "Scalar and Vector Fields",
-    "Del Operator",
-    "Directional Derivative",
-    "Laplacian",
-    "Vector Line Integrals",
-    "Vector Surface Integrals",
-    "Volume Integrals",
-    "Conservative Vector Fields",
-    "Scalar Triple Product",
-}
-
-topic_list_sorted = sorted(topic_list)
-results = {name: {"y_true": [], "y_pred": [], "invalid": 0} for name, _ in llm_list}
+df = QuestionStore().questions(labelled=True)
 
+questions: list[str] = df["question"].tolist()
+# parse target topics (comma-separated)
+target_topics_list: list[set] = [
+    {t.strip() for t in target_topics_raw.split(",")} for target_topics_raw in df["topics"]
+]
 total_questions = len(df)
+total_jobs = total_questions * len(llm_list)
+completed_jobs = 0
+
+# send each question only the topics of its major topic (set TOPIC_ROUTING=0 to
+# send the full topic list instead)
+if os.getenv("TOPIC_ROUTING", "1") == "1":
+    router = TopicRouter(system_prompt)
+    prompts = [router.route(q, m) for q, m in zip(questions, df["major_topic"])]
+else:
+    prompts = [system_prompt] * total_questions
+
+# every completed job is appended to the run log, rerunning with the same log
+# skips jobs that already have a response
+run_log = RunLog(os.getenv("RUN_LOG", "runs/topic_extraction.jsonl"))
+logged = run_log.completed()
+
+# running confusion counts per model, updated as each job completes
+accumulators = {name: MetricAccumulator() for name, _ in llm_list}
+# (q_idx, llm_name) -> run log record of this run
+run_records: dict[tuple[int, str], dict] = {}
+
+
+def handle_result(
+    q_idx: int, llm_name: str, response: str | None, latency: float | None, record: dict | None = None
+) -> None:
+    """
+    Logs and scores a single question x model job as it completes, and prints
+    the outcome. `record` is passed for jobs replayed from the run log.
+    """
+    global completed_jobs
+    completed_jobs += 1
+    prefix = f"[{q_idx + 1}/{total_questions}] Model: {llm_name} -> "
+
+    if record is None:
+        extracted_topics = parse_topics(response) if response is not None else None
+        record = {
+            "key": make_key(questions[q_idx], llm_name, prompts[q_idx]),
+            "q_idx": q_idx,
+            "question": questions[q_idx],
+            "major_topic": df["major_topic"].iloc[q_idx],
+            "target_topics": sorted(target_topics_list[q_idx]),
+            "model": llm_name,
+            "raw_response": response,
+            "topics": sorted(extracted_topics) if extracted_topics is not None else None,
+            "latency_s": latency,
+        }
+        run_log.append(record)
+    else:
+        prefix += "(from run log) "
+    run_records[(q_idx, llm_name)] = record
+
+    if record["raw_response"] is None:
+        print(prefix + "ERROR: No response received.")
+    else:
+        if record["topics"] is None:
+            print(prefix + f"ERROR: Could not parse response: {record['raw_response'][:100]}")
+        extracted_topics = set(record["topics"] or [])
+
+        target_topics = target_topics_list[q_idx]
+        # model spellings are resolved to registry topics, so only names that
+        # match nothing count as invalid
+        true_mask, pred_mask = encode(target_topics), encode(extracted_topics)
+        accumulators[llm_name].update(
+            true_mask, pred_mask, num_invalid=count_invalid(extracted_topics)
+        )
 
-# iterate through rows of the csv file
-for index, row in df.iterrows():
-    question: str = row["question"]
-    target_topics_raw: str = row["topics"]
+        num_matched = (true_mask & pred_mask).bit_count()
+        print(
+            prefix
+            + f"Matched {num_matched}/{len(target_topics)} topics. Extracted: {extracted_topics}"
+        )
 
-    # parse target topics from CSV (comma-separated)
-    target_topics: set = {t.strip() for t in target_topics_raw.split(",")}
+    # print live metrics at every 10% of completed jobs
+    if completed_jobs % max(1, total_jobs // 10) == 0 or completed_jobs == total_jobs:
+        print(f"\n--- Live metrics ({completed_jobs}/{total_jobs} jobs) ---")
+        for name, accumulator in accumulators.items():
+            print(f"  {name}: {accumulator.summary()}")
+        print()
+
+
+# replay jobs already in the run log
+skip: set[tuple[int, str]] = set()
+for q_idx in range(total_questions):
+    for llm_name, _ in llm_list:
+        record = logged.get(make_key(questions[q_idx], llm_name, prompts[q_idx]))
+        if record is not None:
+            skip.add((q_idx, llm_name))
+            handle_result(q_idx, llm_name, record["raw_response"], record["latency_s"], record)
+if skip:
+    print(f"Resumed {len(skip)}/{total_jobs} jobs from {run_log.path}")
+
+# send out the remaining question x model jobs concurrently
+print(f"Running {total_questions} questions x {len(llm_list)} models concurrently...")
+# responses are streamed and cut off once the JSON answer closes (set LLM_STREAM=0 to wait
+# for full completions)
+run_jobs(
+    questions,
+    llm_list,
+    prompts,
+    on_result=handle_result,
+    skip=skip,
+    stream=os.getenv("LLM_STREAM", "1") == "1",
+    samples=samples,
+)
+run_log.close()
+if context_cache is not None:
+    # delete this run's cached contexts rather than paying for them until they expire
+    context_cache.clear()
+
+# final report, with records in question order so it matches a sequential run
+ordered_records = [
+    run_records[(q_idx, llm_name)]
+    for q_idx in range(total_questions)
+    for llm_name, _ in llm_list
+    if (q_idx, llm_name) in run_records
+]
+print_report(*score_records(ordered_records, [name for name, _ in llm_list]))
+
+# confidence intervals and paired tests between models, from resampling the
+# questions (set BOOTSTRAP=0 to skip)
+n_replicates = int(os.getenv("BOOTSTRAP", str(N_REPLICATES)))
+if n_replicates > 0:
+    print_bootstrap_report(
+        question_outcomes(ordered_records, [name for name, _ in llm_list]), n_replicates
+    )
 
-    print(f"\n[{index + 1}/{total_questions}] Question: {question[:80]}...")
-    print(f"  Target Topics: {target_topics}")
 
-    for llm_name, llm in llm_list:  # iterate through models
-        print(f"  Model: {llm_name}", end=" -> ")
-        response: str = llm.invoke(system_prompt, question)  # get model response
+def latencies_of(llm_name: str) -> list[float]:
+    return [
+        record["latency_s"]
+        for (_, name), record in run_records.items()
+        if name == llm_name and record["latency_s"] is not None
+    ]
 
-        if response is None:
-            print("ERROR: No response received.")
-            continue
 
-        # parse the JSON response to extract the topics list
-        try:
-            parsed = json.loads(response)
-            extracted_topics: set = set(parsed.get("topics", []))
-        except (json.JSONDecodeError, TypeError):
-            # try to find JSON within the response (e.g. if wrapped in markdown)
-            try:
-                json_start = response.index("{")
-                json_end = response.rindex("}") + 1
-                parsed = json.loads(response[json_start:json_end])
-                extracted_topics: set = set(parsed.get("topics", []))
-            except (ValueError, json.JSONDecodeError):
-                print(f"ERROR: Could not parse response: {response[:100]}")
-                extracted_topics = set()
-
-        # compare extracted topics with target topics
-        matched: set = extracted_topics & target_topics
-        num_target = len(target_topics)
-        num_matched = len(matched)
-        num_invalid = len(extracted_topics - topic_list)
-
-        # build binary vectors over the full topic list for this question
-        true_vector = [
-            1 if topic in target_topics else 0 for topic in topic_list_sorted
-        ]
-        pred_vector = [
-            1 if topic in extracted_topics else 0 for topic in topic_list_sorted
-        ]
-        results[llm_name]["y_true"].append(true_vector)
-        results[llm_name]["y_pred"].append(pred_vector)
-        results[llm_name]["invalid"] += num_invalid
+if cascade is not None:
+    stage_names = [name for name, _ in cascade.stages]
+    rows = {name: (accumulators[name], latencies_of(name), "") for name in stage_names}
 
-        print(
-            f"Matched {num_matched}/{num_target} topics. Extracted: {extracted_topics}"
+    cascade_accumulator = MetricAccumulator()
+    cascade_latencies: list[float] = []
+    for q_idx in range(total_questions):
+        stage_records = [run_records.get((q_idx, name)) for name in stage_names]
+        if None in stage_records:
+            continue
+        stage, fired_per_stage = cascade.choose(
+            questions[q_idx], [record["raw_response"] for record in stage_records]
         )
-
-# final report
-print("\n" + "=" * 60)
-print("TOPIC EXTRACTION — MULTILABEL CLASSIFICATION REPORT")
-print("=" * 60)
-
-for llm_name, stats in results.items():
-    y_true = stats["y_true"]  # 2D: (n_questions, n_topics)
-    y_pred = stats["y_pred"]
-    invalid = stats["invalid"]
-
-    # flatten to 1D for Cohen's Kappa
-    y_true_flat = [v for row in y_true for v in row]
-    y_pred_flat = [v for row in y_pred for v in row]
-    kappa = cohen_kappa_score(y_true_flat, y_pred_flat) if len(y_true_flat) > 0 else 0.0
-
-    print(f"\n{llm_name}:")
-    print(f"  {invalid} invalid topics")
-    print(f"  Cohen's Kappa: {kappa:.4f}")
-    print("\n  Multilabel Classification Report (per topic):")
-    print(
-        classification_report(
-            y_true,
-            y_pred,
-            target_names=topic_list_sorted,
-            zero_division=0,
+        cascade.record(stage, fired_per_stage)
+        cascade_latencies.append(
+            sum(record["latency_s"] or 0.0 for record in stage_records[: len(fired_per_stage)])
         )
-    )
-
-print("=" * 60)
+        if stage_records[stage]["raw_response"] is not None:
+            extracted_topics = set(stage_records[stage]["topics"] or [])
+            cascade_accumulator.update(
+                encode(target_topics_list[q_idx]),
+                encode(extracted_topics),
+                num_invalid=count_invalid(extracted_topics),
+            )
+    rows[f"Cascade ({cascade.model})"] = (cascade_accumulator, cascade_latencies, cascade.summary())
+    print_cascade_report(rows)
+
+# latency of the calls made in this run (jobs replayed from the run log aren't timed again)
+print_latency_report({name: llm.telemetry for name, llm in llm_list})
@@ -1,77 +1,163 @@
-import pandas as pd
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+from eval_engine import parse_topics
+from question_store import QuestionStore
+from topics import TOPIC_LIST, resolver
 
-csv_file = "question_bank.csv"
+# unlabelled questions whose suggestions are computed ahead of the current one
+PREFETCH = 5
 
-# load the CSV into a pandas DataFrame
-print(f"Loading {csv_file}...")
-df: pd.DataFrame = pd.read_csv(csv_file)
-df["topics"] = df["topics"].fillna("").astype(str)
+load_dotenv()
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+
+
+def make_suggester():
+    """
+    Returns a function giving topic suggestions for (question, major topic),
+    and its name. Uses Gemini (cached, with the prompt routed to the major
+    topic) if an API key is set, otherwise the local baseline classifier, or
+    no suggestions while the bank has no labelled questions to fit it on.
+    """
+    if GEMINI_API_KEY:
+        from context_cache import ContextCache
+        from llm_wrappers import GeminiWrapper, ResponseCache
+        from prompt_routing import TopicRouter
+
+        with open("system_prompt.md", mode="r") as f:
+            system_prompt = f.read()
+        llm = GeminiWrapper(
+            GEMINI_API_KEY,
+            thinking_level="minimal",
+            cache=ResponseCache(),
+            context_cache=ContextCache(),
+        )
+        router = TopicRouter(system_prompt)
+
+        def suggest(question: str, major_topic: str) -> list[str]:
+            response = llm.invoke(router.route(question, major_topic), question)
+            return sorted(parse_topics(response) or [])
+
+        return suggest, "Gemini"
+
+    if store.questions(labelled=True).empty:
+        return lambda question, major_topic: [], "none (no labelled questions yet)"
+
+    from baseline_classifier import BaselineTopicClassifier
+
+    baseline = BaselineTopicClassifier(store, n_folds=1)
+    return lambda question, major_topic: baseline.predict(question), "local baseline"
+
+
+# labels are saved to the store one row at a time, the CSV is rewritten once on exit
+store = QuestionStore()
+print(f"Loading {store.path}...")
+df = store.questions()
 
 total_questions = len(df)
 print(f"Loaded {total_questions} questions.\n")
-print("Type your topics separated by commas (e.g., 'limits, continuity').")
-print("Type 'q' at any time to save and exit.\n")
-
-topic_list = {
-    0: "Systems of Linear Equations and Matrices",
-    1: "Gaussian Elimination",
-    2: "Matrix Algebra",
-    3: "Determinants",
-    4: "Elementary Matrices",
-    5: "LU Factorization",
-    6: "Vector Spaces and Subspaces",
-    7: "Linear Independence and Spanning Sets",
-    8: "Basis and Dimension",
-    9: "Rank and Nullity",
-    10: "Eigenvalues and Eigenvectors",
-    11: "Diagonalization",
-    12: "Complex Numbers",
-    13: "Euler's Formula and De Moivre's Formula",
-    14: "Complex Logarithm and Powers",
-    15: "Limits and Continuity of Complex Functions",
-    16: "Differentiability and Analyticity of Complex Functions",
-    17: "Cauchy-Riemann Equations",
-    18: "Complex Integration",
-    19: "Cauchy's Integral Theorem and Formula",
-    20: "Vector Differentiation",
-    21: "Scalar and Vector Fields",
-    22: "Del Operator (Gradient, Divergence, and Curl)",
-    23: "Directional Derivative",
-    24: "Laplacian",
-    25: "Vector Line Integrals",
-    26: "Vector Surface Integrals",
-    27: "Volume Integrals",
-    28: "Conservative Vector Fields",
-    29: "Scalar Triple Product",
-}
-
-# loop through each question in the DataFrame
-for index, row in df.iterrows():
-    if pd.notna(row["topics"]) and str(row["topics"]).strip() != "":
-        continue
-
-    print("-" * 50)
-    print(
-        f"Question {index + 1} of {total_questions} (Major Topic: {row['major_topic']})"
-    )
-    print(f"Question: {row['question']}\n")
-
-    user_input = input(
-        "Enter topic numbers for this question (q to quit and save): "
-    ).strip()
-
-    if user_input.lower() == "q":
-        print("\nSaving progress and exiting...")
-        quit_flag = True
-        break
-
-    else:
-        topic_idxs = [int(i) for i in user_input.split()]
+
+# numbered as in system_prompt.md, labels are written with their canonical names
+topic_list = dict(enumerate(TOPIC_LIST))
+for topic_id, topic in topic_list.items():
+    print(f"  {topic_id:2d}  {topic}")
+
+print("\nEnter topic numbers separated by spaces (e.g., '10 11').")
+print("Press Enter on its own to accept the suggestion.")
+print("Type 'q' at any time to exit, progress is saved after every question.\n")
+
+unlabelled = df.index[df["topics"].str.strip() == ""].tolist()
+suggest, suggester_name = make_suggester()
+print(f"Suggestions from: {suggester_name}\n")
+
+# suggestions for the next PREFETCH questions are computed while the current one is labelled
+executor = ThreadPoolExecutor(max_workers=PREFETCH)
+suggestions: dict[int, Future] = {}
+labelled = 0
+
+
+def prefetch(position: int) -> None:
+    for index in unlabelled[position : position + PREFETCH + 1]:
+        if index not in suggestions:
+            row = df.loc[index]
+            suggestions[index] = executor.submit(suggest, row["question"], row["major_topic"])
+
+
+def suggested_ids(index: int) -> list[int] | None:
+    """
+    The suggestion for a question as topic numbers, None if it isn't ready yet.
+    """
+    future = suggestions[index]
+    if not future.done():
+        return None
+    try:
+        topics = future.result()
+    except Exception as e:
+        print(f"  [Suggestion Error] {e}")
+        topics = []
+    topic_ids = {resolver.resolve(topic) for topic in topics}
+    return sorted(topic_id for topic_id in topic_ids if topic_id is not None)
+
+
+try:
+    for position, index in enumerate(unlabelled):
+        prefetch(position)
+        row = df.loc[index]
+
+        print("-" * 50)
+        print(
+            f"Question {index + 1} of {total_questions} (Major Topic: {row['major_topic']})"
+        )
+        print(f"Question: {row['question']}\n")
+
+        while True:
+            suggestion = suggested_ids(index)
+            if suggestion is None:
+                print("Suggestion: (still loading, press Enter to wait for it)")
+            else:
+                print(
+                    "Suggestion: "
+                    + (", ".join(f"{i} {topic_list[i]}" for i in suggestion) or "(none)")
+                )
+
+            user_input = input(
+                "Enter topic numbers for this question (Enter to accept, q to quit): "
+            ).strip()
+
+            if user_input.lower() == "q":
+                raise KeyboardInterrupt
+
+            if user_input == "":
+                if suggestion is None:
+                    # wait for the suggestion, then show it
+                    suggestions[index].exception()
+                    continue
+                if not suggestion:
+                    print("No suggestion to accept, please enter topic numbers.")
+                    continue
+                topic_idxs = suggestion
+            else:
+                try:
+                    topic_idxs = [int(i) for i in user_input.split()]
+                    if any(i not in topic_list for i in topic_idxs):
+                        raise ValueError
+                except ValueError:
+                    print(f"Please enter numbers between 0 and {len(topic_list) - 1}.")
+                    continue
+            break
+
         input_topics = ",".join([topic_list[j] for j in topic_idxs])
         print(f"Selected topics: {input_topics}")
-        df.at[index, "topics"] = input_topics
+        store.set_topics(row["question"], input_topics)
+        labelled += 1
+
+    print("\nDone! All questions in the bank are labelled.")
+
+except (KeyboardInterrupt, EOFError):
+    print(f"\nExiting. {labelled} labels from this session are saved.")
 
-# Save the updated DataFrame back to a CSV file
-output_file = "question_bank.csv"
-df.to_csv(output_file, index=False)
-print(f"\nDone! Updated questions saved to {output_file}")
+finally:
+    executor.shutdown(wait=False, cancel_futures=True)
+    if labelled:
+        store.export_csv()
+        print(f"Wrote {store.csv_path}")
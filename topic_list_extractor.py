@@ -1,23 +1,21 @@
+import argparse
+import difflib
+import hashlib
 import json
-from dotenv import load_dotenv
 import pathlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
 from google import genai
 from google.genai import types
+from file_utils import file_hash, read_json_cache, write_json_atomic
+from topics import normalize_topic
 
 # get API key
 load_dotenv(".env")
 
-# create client
-client = genai.Client()
-
-sources_folder = pathlib.Path("./sources/lecture notes/")
-
-contents = []
-for notes_path in sources_folder.glob("*.pdf"):
-    contents.append(client.files.upload(file=notes_path))
-
-prompt = """
-You are an expert academic tutor. I have provided a set of lecture notes regarding linear algebra, complex analysis, and vector calculus.
+PROMPT = """
+You are an expert academic tutor. I have provided a set of lecture notes regarding linear algebra, complex analysis, or vector calculus.
 Your task is to extract out only the topics taught in the lecture notes. Be as comprehensive as possible, without having duplicates.
 If the topics are very similar (e.g. Eigenvalues, Eigenvectors), merge them into one topic (e.g. Eigenvalues and Eigenvectors)
 
@@ -27,20 +25,147 @@ These are some requirements that you must follow:
 - Strictly use words found in the lecture notes.
 - Do not include examples.
 """
-contents.append(prompt)
 
-print("Sending to Gemini API...")
+# per-PDF topic lists are cached by file content hash
+CACHE_DIR = pathlib.Path(".topic_cache")
+MAX_WORKERS = 4
+
+# words ignored when comparing topics by token overlap
+STOPWORDS = {"and", "of", "the", "a", "an", "in", "for", "to", "with", "on"}
+
+
+def extract_topics_from_pdf(client, notes_path: pathlib.Path) -> list[str]:
+    """
+    Map stage: extracts the topics of one lecture-note PDF, served from the
+    cache if this file's content was already processed with this prompt.
+    """
+    digest = file_hash(notes_path)
+    prompt_hash = hashlib.sha256(PROMPT.encode("utf-8")).hexdigest()[:12]
+    cache_path = CACHE_DIR / f"{digest}_{prompt_hash}.json"
+    cached = read_json_cache(cache_path)
+    if cached is not None:
+        return cached
+
+    print(f"Sending {notes_path.name} to Gemini API...")
+    uploaded_file = client.files.upload(file=notes_path)
+    try:
+        response = client.models.generate_content(
+            model="gemini-3.1-flash-lite-preview",
+            contents=[uploaded_file, PROMPT],
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+            ),
+        )
+    finally:
+        client.files.delete(name=uploaded_file.name)
+
+    topics = json.loads(response.text).get("topics", [])
+    write_json_atomic(cache_path, topics, ensure_ascii=False)
+    return topics
+
+
+def _tokens(normalized: str) -> frozenset[str]:
+    # crude singularisation so "Eigenvalue" and "Eigenvalues" share a token
+    return frozenset(
+        word[:-1] if word.endswith("s") and len(word) > 3 else word
+        for word in normalized.split()
+        if word not in STOPWORDS
+    )
+
+
+def merge_topics(
+    topic_lists: list[list[str]], token_threshold: float = 0.8, string_threshold: float = 0.9
+) -> list[str]:
+    """
+    Reduce stage: merges the per-PDF topic lists locally. Exact duplicates are
+    merged by normalised key; near-duplicates are merged when their token sets
+    (Jaccard) or character sequences are similar enough. Each merged group is
+    named by its most frequent spelling (first seen on ties), in first-seen order.
+    """
+    spellings: dict[str, Counter] = {}
+    for topics in topic_lists:
+        for topic in topics:
+            key = normalize_topic(topic)
+            if key:
+                spellings.setdefault(key, Counter())[topic.strip()] += 1
+
+    keys = list(spellings)
+    tokens = [_tokens(key) for key in keys]
+
+    # union-find over normalised keys
+    parent = list(range(len(keys)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    for i in range(len(keys)):
+        matcher.set_seq2(keys[i])
+        for j in range(i + 1, len(keys)):
+            if find(i) == find(j):
+                continue
+            union = len(tokens[i] | tokens[j])
+            if union and len(tokens[i] & tokens[j]) / union >= token_threshold:
+                parent[find(j)] = find(i)
+                continue
+            matcher.set_seq1(keys[j])
+            # cheap upper bounds first, full ratio only for likely matches
+            if (
+                matcher.real_quick_ratio() >= string_threshold
+                and matcher.quick_ratio() >= string_threshold
+                and matcher.ratio() >= string_threshold
+            ):
+                parent[find(j)] = find(i)
+
+    groups: dict[int, Counter] = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(find(i), Counter()).update(spellings[key])
+
+    # Counter keeps insertion order, so max() returns the first-seen spelling on ties
+    return [max(counter, key=counter.get) for counter in groups.values()]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Extract a deduplicated topic list from lecture notes.")
+    parser.add_argument("notes_dir", nargs="?", default="./lecture notes")
+    parser.add_argument(
+        "--output", default="topic_list.md", help="markdown bullet list, ready to paste into system_prompt.md"
+    )
+    args = parser.parse_args(argv)
+
+    # create client
+    client = genai.Client()
+    CACHE_DIR.mkdir(exist_ok=True)
+
+    notes_paths = sorted(pathlib.Path(args.notes_dir).glob("*.pdf"))
+    per_pdf: dict[pathlib.Path, list[str]] = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(extract_topics_from_pdf, client, notes_path): notes_path
+            for notes_path in notes_paths
+        }
+        for future in as_completed(futures):
+            notes_path = futures[future]
+            try:
+                per_pdf[notes_path] = future.result()
+                print(f"{notes_path.name}: {len(per_pdf[notes_path])} topics")
+            except Exception as e:
+                print(f"An error occurred while processing {notes_path.name}: {e}")
+
+    # merge in lecture order so the final list follows the course
+    extracted_topics = merge_topics([per_pdf[p] for p in notes_paths if p in per_pdf])
+
+    for topic in extracted_topics:
+        print(f"- {topic}")
 
-response = client.models.generate_content(
-    model="gemini-3.1-flash-lite-preview",
-    contents=contents,
-    config=types.GenerateContentConfig(
-        response_mime_type="application/json",
-    ),
-)
+    pathlib.Path(args.output).write_text("".join(f"- {topic}\n" for topic in extracted_topics))
+    print(f"\nSaved {len(extracted_topics)} topics to {args.output}")
+    print("Python list for topics.TOPIC_LIST:")
+    print(json.dumps(extracted_topics, indent=4))
 
-response_data = json.loads(response.text)
-extracted_topics = response_data.get("topics", [])
 
-for topic in extracted_topics:
-    print(f"- {topic}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import argparse
+import hashlib
+from bootstrap import N_REPLICATES, print_bootstrap_report
+from metrics import LabelMatrix, MetricAccumulator, print_report
+from run_log import read_records
+from topics import count_invalid, encode
+
+
+def latest_records(records: list[dict]) -> dict[tuple[str, str], dict]:
+    """
+    Maps (model, question id) to the latest record of that model for that
+    question (e.g. across several logs), in the order of the latest records.
+    """
+    latest: dict[tuple[str, str], dict] = {}
+    for record in records:
+        question_id = hashlib.sha256(record["question"].encode("utf-8")).hexdigest()
+        # re-insert so the dict keeps the order of the latest records
+        latest.pop((record["model"], question_id), None)
+        latest[(record["model"], question_id)] = record
+    return latest
+
+
+def score_records(
+    records: list[dict], model_names: list[str] | None = None
+) -> tuple[dict[str, MetricAccumulator], dict[str, tuple[LabelMatrix, LabelMatrix]]]:
+    """
+    Rebuilds the per-model accumulators and label matrices from run log
+    records. If a question was answered more than once by the same model (e.g.
+    across several logs), the latest record wins. Records without a response
+    are left out, as in the live evaluation.
+    """
+    latest = latest_records(records)
+    if model_names is None:
+        model_names = list(dict.fromkeys(record["model"] for record in records))
+
+    accumulators = {name: MetricAccumulator() for name in model_names}
+    label_matrices = {name: (LabelMatrix(), LabelMatrix()) for name in model_names}
+    for record in latest.values():
+        if record["model"] not in accumulators or record["raw_response"] is None:
+            continue
+
+        extracted_topics = set(record["topics"] or [])
+        true_mask = encode(record["target_topics"])
+        pred_mask = encode(extracted_topics)
+        num_invalid = count_invalid(extracted_topics)
+
+        accumulators[record["model"]].update(true_mask, pred_mask, num_invalid)
+        label_matrices[record["model"]][0].append(true_mask)
+        label_matrices[record["model"]][1].append(pred_mask)
+
+    return accumulators, label_matrices
+
+
+def question_outcomes(
+    records: list[dict], model_names: list[str] | None = None
+) -> dict[str, dict[str, tuple[int, int]]]:
+    """
+    Maps each model to {question id: (true mask, pred mask)} for the
+    questions it answered, so models can be compared question by question.
+    The same records are kept as in score_records.
+    """
+    if model_names is None:
+        model_names = list(dict.fromkeys(record["model"] for record in records))
+
+    outcomes: dict[str, dict[str, tuple[int, int]]] = {name: {} for name in model_names}
+    for (model, question_id), record in latest_records(records).items():
+        if model not in outcomes or record["raw_response"] is None:
+            continue
+        outcomes[model][question_id] = (
+            encode(record["target_topics"]),
+            encode(set(record["topics"] or [])),
+        )
+    return outcomes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild the topic extraction report from run logs, without calling any model."
+    )
+    parser.add_argument("logs", nargs="+", help="run log (JSONL) files, later ones take precedence")
+    parser.add_argument("--models", nargs="+", help="only report these models (in this order)")
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=N_REPLICATES,
+        help="bootstrap replicates for confidence intervals and paired tests (0 to skip)",
+    )
+    args = parser.parse_args()
+
+    records = read_records(*args.logs)
+    print(f"Loaded {len(records)} records from {len(args.logs)} log(s).")
+    print_report(*score_records(records, args.models))
+    if args.bootstrap > 0:
+        print_bootstrap_report(question_outcomes(records, args.models), args.bootstrap)
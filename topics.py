@@ -0,0 +1,194 @@
+import re
+from collections import Counter
+
+# Canonical topic registry shared by all scripts. A topic's ID is its index in
+# TOPIC_LIST, which follows the order of the topic list in system_prompt.md (and
+# the numbers used in the labelling CLI).
+TOPIC_LIST: list[str] = [
+    "Systems of Linear Equations and Matrices",
+    "Gaussian Elimination",
+    "Matrix Algebra",
+    "Determinants",
+    "Elementary Matrices",
+    "LU Factorization",
+    "Vector Spaces and Subspaces",
+    "Linear Independence and Spanning Sets",
+    "Basis and Dimension",
+    "Rank and Nullity",
+    "Eigenvalues and Eigenvectors",
+    "Diagonalization",
+    "Complex Numbers",
+    "Euler's Formula and De Moivre's Formula",
+    "Complex Logarithm and Powers",
+    "Limits and Continuity of Complex Functions",
+    "Differentiability and Analyticity of Complex Functions",
+    "Cauchy-Riemann Equations",
+    "Complex Integration",
+    "Cauchy's Integral Theorem and Formula",
+    "Vector Differentiation",
+    "Scalar and Vector Fields",
+    "Del Operator",
+    "Directional Derivative",
+    "Laplacian",
+    "Vector Line Integrals",
+    "Vector Surface Integrals",
+    "Volume Integrals",
+    "Conservative Vector Fields",
+    "Scalar Triple Product",
+]
+
+TOPIC_IDS: dict[str, int] = {topic: i for i, topic in enumerate(TOPIC_LIST)}
+NUM_TOPICS: int = len(TOPIC_LIST)
+
+# topics that can appear under each `major_topic` value in question_bank.csv.
+# "Complex Numbers" also shows up in linear algebra (e.g. complex eigenvalues).
+MAJOR_TOPICS: dict[str, list[str]] = {
+    "linear_algebra": TOPIC_LIST[0:12] + ["Complex Numbers"],
+    "complex_analysis": TOPIC_LIST[12:20],
+    "vector_calculus": TOPIC_LIST[20:30],
+}
+
+
+# other names models (and older labels) use for registry topics
+ALIASES: dict[str, str] = {
+    "Del Operator (Gradient, Divergence, and Curl)": "Del Operator",
+    "Gradient, Divergence and Curl": "Del Operator",
+    "Gradient": "Del Operator",
+    "Divergence": "Del Operator",
+    "Curl": "Del Operator",
+    "Systems of Linear Equations": "Systems of Linear Equations and Matrices",
+    "Gauss-Jordan Elimination": "Gaussian Elimination",
+    "Row Reduction": "Gaussian Elimination",
+    "Matrix Operations": "Matrix Algebra",
+    "LU Decomposition": "LU Factorization",
+    "Vector Spaces": "Vector Spaces and Subspaces",
+    "Subspaces": "Vector Spaces and Subspaces",
+    "Linear Independence": "Linear Independence and Spanning Sets",
+    "Spanning Sets": "Linear Independence and Spanning Sets",
+    "Basis": "Basis and Dimension",
+    "Dimension": "Basis and Dimension",
+    "Rank": "Rank and Nullity",
+    "Nullity": "Rank and Nullity",
+    "Eigenvalues": "Eigenvalues and Eigenvectors",
+    "Eigenvectors": "Eigenvalues and Eigenvectors",
+    "Euler's Formula": "Euler's Formula and De Moivre's Formula",
+    "De Moivre's Theorem": "Euler's Formula and De Moivre's Formula",
+    "De Moivre's Formula": "Euler's Formula and De Moivre's Formula",
+    "Complex Logarithm": "Complex Logarithm and Powers",
+    "Analytic Functions": "Differentiability and Analyticity of Complex Functions",
+    "Contour Integration": "Complex Integration",
+    "Cauchy's Integral Theorem": "Cauchy's Integral Theorem and Formula",
+    "Cauchy's Integral Formula": "Cauchy's Integral Theorem and Formula",
+    "Line Integrals": "Vector Line Integrals",
+    "Surface Integrals": "Vector Surface Integrals",
+    "Triple Integrals": "Volume Integrals",
+}
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Case- and punctuation-insensitive form of a topic name, e.g.
+    "cauchy riemann equations" for "Cauchy-Riemann Equations".
+    """
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", topic.lower().replace("'s", "")).split())
+
+
+def _trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TopicResolver:
+    """
+    Maps any topic string a model returns to a registry topic ID.
+
+    Exact names, normalised names (case/punctuation) and aliases are resolved
+    with one dict lookup. Anything else falls back to a character-trigram
+    index over the same keys, accepted if the best match's Jaccard similarity
+    is at least `fuzzy_threshold`. Every answer is memoised, so repeated
+    strings in bulk scoring never hit the fuzzy path twice.
+    """
+
+    def __init__(self, fuzzy_threshold: float = 0.6) -> None:
+        self.fuzzy_threshold = fuzzy_threshold
+        self._exact: dict[str, int] = dict(TOPIC_IDS)
+        self._normalized: dict[str, int] = {}
+        for name, topic_id in TOPIC_IDS.items():
+            self._normalized[normalize_topic(name)] = topic_id
+        for alias, topic in ALIASES.items():
+            self._exact[alias] = TOPIC_IDS[topic]
+            self._normalized[normalize_topic(alias)] = TOPIC_IDS[topic]
+
+        # trigram -> normalised keys containing it
+        self._key_trigrams: dict[str, set[str]] = {
+            key: _trigrams(key) for key in self._normalized
+        }
+        self._index: dict[str, list[str]] = {}
+        for key, trigrams in self._key_trigrams.items():
+            for trigram in trigrams:
+                self._index.setdefault(trigram, []).append(key)
+
+        self._memo: dict[str, int | None] = {}
+
+    def resolve(self, topic: str) -> int | None:
+        """
+        Returns the topic ID for a returned string, or None if it matches nothing.
+        """
+        topic_id = self._exact.get(topic)
+        if topic_id is not None:
+            return topic_id
+        if topic in self._memo:
+            return self._memo[topic]
+
+        key = normalize_topic(topic)
+        topic_id = self._normalized.get(key)
+        if topic_id is None and key:
+            topic_id = self._fuzzy(key)
+        self._memo[topic] = topic_id
+        return topic_id
+
+    def _fuzzy(self, key: str) -> int | None:
+        trigrams = _trigrams(key)
+        shared = Counter(
+            candidate for trigram in trigrams for candidate in self._index.get(trigram, ())
+        )
+        best_id, best_score = None, self.fuzzy_threshold
+        for candidate, count in shared.items():
+            score = count / (len(trigrams) + len(self._key_trigrams[candidate]) - count)
+            if score >= best_score:
+                best_id, best_score = self._normalized[candidate], score
+        return best_id
+
+    def canonical(self, topic: str) -> str | None:
+        topic_id = self.resolve(topic)
+        return TOPIC_LIST[topic_id] if topic_id is not None else None
+
+
+resolver = TopicResolver()
+
+
+def encode(topics) -> int:
+    """
+    Packs a collection of topic names into a bitmask (bit i set for topic ID i).
+    Names are resolved with the shared resolver, unresolvable ones are ignored.
+    """
+    mask = 0
+    for topic in topics:
+        topic_id = resolver.resolve(topic)
+        if topic_id is not None:
+            mask |= 1 << topic_id
+    return mask
+
+
+def count_invalid(topics) -> int:
+    """
+    Number of topic names that don't resolve to any registry topic.
+    """
+    return sum(1 for topic in topics if resolver.resolve(topic) is None)
+
+
+def decode(mask: int) -> list[str]:
+    """
+    Unpacks a bitmask back into topic names, in registry order.
+    """
+    return [topic for i, topic in enumerate(TOPIC_LIST) if mask >> i & 1]